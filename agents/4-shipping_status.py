@@ -62,7 +62,7 @@ def main():
 
     prompt = llm.add_cap_ref(
         prompt,
-        f"Use these {POSTGRES_TABLE_DEFINITIONS_CAP_REF} to satisfy the database query related to cloth retail and shipping status of defective product or damaged product.",
+        f"Use these {POSTGRES_TABLE_DEFINITIONS_CAP_REF} to satisfy the database query related to cloth retail and shipping status of defective product or damaged product. run_sql returns the image url in the rows of its result; if it returns an error, fix the query or ask the customer for the order id.",
         POSTGRES_TABLE_DEFINITIONS_CAP_REF,
         table_definitions,
     )
@@ -79,7 +79,7 @@ def main():
         "functions": [
             {
                 "name": "run_sql",
-                "description": "Using orderid, it use the table 'Product_defect' or 'Package_damaged' based on the whether the request is related to defective product or damaged package respectively. Then it return the image url corresponding to that orderid",
+                "description": "Using orderid, it use the table 'Product_defect' or 'Package_damaged' based on the whether the request is related to defective product or damaged package respectively. Then it return the image url corresponding to that orderid. The result is JSON with the matching rows as columns and rows, the total row_count, and truncated when only the first rows are included. A query that is rejected or fails returns an error instead",
                 "parameters": {
                     "type": "object",
                     "properties": {
@@ -1,17 +1,48 @@
 import os
-import time
 import asyncio
-import threading
 import dotenv
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, stream_with_context
 from flask_cors import CORS
 import queue
 import autogen
 import json
 
-from agents.modules.db import PostgresManager
+from agents.modules.db import PostgresManager, pool_stats
 from agents.modules import llm
+from agents.modules.sessions import (
+    SessionInputMixin,
+    SessionRegistry,
+    message_content,
+    parse_message,
+    sse_events,
+)
+from agents.modules.chat_pool import ChatPool, ChatPoolFull, run_on_worker_loop
+from agents.modules.agent_templates import (
+    AgentTemplate,
+    GroupChatManagerTemplate,
+    select_templates,
+)
+from agents.modules.speaker_selection import TransitionGraph
+from agents.modules import intents
+from agents.modules.history import HistoryCompaction, DEFAULT_MAX_HISTORY_TOKENS
+from agents.modules import metrics
+from agents.modules import llm_cache
+from agents.modules import cascade
+from agents.modules.tools import (
+    ToolRegistry,
+    prompt_token_report,
+    print_prompt_token_report,
+)
+from agents.modules.streaming import SessionStream, set_speaker
+from agents.modules import fast_path
+from agents.modules.sql_templates import TemplateCache, TEMPLATE_RESULT_PROMPT
+from agents.modules.answer_cache import (
+    AnswerCache,
+    CACHED_ANSWER_PROMPT,
+    final_answer,
+)
 from autogen.agentchat.contrib.gpt_assistant_agent import GPTAssistantAgent
+from autogen.io import IOStream
 from autogen.agentchat import AssistantAgent, UserProxyAgent
 
 
@@ -28,31 +59,21 @@ SQL_DELIMITER = "---------"
 app = Flask(__name__)
 cors = CORS(app)
 
-# Using queues to store messages for frontend
-print_queue = queue.Queue()  # stores messages to send to frontend
-user_queue = queue.Queue()  # stores user inputs
-
-chat_status = "ended"
+# Every chat gets its own message queues and status, keyed by session id
+sessions = SessionRegistry()
+# Bounded pool of chat workers, see MAX_CONCURRENT_CHATS / MAX_WAITING_CHATS
+chat_pool = ChatPool()
+# Latency / token / cost metrics, see /metrics and /api/session_metrics
+metrics.enable()
+# SQL of product searches learned from the agent, see SQL_TEMPLATE_FILE
+sql_template_cache = TemplateCache()
+# Final answers of repeated recommendation requests, see ANSWER_CACHE_TTL
+answer_cache = AnswerCache()
 
 
 # Define the ConversableAgent to handle user input asynchronously
-class MyConversableAgent(autogen.ConversableAgent):
-    async def a_get_human_input(self, prompt: str) -> str:
-        input_prompt = "Please input your further direction, or type 'approved' to proceed, or type 'exit' to end the conversation"
-        print_queue.put({"user": "System", "message": input_prompt})
-
-        start_time = time.time()
-        global chat_status
-        chat_status = "inputting"
-        while True:
-            if not user_queue.empty():
-                input_value = user_queue.get()
-                chat_status = "Chat ongoing"
-                return input_value
-            if time.time() - start_time > 600:
-                chat_status = "ended"
-                return "exit"
-            await asyncio.sleep(1)
+class MyConversableAgent(SessionInputMixin, autogen.ConversableAgent):
+    pass
 
 
 # Print messages function for agent communication
@@ -63,13 +84,21 @@ def print_messages(recipient, messages, sender, config):
     )
 
     content = messages[-1]["content"]
+    session = config["session"]
 
     if all(key in messages[-1] for key in ["name"]):
-        print_queue.put({"user": messages[-1]["name"], "message": content})
+        author = messages[-1]["name"]
     elif messages[-1]["role"] == "user":
-        print_queue.put({"user": sender.name, "message": content})
+        author = sender.name
     else:
-        print_queue.put({"user": recipient.name, "message": content})
+        author = recipient.name
+    # image parts of multimodal messages are not JSON, send their text
+    session.put_message({"user": author, "message": message_content(content)})
+
+    # the author of the last message has just finished its turn
+    metrics.registry.record_turn(session.session_id, author)
+    # and `recipient` is about to reply, label its streamed deltas
+    set_speaker(recipient.name)
 
     return False, None  # conversation continued
 
@@ -82,46 +111,96 @@ async def initiate_chat(agent, recipient, message):
     return result
 
 
+# Agent definitions are static, they are compiled into templates once at startup
+AGENT_INFO = [
+    {
+        "name": "product_recommendation_agent",
+        "type": "AssistantAgent",
+        "llm": {"model": "gpt-4o-mini"},
+        "tools": ["recommend_product", "buy_product"],
+        "cascade": {"checks": ["function_call", "confident"]},
+        "stream": True,
+        "system_message": """I recommend products based on customer preferences. After recommendation, I will ask if the customer wants to purchase the product before saving the customer and order details. I will make sure about below details before I take any action
+        - if customer give the product name like shirt, shorts etc.. then I will use keyword search in product name to find the relevant data.
+        - if the customer ask for product of specific size like large, small or medium then I will search for first letter of that in capital letter in size column.
+        """,
+        "description": "This is a assistant agent who can recommend products based on customer preferences. Also perform purchsing if user wants to buy that product",
+    },
+    {
+        "name": "order_status_agent",
+        "type": "AssistantAgent",
+        "llm": {"model": "gpt-4o-mini"},
+        "tools": ["get_order_status"],
+        "cascade": {"checks": ["function_call", "confident"]},
+        "stream": True,
+        "system_message": "I retrieve order details based on the order ID provided by the customer. Return the response in proper format by summarizing the data",
+        "description": "This is a assistant agent who can retrieve order details based on the order ID provided by the customer. if not provided then ask for it",
+    },
+]
+
+TASK_INFO = {
+    "id": 0,
+    "name": "Personal Assistant",
+    "description": "This is a powerful personal assistant.",
+    "maxMessages": 50,
+    "speakSelMode": "auto",
+}
+
+# Agents each front-door intent needs; unclassified requests get all of them.
+# A pipeline has a single assistant, so its turns follow PIPELINE_GRAPH.
+PIPELINES = {
+    intents.RECOMMENDATION: ["product_recommendation_agent"],
+    intents.ORDER_STATUS: ["order_status_agent"],
+}
+PIPELINE_TASK_INFO = {**TASK_INFO, "speakSelMode": "graph"}
+
+
 # Define function to initialize agents and initiate chat
-def run_chat(request_json):
-    global chat_status
+def run_chat(session, request_json):
+    # LLM calls, tools and agents created on this thread belong to this session
+    metrics.current_session.set(session.session_id)
+    metrics.registry.session(session.session_id)
     try:
         user_input = request_json.get("message")
-        agent_info = [
-            {
-                "name": "product_recommendation_agent",
-                "type": "AssistantAgent",
-                "llm": {"model": "gpt-4o-mini"},
-                "system_message": """I recommend products based on customer preferences. After recommendation, I will ask if the customer wants to purchase the product before saving the customer and order details. I will make sure about below details before I take any action
-                - if customer give the product name like shirt, shorts etc.. then I will use keyword search in product name to find the relevant data.
-                - if the customer ask for product of specific size like large, small or medium then I will search for first letter of that in capital letter in size column.
-                """,
-                "description": "This is a assistant agent who can recommend products based on customer preferences. Also perform purchsing if user wants to buy that product",
-            },
-            {
-                "name": "order_status_agent",
-                "type": "AssistantAgent",
-                "llm": {"model": "gpt-4o-mini"},
-                "system_message": "I retrieve order details based on the order ID provided by the customer. Return the response in proper format by summarizing the data",
-                "description": "This is a assistant agent who can retrieve order details based on the order ID provided by the customer. if not provided then ask for it",
-            },
-        ]
-        task_info = {
-            "id": 0,
-            "name": "Personal Assistant",
-            "description": "This is a powerful personal assistant.",
-            "maxMessages": 50,
-            "speakSelMode": "auto",
-        }
 
-        # Setup DB manager and connect
+        # Setup DB manager on the shared connection pool
         db = PostgresManager()
         db.connect_with_url(DATABASE_URL)
 
+        # Plain order status / total price lookups are answered without agents
+        fast_answer = fast_path.try_answer(db, user_input)
+        if fast_answer is not None:
+            session.put_message({"user": "order_status_agent", "message": fast_answer})
+            metrics.registry.record_turn(session.session_id, "order_status_agent")
+            session.set_status("ended")
+            return
+
+        # A recommendation request asked before, against the same catalog,
+        # gets the previous answer without running the agents. The chat
+        # stays open: a follow-up (e.g. buying one of the products) starts
+        # the agents with the answer the customer has already seen.
+        answer_key, cached_answer = answer_cache.lookup(db, user_input)
+        follow_up = None
+        if cached_answer is not None:
+            session.put_message(
+                {
+                    "user": cached_answer["agent"],
+                    "message": cached_answer["message"],
+                    "cached": True,
+                }
+            )
+            metrics.registry.record_turn(session.session_id, cached_answer["agent"])
+            follow_up = run_on_worker_loop(session.ask())
+            if follow_up is None or follow_up.strip().lower() == "exit":
+                session.set_status("ended")
+                return
+            answer_key = None
+
         table_definitions = db.get_table_definitions_for_prompt()
 
         # AutoGen-related agents configuration
-        prompt = f"Fulfill this request: {user_input}. "
+        prompt = f"Fulfill this request: {user_input}."
+        # table definitions first: a byte-identical prefix for prompt caching
         prompt = llm.add_cap_ref(
             prompt,
             f"Use these {POSTGRES_TABLE_DEFINITIONS_CAP_REF} to satisfy the database query related to cloth retail.",
@@ -130,28 +209,71 @@ def run_chat(request_json):
         )
 
         # print("prompt: ", prompt)
-        userproxy = create_userproxy()
+        userproxy = create_userproxy(session, user_input)
+
+        intent = intents.classify_intent(user_input, PIPELINES)
+        metrics.registry.record_intent(session.session_id, intent)
+
+        products = None
+        if follow_up is not None:
+            prompt += "\n\n" + CACHED_ANSWER_PROMPT.format(
+                answer=cached_answer["message"], reply=follow_up
+            )
+        # a search shape seen before runs from its learned SQL template,
+        # the agent only has to present the products
+        elif intent == intents.RECOMMENDATION:
+            products = sql_template_cache.run(db, user_input)
+            if products is not None:
+                prompt += "\n\n" + TEMPLATE_RESULT_PROMPT.format(products=products)
+
+        templates = select_templates(agent_templates, PIPELINES.get(intent))
+        task_info = PIPELINE_TASK_INFO if intent else TASK_INFO
+
+        # clients that start the chat with "stream": true get reply deltas,
+        # only their agents stream
+        iostream = SessionStream(session) if request_json.get("stream") else None
+        manager, assistants = create_groupchat(
+            templates, task_info, userproxy, session, user_input, iostream is not None
+        )
 
-        manager, assistants = create_groupchat(agent_info, task_info, userproxy)
+        with IOStream.set_default(iostream):
+            run_on_worker_loop(initiate_chat(userproxy, manager, prompt))
+        session.set_status("ended")
 
-        asyncio.run(initiate_chat(userproxy, manager, prompt))
-        chat_status = "ended"
+        if answer_key is not None and intent == intents.RECOMMENDATION:
+            answer = final_answer(
+                session.messages_since(0)[0],
+                "product_recommendation_agent",
+                searched=products is not None,
+            )
+            if answer is not None:
+                answer_cache.put(answer_key, *answer)
 
     except Exception as e:
-        chat_status = "error"
-        print_queue.put({"user": "System", "message": f"An error occurred: {str(e)}"})
+        session.put_message(
+            {"user": "System", "message": f"An error occurred: {str(e)}"}
+        )
+        session.set_status("error")
 
+    finally:
+        metrics.registry.finish_session(session.session_id, session.chat_status)
 
-def create_userproxy():
+
+def create_userproxy(session, user_input=None):
     db = PostgresManager()
     db.connect_with_url(DATABASE_URL)
 
-    function_map = {
-        "recommend_product": db.recommend_product,
-        "buy_product": db.buy_product,
-        "get_order_status": db.get_order_status,
-    }
+    function_map = metrics.registry.timed_tools(
+        {
+            "recommend_product": sql_template_cache.learning(
+                db.recommend_product, user_input
+            ),
+            "buy_product": db.buy_product,
+            "get_order_status": db.get_order_status,
+        }
+    )
     user_proxy = MyConversableAgent(
+        session=session,
         name="User_Proxy",
         code_execution_config=False,
         is_termination_msg=lambda msg: "TERMINATE" in msg["content"],
@@ -161,7 +283,7 @@ def create_userproxy():
     user_proxy.register_reply(
         [autogen.Agent, None],
         reply_func=print_messages,
-        config={"callback": None},
+        config={"callback": None, "session": session},
     )
     return user_proxy
 
@@ -173,158 +295,242 @@ agent_classes = {
 }
 
 
-def create_groupchat(agents_info, task_info, user_proxy):
-    assistants = []
-
-    db = PostgresManager()
-    db.connect_with_url(DATABASE_URL)
+FUNCTIONS = [
+    {
+        "name": "recommend_product",
+        "description": "Retrieves product recommendations based on the user's preferences by running SQL query against the postgres database. Returns the matching rows as columns and rows, the total row_count, and truncated when only the first rows are included. A query that is rejected or fails returns an error instead",
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "sql": {
+                    "type": "string",
+                    "description": "The SQL query to run",
+                }
+            },
+            "required": ["sql"],
+        },
+    },
+    {
+        "name": "buy_product",
+        "description": "Saves customer and order details when a product is purchased by running SQL query against the postgres database",
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "firstname": {
+                    "type": "string",
+                    "description": "First Name of the customer",
+                },
+                "lastname": {
+                    "type": "string",
+                    "description": "Last Name of the customer",
+                },
+                "email": {
+                    "type": "string",
+                    "description": "Email of the customer",
+                },
+                "phonenumber": {
+                    "type": "string",
+                    "description": "Phone Number of the customer",
+                },
+                "shippingaddress": {
+                    "type": "string",
+                    "description": "Shipping Address of the customer",
+                },
+                "creditcardnumber": {
+                    "type": "string",
+                    "description": "Credit Card Number of the customer",
+                },
+                "productid": {
+                    "type": "integer",
+                    "description": "The ID of the product being purchased",
+                },
+                "quantity": {
+                    "type": "integer",
+                    "description": "Quantity of the product",
+                },
+            },
+            "required": [
+                "firstname",
+                "lastname",
+                "email",
+                "phonenumber",
+                "shippingaddress",
+                "creditcardnumber",
+                "productid",
+                "quantity",
+            ],
+        },
+    },
+    {
+        "name": "get_order_status",
+        "description": "Retrieves order status based on orderid",
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "order_id": {
+                    "type": "integer",
+                    "description": "The ID of the order to retrieve status for",
+                }
+            },
+            "required": ["order_id"],
+        },
+    },
+    # {
+    #     "name": "product_recommendation_flow",
+    #     "description": "Handles the flow for purchasing the product if user wants to buy the recommended product",
+    #     "parameters": {
+    #         "type": "object",
+    #         "properties": {},
+    #         "required": [],
+    #     },
+    # }
+]
+
+
+TOOLS = ToolRegistry(FUNCTIONS)
+
+
+def compile_agent_templates(agents_info):
+    """
+    Build every assistant and the GroupChatManager once. Per-session agents
+    are cloned from these prototypes in create_groupchat.
+    """
+    templates = []
 
     for agent_info in agents_info:
         if agent_info["type"] == "UserProxyAgent":
             continue
 
         llm_config = {
-            "config_list": [agent_info["llm"]],
+            # cheap model first, escalated per the agent's "cascade" policy
+            **cascade.llm_config(agent_info, TOOLS.select(agent_info.get("tools", ()))),
             "temperature": 0,
             "seed": 44,
+            **llm_cache.cache_config(),
+            **llm.client_config(),
             # "request_timeout": 120,
-            "functions": [
-                {
-                    "name": "recommend_product",
-                    "description": "Retrieves product recommendations based on the user's preferences by running SQL query against the postgres database",
-                    "parameters": {
-                        "type": "object",
-                        "properties": {
-                            "sql": {
-                                "type": "string",
-                                "description": "The SQL query to run",
-                            }
-                        },
-                        "required": ["sql"],
-                    },
-                },
-                {
-                    "name": "buy_product",
-                    "description": "Saves customer and order details when a product is purchased by running SQL query against the postgres database",
-                    "parameters": {
-                        "type": "object",
-                        "properties": {
-                            "firstname": {
-                                "type": "string",
-                                "description": "First Name of the customer",
-                            },
-                            "lastname": {
-                                "type": "string",
-                                "description": "Last Name of the customer",
-                            },
-                            "email": {
-                                "type": "string",
-                                "description": "Email of the customer",
-                            },
-                            "phonenumber": {
-                                "type": "string",
-                                "description": "Phone Number of the customer",
-                            },
-                            "shippingaddress": {
-                                "type": "string",
-                                "description": "Shipping Address of the customer",
-                            },
-                            "creditcardnumber": {
-                                "type": "string",
-                                "description": "Credit Card Number of the customer",
-                            },
-                            "productid": {
-                                "type": "integer",
-                                "description": "The ID of the product being purchased",
-                            },
-                            "quantity": {
-                                "type": "integer",
-                                "description": "Quantity of the product",
-                            },
-                        },
-                        "required": [
-                            "firstname",
-                            "lastname",
-                            "email",
-                            "phonenumber",
-                            "shippingaddress",
-                            "creditcardnumber",
-                            "productid",
-                            "quantity",
-                        ],
-                    },
-                },
-                {
-                    "name": "get_order_status",
-                    "description": "Retrieves order status based on orderid",
-                    "parameters": {
-                        "type": "object",
-                        "properties": {
-                            "order_id": {
-                                "type": "integer",
-                                "description": "The ID of the order to retrieve status for",
-                            }
-                        },
-                        "required": ["order_id"],
-                    },
-                },
-                # {
-                #     "name": "product_recommendation_flow",
-                #     "description": "Handles the flow for purchasing the product if user wants to buy the recommended product",
-                #     "parameters": {
-                #         "type": "object",
-                #         "properties": {},
-                #         "required": [],
-                #     },
-                # }
-            ],
+            # only the schemas of the tools this agent declares
+            **TOOLS.llm_config(agent_info),
         }
 
-        llm_config_manager = {
-            "config_list": [agent_info["llm"]],
-            "temperature": 0,
-            "seed": 44,
-        }
+        AgentClass = agent_classes[agent_info["type"]]
+        templates.append(
+            AgentTemplate(
+                AgentClass,
+                tools=agent_info.get("tools", ()),
+                # a streaming variant for sessions started with "stream": true
+                stream=agent_info.get("stream", False) and llm.LLM_STREAMING,
+                name=agent_info["name"],
+                llm_config=llm_config,
+                system_message=agent_info["system_message"],
+                description=agent_info["description"],
+            )
+        )
+        # keep each agent's prompt within its token budget on long chats
+        templates[-1].add_capability(
+            HistoryCompaction(
+                max_tokens=agent_info.get(
+                    "max_history_tokens", DEFAULT_MAX_HISTORY_TOKENS
+                )
+            )
+        )
+
+    # speaker selection is a routing call, the cheapest model is enough
+    llm_config_manager = {
+        "config_list": [{"model": cascade.FAST_MODEL}],
+        "temperature": 0,
+        "seed": 44,
+        **llm_cache.cache_config(),
+        **llm.client_config(),
+    }
+
+    manager_template = GroupChatManagerTemplate(
+        llm_config=llm_config_manager,
+        system_message="",
+    )
+
+    print_prompt_token_report(prompt_token_report(agents_info, TOOLS))
+
+    return templates, manager_template
+
+
+agent_templates, manager_template = compile_agent_templates(AGENT_INFO)
+
+
+def route_after_assistant(groupchat):
+    last_message = groupchat.messages[-1]
+    if last_message.get("role") == "function":
+        # the assistant that made the call summarises its result
+        return groupchat.messages[-2].get("name")
+    return "User_Proxy"
+
 
-        function_map = {
-            "recommend_product": db.recommend_product,
+PIPELINE_GRAPH = TransitionGraph(
+    transitions={
+        "User_Proxy": ["product_recommendation_agent", "order_status_agent"],
+        "product_recommendation_agent": ["User_Proxy", "product_recommendation_agent"],
+        "order_status_agent": ["User_Proxy", "order_status_agent"],
+    },
+    routes={
+        "product_recommendation_agent": route_after_assistant,
+        "order_status_agent": route_after_assistant,
+    },
+)
+
+
+def create_groupchat(
+    agent_templates, task_info, user_proxy, session, user_input=None, stream=False
+):
+    assistants = []
+
+    db = PostgresManager()
+    db.connect_with_url(DATABASE_URL)
+
+    function_map = metrics.registry.timed_tools(
+        {
+            "recommend_product": sql_template_cache.learning(
+                db.recommend_product, user_input
+            ),
             "buy_product": db.buy_product,
             "get_order_status": db.get_order_status,
             # "product_recommendation_flow": product_recommendation_flow,
         }
+    )
 
-        AgentClass = agent_classes[agent_info["type"]]
-        assistant = AgentClass(
-            name=agent_info["name"],
-            llm_config=llm_config,
-            system_message=agent_info["system_message"],
-            description=agent_info["description"],
-            function_map=function_map,
-        )
-
+    for template in agent_templates:
+        assistant = template.instantiate(function_map, stream)
         assistant.register_reply(
             [autogen.Agent, None],
             reply_func=print_messages,
-            config={"callback": None},
+            config={"callback": None, "session": session},
         )
         assistants.append(assistant)
 
-    if len(assistants) == 1:
+    if len(assistants) == 1 and task_info["speakSelMode"] != "graph":
         manager = assistants[0]
 
-    elif len(assistants) > 1:
-        groupchat = autogen.GroupChat(
-            agents=[user_proxy] + assistants,
+    else:
+        agents = [user_proxy] + assistants
+        speaker_selection = {"speaker_selection_method": task_info["speakSelMode"]}
+        if task_info["speakSelMode"] == "graph":
+            speaker_selection = {
+                "speaker_selection_method": PIPELINE_GRAPH,
+                "allowed_or_disallowed_speaker_transitions": PIPELINE_GRAPH.allowed_transitions(
+                    agents
+                ),
+                "speaker_transitions_type": "allowed",
+            }
+
+        groupchat = metrics.TimedGroupChat(
+            agents=agents,
             messages=[],
             max_round=task_info["maxMessages"],
-            speaker_selection_method=task_info["speakSelMode"],
-        )
-        manager = autogen.GroupChatManager(
-            groupchat=groupchat,
-            llm_config=llm_config_manager,
-            system_message="",
+            metrics_session_id=session.session_id,
+            **speaker_selection,
         )
+        manager = manager_template.instantiate(groupchat)
 
+    metrics.registry.track(session.session_id, user_proxy, manager, *assistants)
     return manager, assistants
 
 
@@ -334,57 +540,142 @@ def start_chat():
     if request.method == "OPTIONS":
         return jsonify({}), 200
     elif request.method == "POST":
-        global chat_status
         try:
-            if chat_status == "error":
-                chat_status = "ended"
-
-            with print_queue.mutex:
-                print_queue.queue.clear()
-            with user_queue.mutex:
-                user_queue.queue.clear()
-
-            chat_status = "Chat ongoing"
+            session = sessions.create()
 
-            thread = threading.Thread(target=run_chat, args=(request.json,))
-            thread.start()
-
-            return jsonify({"status": chat_status})
+            try:
+                position = chat_pool.submit(session, run_chat, request.json)
+            except ChatPoolFull:
+                sessions.remove(session.session_id)
+                return (
+                    jsonify(
+                        {
+                            "status": "Too many chats, please retry later",
+                            **chat_pool.stats(),
+                        }
+                    ),
+                    429,
+                    {"Retry-After": "5"},
+                )
+
+            return jsonify(
+                {
+                    "status": session.chat_status,
+                    "session_id": session.session_id,
+                    "queue_position": position,
+                }
+            )
         except Exception as e:
             return jsonify({"status": "Error occurred", "error": str(e)})
 
 
 @app.route("/api/send_message", methods=["POST"])
 def send_message():
+    session = sessions.get(request.json.get("session_id"))
+    if session is None:
+        return jsonify({"status": "Session not found"}), 404
+
     user_input = request.json["message"]
-    user_queue.put(user_input)
+    session.put_user_input(user_input)
     return jsonify({"status": "Message Received"})
 
 
 @app.route("/api/get_message", methods=["GET"])
 def get_messages():
-    global chat_status
+    session = sessions.get(request.args.get("session_id"))
+    if session is None:
+        return jsonify({"message": None, "chat_status": "Session not found"}), 404
+
+    msg = session.next_message()
+    if msg is not None:
+        msg = parse_message(msg)
+        return jsonify({"message": msg, "chat_status": session.chat_status}), 200
+    elif session.chat_status == "queued":
+        return (
+            jsonify(
+                {
+                    "message": None,
+                    "chat_status": session.chat_status,
+                    "queue_position": chat_pool.queue_position(session.session_id),
+                }
+            ),
+            200,
+        )
+    else:
+        return jsonify({"message": None, "chat_status": session.chat_status}), 200
 
-    if not print_queue.empty():
-        msg = print_queue.get()
 
-        # If msg is already a dict, skip json.loads
-        if isinstance(msg, str):  # Only attempt to load if it's a string
-            try:
-                msg = json.loads(msg)
-            except json.JSONDecodeError:
-                pass  # If `msg` is not a JSON string, keep it as is
+@app.route("/api/poll_messages", methods=["GET"])
+def poll_messages():
+    """
+    Long-poll: waits up to `timeout` seconds for messages after `cursor` and
+    returns the whole backlog at once along with the cursor to resume from.
+    """
+    session = sessions.get(request.args.get("session_id"))
+    if session is None:
+        return jsonify({"messages": [], "chat_status": "Session not found"}), 404
 
-        # Ensure the 'message' part is also parsed if it's a JSON string
-        if isinstance(msg, dict) and isinstance(msg.get("message"), str):
-            try:
-                msg["message"] = json.loads(msg["message"])
-            except json.JSONDecodeError:
-                pass  # If the 'message' is not a JSON string, keep it as is
+    cursor = request.args.get("cursor", 0, type=int)
+    timeout = min(request.args.get("timeout", 25, type=float), 60)
 
-        return jsonify({"message": msg, "chat_status": chat_status}), 200
-    else:
-        return jsonify({"message": None, "chat_status": chat_status}), 200
+    batch, cursor = session.messages_since(cursor, timeout=timeout)
+    return (
+        jsonify(
+            {
+                "messages": [parse_message(msg) for msg in batch],
+                "cursor": cursor,
+                "chat_status": session.chat_status,
+            }
+        ),
+        200,
+    )
+
+
+@app.route("/api/stream_messages", methods=["GET"])
+def stream_messages():
+    """
+    Server-Sent Events stream of the chat. Resumes after the `cursor` query
+    parameter or the Last-Event-ID header sent by a reconnecting EventSource.
+    """
+    session = sessions.get(request.args.get("session_id"))
+    if session is None:
+        return jsonify({"chat_status": "Session not found"}), 404
+
+    cursor = request.headers.get("Last-Event-ID", type=int)
+    if cursor is None:
+        cursor = request.args.get("cursor", 0, type=int)
+
+    return Response(
+        stream_with_context(sse_events(session, cursor)),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.route("/metrics", methods=["GET"])
+def prometheus_metrics():
+    extra = metrics.service_metrics(
+        sessions,
+        chat_pool,
+        PIPELINE_GRAPH,
+        agent_templates,
+        llm_cache.response_cache,
+        sql_template_cache,
+        answer_cache,
+        pool_stats(),
+    )
+    return Response(
+        metrics.registry.render(extra), mimetype="text/plain; version=0.0.4"
+    )
+
+
+@app.route("/api/session_metrics", methods=["GET"])
+def session_metrics():
+    """Per-agent latency, token and cost summary of one chat session."""
+    tracked = metrics.registry.get_session(request.args.get("session_id"))
+    if tracked is None:
+        return jsonify({"status": "Session not found"}), 404
+    return jsonify(tracked.summary()), 200
 
 
 # def get_messages():
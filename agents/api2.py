@@ -1,17 +1,47 @@
 import os
-import time
 import asyncio
-import threading
 import dotenv
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, stream_with_context
 from flask_cors import CORS
 import queue
 import autogen
 import json
 
-from agents.modules.db import PostgresManager
+from agents.modules.db import PostgresManager, pool_stats
 from agents.modules import llm
+from agents.modules.sessions import (
+    SessionInputMixin,
+    SessionRegistry,
+    message_content,
+    parse_message,
+    sse_events,
+)
+from agents.modules.chat_pool import ChatPool, ChatPoolFull, run_on_worker_loop
+from agents.modules.agent_templates import (
+    AgentTemplate,
+    GroupChatManagerTemplate,
+    select_templates,
+)
+from agents.modules import intents
+from agents.modules.history import HistoryCompaction, DEFAULT_MAX_HISTORY_TOKENS
+from agents.modules import metrics
+from agents.modules import llm_cache
+from agents.modules import cascade
+from agents.modules.tools import (
+    ToolRegistry,
+    prompt_token_report,
+    print_prompt_token_report,
+)
+from agents.modules.streaming import SessionStream, set_speaker
+from agents.modules.speaker_selection import (
+    TransitionGraph,
+    has_image,
+    last_speaker_among,
+    mentions,
+    message_text,
+)
 from autogen.agentchat.contrib.gpt_assistant_agent import GPTAssistantAgent
+from autogen.io import IOStream
 from autogen.agentchat import AssistantAgent, UserProxyAgent
 
 from PIL import Image
@@ -38,36 +68,23 @@ RESPONSE_FORMAT_CAP_REF = "RESPONSE_FORMAT"
 SQL_DELIMITER = "---------"
 
 
+# thread-safe, every call borrows a pooled connection, see POSTGRES_POOL_*
 db = PostgresManager()
 db.connect_with_url(DATABASE_URL)
 app = Flask(__name__)
 cors = CORS(app)
 
-# Using queues to store messages for frontend
-print_queue = queue.Queue()  # stores messages to send to frontend
-user_queue = queue.Queue()  # stores user inputs
-
-chat_status = "ended"
+# Every chat gets its own message queues and status, keyed by session id
+sessions = SessionRegistry()
+# Bounded pool of chat workers, see MAX_CONCURRENT_CHATS / MAX_WAITING_CHATS
+chat_pool = ChatPool()
+# Latency / token / cost metrics, see /metrics and /api/session_metrics
+metrics.enable()
 
 
 # Define the ConversableAgent to handle user input asynchronously
-class MyConversableAgent(autogen.ConversableAgent):
-    async def a_get_human_input(self, prompt: str) -> str:
-        input_prompt = "Please input your further direction, or type 'approved' to proceed, or type 'exit' to end the conversation"
-        print_queue.put({"user": "System", "message": input_prompt})
-
-        start_time = time.time()
-        global chat_status
-        chat_status = "inputting"
-        while True:
-            if not user_queue.empty():
-                input_value = user_queue.get()
-                chat_status = "Chat ongoing"
-                return input_value
-            if time.time() - start_time > 600:
-                chat_status = "ended"
-                return "exit"
-            await asyncio.sleep(1)
+class MyConversableAgent(SessionInputMixin, autogen.ConversableAgent):
+    pass
 
 
 # Print messages function for agent communication
@@ -78,13 +95,21 @@ def print_messages(recipient, messages, sender, config):
     )
 
     content = messages[-1]["content"]
+    session = config["session"]
 
     if all(key in messages[-1] for key in ["name"]):
-        print_queue.put({"user": messages[-1]["name"], "message": content})
+        author = messages[-1]["name"]
     elif messages[-1]["role"] == "user":
-        print_queue.put({"user": sender.name, "message": content})
+        author = sender.name
     else:
-        print_queue.put({"user": recipient.name, "message": content})
+        author = recipient.name
+    # image parts of multimodal messages are not JSON, send their text
+    session.put_message({"user": author, "message": message_content(content)})
+
+    # the author of the last message has just finished its turn
+    metrics.registry.record_turn(session.session_id, author)
+    # and `recipient` is about to reply, label its streamed deltas
+    set_speaker(recipient.name)
 
     return False, None  # conversation continued
 
@@ -97,77 +122,110 @@ async def initiate_chat(agent, recipient, message):
     return result
 
 
+# Agent definitions are static, they are compiled into templates once at startup
+AGENT_INFO = [
+    {
+        "name": "package_shipping_status_agent",
+        "type": "AssistantAgent",
+        "llm": {"model": "gpt-4o-mini"},
+        "cascade": {
+            "checks": ["decision"],
+            "decisions": ["Refund", "Replace", "Escalate"],
+        },
+        "stream": True,
+        "system_message": """if the image is of package then you will use the description of the image from image_explainer agent and give the final one decision out of below along with its description as well as the image url in proper markdown format.
+        1) Refund: if package seems seriously damaged then you will provide the refund to the customer.
+        2) Replace: if package is having water exposure or discoloration or dirt observed then you will replace the package
+        3) Escalate to human agent: if there is no defect or damage in the package then you will escalate to human agent for further assistance.
+        """,
+        "description": "This is a assistant agent who can recommend products based on customer preferences. Also perform purchsing if user wants to buy that product",
+    },
+    {
+        "name": "product_shipping_status_agent",
+        "type": "AssistantAgent",
+        "llm": {"model": "gpt-4o-mini"},
+        "cascade": {"checks": ["decision"], "decisions": ["Refund", "Escalate"]},
+        "stream": True,
+        "system_message": """if the image is of product or cloth then you will use the description of the image from image_explainer agent and give the final one decision out of below along with its description as well as the image url in proper markdown format.
+        1) Refund: if product seems defective then you will provide the refund to the customer.
+        2) Escalate to human agent: if there is no defect observed in the product then you will escalate to human agent for further assistance.
+        """,
+        "description": "agent to give decision for defective product",
+    },
+    {
+        "name": "image_explainer",
+        "type": "MultimodalConversableAgent",
+        "llm": {"model": "gpt-4o-mini"},
+        "system_message": "for any request related to condition, status or description of damaged package or defective product then I will give the detailed description. if image is not provided then I will ask for image url and then I will give the detailed description of the image. I will only proceed to other agent after I get the image and I give the description. if image is is not of package or any product then I will reply with that along with the image url and description that it is out of scope",
+        "description": "for any request related to condition, status or description of image then I will give the detailed description of tha image",
+    },
+    {
+        "name": "OCRExtractionAgent",
+        "type": "MultimodalConversableAgent",
+        "llm": {"model": "gpt-4o-mini"},
+        "system_message": "Extracts order details (e.g., Order ID, Quantity, Price, and Billed Price) from OCR image and provide the extracted details to the user in proper markdown",
+        "description": "Extracts order details (e.g., Order ID, Quantity, Price, and Billed Price) from OCR image.",
+    },
+    {
+        "name": "price_retrieval_agent",
+        "type": "AssistantAgent",
+        "llm": {"model": "gpt-4o-mini"},
+        "tools": ["get_totalprice_from_db"],
+        "cascade": {"checks": ["function_call"]},
+        "system_message": "Retrieve the total price from the database for a given order ID.",
+        "description": "Retrieve the total price from the database for a given order ID.",
+        "function_map": {"get_totalprice_from_db": db.get_totalprice},
+    },
+    {
+        "name": "Fraudulent_Transactions_AI_Agent",
+        "type": "AssistantAgent",
+        "llm": {"model": "gpt-4o-mini"},
+        "cascade": {
+            "checks": ["function_call", "decision"],
+            "decisions": ["Refund", "Decline", "Escalate"],
+        },
+        "stream": True,
+        "system_message": """   "first, extract the text data having billing related informations. Then, fetch the total price from the database using the order ID extracted from the OCR data.\n\n"
+        "Then, compare price you fetched from database with the billed price provided from the OCR data, and classify the order as follows:\n\n"
+        "- Refund: Refund if the billed price does not match the total price in the database.\n"
+        "- Decline: Decline if the billed price matches the total price in the database.\n"
+        "- Escalate: Escalate if the order ID is not found in the database.\n\n"
+        "Provide a clear justification with your final classification.""",
+        "description": "verify the order details extracted from OCR with the one fetched from database to take the appropriate decision for fraudulent transaction.",
+    },
+]
+
+# Agents each front-door intent needs; unclassified requests get all of them
+PIPELINES = {
+    intents.DAMAGE_CLAIM: [
+        "image_explainer",
+        "package_shipping_status_agent",
+        "product_shipping_status_agent",
+    ],
+    intents.FRAUD_BILL: [
+        "OCRExtractionAgent",
+        "price_retrieval_agent",
+        "Fraudulent_Transactions_AI_Agent",
+    ],
+}
+
+# image_explainer:  for any request related to condition, status or description of damaged then I will give the detailed description of the image. if image is not provided then I will ask for image or orderid"
+TASK_INFO = {
+    "id": 0,
+    "name": "Personal Assistant",
+    "description": "This is a powerful personal assistant.",
+    "maxMessages": 60,
+    "speakSelMode": "graph",
+}
+
+
 # Define function to initialize agents and initiate chat
-def run_chat(request_json):
-    global chat_status
+def run_chat(session, request_json):
+    # LLM calls, tools and agents created on this thread belong to this session
+    metrics.current_session.set(session.session_id)
+    metrics.registry.session(session.session_id)
     try:
         user_input = request_json.get("message")
-        agent_info = [
-            {
-                "name": "package_shipping_status_agent",
-                "type": "AssistantAgent",
-                "llm": {"model": "gpt-4o-mini"},
-                "system_message": """if the image is of package then you will use the description of the image from image_explainer agent and give the final one decision out of below along with its description as well as the image url in proper markdown format.
-                1) Refund: if package seems seriously damaged then you will provide the refund to the customer.
-                2) Replace: if package is having water exposure or discoloration or dirt observed then you will replace the package
-                3) Escalate to human agent: if there is no defect or damage in the package then you will escalate to human agent for further assistance.
-                """,
-                "description": "This is a assistant agent who can recommend products based on customer preferences. Also perform purchsing if user wants to buy that product",
-            },
-            {
-                "name": "product_shipping_status_agent",
-                "type": "AssistantAgent",
-                "llm": {"model": "gpt-4o-mini"},
-                "system_message": """if the image is of product or cloth then you will use the description of the image from image_explainer agent and give the final one decision out of below along with its description as well as the image url in proper markdown format.
-                1) Refund: if product seems defective then you will provide the refund to the customer.
-                2) Escalate to human agent: if there is no defect observed in the product then you will escalate to human agent for further assistance.
-                """,
-                "description": "agent to give decision for defective product",
-            },
-            {
-                "name": "image_explainer",
-                "type": "MultimodalConversableAgent",
-                "llm": {"model": "gpt-4o-mini"},
-                "system_message": "for any request related to condition, status or description of damaged package or defective product then I will give the detailed description. if image is not provided then I will ask for image url and then I will give the detailed description of the image. I will only proceed to other agent after I get the image and I give the description. if image is is not of package or any product then I will reply with that along with the image url and description that it is out of scope",
-                "description": "for any request related to condition, status or description of image then I will give the detailed description of tha image",
-            },
-            {
-                "name": "OCRExtractionAgent",
-                "type": "MultimodalConversableAgent",
-                "llm": {"model": "gpt-4o-mini"},
-                "system_message": "Extracts order details (e.g., Order ID, Quantity, Price, and Billed Price) from OCR image and provide the extracted details to the user in proper markdown",
-                "description": "Extracts order details (e.g., Order ID, Quantity, Price, and Billed Price) from OCR image.",
-            },
-            {
-                "name": "price_retrieval_agent",
-                "type": "AssistantAgent",
-                "llm": {"model": "gpt-4o-mini"},
-                "system_message": "Retrieve the total price from the database for a given order ID.",
-                "description": "Retrieve the total price from the database for a given order ID.",
-                "function_map": {"get_totalprice_from_db": db.get_totalprice},
-            },
-            {
-                "name": "Fraudulent_Transactions_AI_Agent",
-                "type": "AssistantAgent",
-                "llm": {"model": "gpt-4o-mini"},
-                "system_message": """   "first, extract the text data having billing related informations. Then, fetch the total price from the database using the order ID extracted from the OCR data.\n\n"
-                "Then, compare price you fetched from database with the billed price provided from the OCR data, and classify the order as follows:\n\n"
-                "- Refund: Refund if the billed price does not match the total price in the database.\n"
-                "- Decline: Decline if the billed price matches the total price in the database.\n"
-                "- Escalate: Escalate if the order ID is not found in the database.\n\n"
-                "Provide a clear justification with your final classification.""",
-                "description": "verify the order details extracted from OCR with the one fetched from database to take the appropriate decision for fraudulent transaction.",
-            },
-        ]
-
-        # image_explainer:  for any request related to condition, status or description of damaged then I will give the detailed description of the image. if image is not provided then I will ask for image or orderid"
-        task_info = {
-            "id": 0,
-            "name": "Personal Assistant",
-            "description": "This is a powerful personal assistant.",
-            "maxMessages": 60,
-            "speakSelMode": "auto",
-        }
 
         # Setup DB manager and connect
         # db = PostgresManager()
@@ -185,19 +243,34 @@ def run_chat(request_json):
         # )
 
         print("prompt: ", prompt)
-        userproxy = create_userproxy()
+        userproxy = create_userproxy(session)
+
+        intent = intents.classify_intent(user_input, PIPELINES)
+        metrics.registry.record_intent(session.session_id, intent)
+        templates = select_templates(agent_templates, PIPELINES.get(intent))
 
-        manager, assistants = create_groupchat(agent_info, task_info, userproxy)
+        # clients that start the chat with "stream": true get reply deltas,
+        # only their agents stream
+        iostream = SessionStream(session) if request_json.get("stream") else None
+        manager, assistants = create_groupchat(
+            templates, TASK_INFO, userproxy, session, iostream is not None
+        )
 
-        asyncio.run(initiate_chat(userproxy, manager, prompt))
-        chat_status = "ended"
+        with IOStream.set_default(iostream):
+            run_on_worker_loop(initiate_chat(userproxy, manager, prompt))
+        session.set_status("ended")
 
     except Exception as e:
-        chat_status = "error"
-        print_queue.put({"user": "System", "message": f"An error occurred: {str(e)}"})
+        session.put_message(
+            {"user": "System", "message": f"An error occurred: {str(e)}"}
+        )
+        session.set_status("error")
+
+    finally:
+        metrics.registry.finish_session(session.session_id, session.chat_status)
 
 
-def create_userproxy():
+def create_userproxy(session):
     # db = PostgresManager()
     # db.connect_with_url(DATABASE_URL)
 
@@ -207,6 +280,7 @@ def create_userproxy():
     #     "get_order_status": db.get_order_status,
     # }
     user_proxy = MyConversableAgent(
+        session=session,
         name="Operator_Agent",
         system_message="""You are the admin overseeing the chat. continue interacting with the respective agent until request is fulfilled. if request is related to condition or status of damaged package or defective product then follow requirements mentioned under TASK1. if the request is related to fraudulent transaction then follow requirements mentioned under TASK2.
 
@@ -230,7 +304,7 @@ def create_userproxy():
     user_proxy.register_reply(
         [autogen.Agent, None],
         reply_func=print_messages,
-        config={"callback": None},
+        config={"callback": None, "session": session},
     )
     return user_proxy
 
@@ -243,76 +317,197 @@ agent_classes = {
 }
 
 
-def create_groupchat(agents_info, task_info, user_proxy):
-    assistants = []
+FUNCTIONS = [
+    {
+        "name": "get_totalprice_from_db",
+        "description": "Retrieves totalprice for a particular orderid",
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "order_id": {
+                    "type": "integer",
+                    "description": "The ID of the order to retrieve totalprice for",
+                }
+            },
+            "required": ["order_id"],
+        },
+    }
+]
 
-    # db = PostgresManager()
-    # db.connect_with_url(DATABASE_URL)
+
+TOOLS = ToolRegistry(FUNCTIONS)
+
+
+def compile_agent_templates(agents_info):
+    """
+    Build every assistant, the GroupChatManager and the VisionCapability once.
+    Per-session agents are cloned from these prototypes in create_groupchat.
+    """
+    templates = []
 
     for agent_info in agents_info:
         if agent_info["type"] == "UserProxyAgent":
             continue
 
         llm_config = {
-            "config_list": [agent_info["llm"]],
+            # cheap model first, escalated per the agent's "cascade" policy
+            **cascade.llm_config(agent_info, TOOLS.select(agent_info.get("tools", ()))),
             "temperature": 0,
             "seed": 44,
+            **llm_cache.cache_config(),
+            **llm.client_config(),
             # "request_timeout": 120,
-            "functions": [
-                {
-                    "name": "get_totalprice_from_db",
-                    "description": "Retrieves totalprice for a particular orderid",
-                    "parameters": {
-                        "type": "object",
-                        "properties": {
-                            "order_id": {
-                                "type": "integer",
-                                "description": "The ID of the order to retrieve totalprice for",
-                            }
-                        },
-                        "required": ["order_id"],
-                    },
-                }
-            ],
+            # only the schemas of the tools this agent declares
+            **TOOLS.llm_config(agent_info),
         }
 
-        llm_config_manager = {
-            "config_list": [agent_info["llm"]],
-            "temperature": 0,
-            "seed": 44,
-        }
-
-        # function_map = {
-        #     "recommend_product": db.recommend_product,
-        #     "buy_product": db.buy_product,
-        #     "get_order_status": db.get_order_status,
-        #     # "product_recommendation_flow": product_recommendation_flow,
-        # }
-
         AgentClass = agent_classes[agent_info["type"]]
-
-        if agent_info["name"] == "price_retrieval_agent":
-            assistant = AgentClass(
+        templates.append(
+            AgentTemplate(
+                AgentClass,
+                tools=agent_info.get("tools", ()),
+                # a streaming variant for sessions started with "stream": true
+                stream=agent_info.get("stream", False) and llm.LLM_STREAMING,
                 name=agent_info["name"],
                 llm_config=llm_config,
                 system_message=agent_info["system_message"],
                 description=agent_info["description"],
-                function_map=agent_info.get(
-                    "function_map"
+                function_map=metrics.registry.timed_tools(
+                    agent_info.get("function_map")
                 ),  # Adds function_map only if it's defined
             )
-        else:
-            assistant = AgentClass(
-                name=agent_info["name"],
-                llm_config=llm_config,
-                system_message=agent_info["system_message"],
-                description=agent_info["description"],
+        )
+        # keep each agent's prompt within its token budget on long chats
+        templates[-1].add_capability(
+            HistoryCompaction(
+                max_tokens=agent_info.get(
+                    "max_history_tokens", DEFAULT_MAX_HISTORY_TOKENS
+                )
             )
+        )
+
+    # speaker selection is a routing call, the cheapest model is enough
+    llm_config_manager = {
+        "config_list": [{"model": cascade.FAST_MODEL}],
+        "temperature": 0,
+        "seed": 44,
+        **llm_cache.cache_config(),
+        **llm.client_config(),
+    }
+
+    vision_capability = VisionCapability(
+        lmm_config={
+            "config_list": autogen.config_list_from_json(
+                env_or_file="OAI_CONFIG_LIST",
+                filter_dict={"model": {"gpt-4o-mini"}},
+            ),
+            "temperature": 0,
+            "max_tokens": 500,
+            **llm_cache.cache_config(),
+            **llm.client_config(),
+        },
+        # custom_caption_func=my_description,
+    )
+
+    manager_template = GroupChatManagerTemplate(
+        llm_config=llm_config_manager,
+        system_message="",
+    )
+    vision_capability.add_to_agent(manager_template.prototype)
+
+    print_prompt_token_report(prompt_token_report(agents_info, TOOLS))
+
+    return templates, manager_template
+
+
+agent_templates, manager_template = compile_agent_templates(AGENT_INFO)
+
+
+# Speaker routing for TASK1 (damaged package / defective product) and TASK2
+# (fraudulent bill), mirroring the sequences in the Operator_Agent prompt.
+TASK1_AGENTS = (
+    "image_explainer",
+    "package_shipping_status_agent",
+    "product_shipping_status_agent",
+)
+TASK2_AGENTS = (
+    "OCRExtractionAgent",
+    "price_retrieval_agent",
+    "Fraudulent_Transactions_AI_Agent",
+)
+BILL_KEYWORDS = ("bill", "invoice", "receipt", "fraud", "transaction", "charged")
+CLAIM_KEYWORDS = ("damage", "defect", "condition", "broken", "torn", "wet")
+PACKAGE_KEYWORDS = ("package", "parcel", "box", "carton", "packaging")
+PRODUCT_KEYWORDS = ("product", "cloth", "garment", "fabric", "shirt", "jeans", "dress")
+
+
+def route_after_operator(groupchat):
+    text = message_text(groupchat.messages[-1])
+    if mentions(text, BILL_KEYWORDS):
+        return "OCRExtractionAgent"
+    if mentions(text, CLAIM_KEYWORDS):
+        return "image_explainer"
+
+    # a follow-up (e.g. the image that was asked for) continues the current task
+    previous = last_speaker_among(groupchat, TASK1_AGENTS + TASK2_AGENTS)
+    if previous in TASK1_AGENTS:
+        return "image_explainer"
+    if previous in TASK2_AGENTS:
+        return "OCRExtractionAgent"
+    return None
+
+
+def route_after_image_explainer(groupchat):
+    if not has_image(groupchat.messages):
+        return "Operator_Agent"  # the explainer asked the customer for the image
+
+    text = message_text(groupchat.messages[-1])
+    is_package = mentions(text, PACKAGE_KEYWORDS)
+    is_product = mentions(text, PRODUCT_KEYWORDS)
+    if is_package and not is_product:
+        return "package_shipping_status_agent"
+    if is_product and not is_package:
+        return "product_shipping_status_agent"
+    return None
+
+
+def route_after_ocr(groupchat):
+    if not has_image(groupchat.messages):
+        return "Operator_Agent"  # the bill image is still missing
+    return "price_retrieval_agent"
+
+
+SPEAKER_GRAPH = TransitionGraph(
+    transitions={
+        "Operator_Agent": ["image_explainer", "OCRExtractionAgent"],
+        "image_explainer": [
+            "package_shipping_status_agent",
+            "product_shipping_status_agent",
+            "Operator_Agent",
+        ],
+        "package_shipping_status_agent": ["Operator_Agent"],
+        "product_shipping_status_agent": ["Operator_Agent"],
+        "OCRExtractionAgent": ["price_retrieval_agent", "Operator_Agent"],
+        "price_retrieval_agent": ["Fraudulent_Transactions_AI_Agent"],
+        "Fraudulent_Transactions_AI_Agent": ["Operator_Agent"],
+    },
+    routes={
+        "Operator_Agent": route_after_operator,
+        "image_explainer": route_after_image_explainer,
+        "OCRExtractionAgent": route_after_ocr,
+    },
+)
 
+
+def create_groupchat(agent_templates, task_info, user_proxy, session, stream=False):
+    assistants = []
+
+    for template in agent_templates:
+        assistant = template.instantiate(stream=stream)
         assistant.register_reply(
             [autogen.Agent, None],
             reply_func=print_messages,
-            config={"callback": None},
+            config={"callback": None, "session": session},
         )
         assistants.append(assistant)
 
@@ -320,33 +515,27 @@ def create_groupchat(agents_info, task_info, user_proxy):
         manager = assistants[0]
 
     elif len(assistants) > 1:
-        groupchat = autogen.GroupChat(
-            agents=[user_proxy] + assistants,
-            messages=[],
-            max_round=task_info["maxMessages"],
-            speaker_selection_method=task_info["speakSelMode"],
-        )
-
-        vision_capability = VisionCapability(
-            lmm_config={
-                "config_list": autogen.config_list_from_json(
-                    env_or_file="OAI_CONFIG_LIST",
-                    filter_dict={"model": {"gpt-4o-mini"}},
+        agents = [user_proxy] + assistants
+        speaker_selection = {"speaker_selection_method": task_info["speakSelMode"]}
+        if task_info["speakSelMode"] == "graph":
+            speaker_selection = {
+                "speaker_selection_method": SPEAKER_GRAPH,
+                "allowed_or_disallowed_speaker_transitions": SPEAKER_GRAPH.allowed_transitions(
+                    agents
                 ),
-                "temperature": 0,
-                "max_tokens": 500,
-            },
-            # custom_caption_func=my_description,
-        )
+                "speaker_transitions_type": "allowed",
+            }
 
-        manager = autogen.GroupChatManager(
-            groupchat=groupchat,
-            llm_config=llm_config_manager,
-            system_message="",
+        groupchat = metrics.TimedGroupChat(
+            agents=agents,
+            messages=[],
+            max_round=task_info["maxMessages"],
+            metrics_session_id=session.session_id,
+            **speaker_selection,
         )
+        manager = manager_template.instantiate(groupchat)
 
-        vision_capability.add_to_agent(manager)
-
+    metrics.registry.track(session.session_id, user_proxy, manager, *assistants)
     return manager, assistants
 
 
@@ -356,57 +545,140 @@ def start_chat():
     if request.method == "OPTIONS":
         return jsonify({}), 200
     elif request.method == "POST":
-        global chat_status
         try:
-            if chat_status == "error":
-                chat_status = "ended"
-
-            with print_queue.mutex:
-                print_queue.queue.clear()
-            with user_queue.mutex:
-                user_queue.queue.clear()
+            session = sessions.create()
 
-            chat_status = "Chat ongoing"
-
-            thread = threading.Thread(target=run_chat, args=(request.json,))
-            thread.start()
-
-            return jsonify({"status": chat_status})
+            try:
+                position = chat_pool.submit(session, run_chat, request.json)
+            except ChatPoolFull:
+                sessions.remove(session.session_id)
+                return (
+                    jsonify(
+                        {
+                            "status": "Too many chats, please retry later",
+                            **chat_pool.stats(),
+                        }
+                    ),
+                    429,
+                    {"Retry-After": "5"},
+                )
+
+            return jsonify(
+                {
+                    "status": session.chat_status,
+                    "session_id": session.session_id,
+                    "queue_position": position,
+                }
+            )
         except Exception as e:
             return jsonify({"status": "Error occurred", "error": str(e)})
 
 
 @app.route("/api/send_message", methods=["POST"])
 def send_message():
+    session = sessions.get(request.json.get("session_id"))
+    if session is None:
+        return jsonify({"status": "Session not found"}), 404
+
     user_input = request.json["message"]
-    user_queue.put(user_input)
+    session.put_user_input(user_input)
     return jsonify({"status": "Message Received"})
 
 
 @app.route("/api/get_message", methods=["GET"])
 def get_messages():
-    global chat_status
+    session = sessions.get(request.args.get("session_id"))
+    if session is None:
+        return jsonify({"message": None, "chat_status": "Session not found"}), 404
+
+    msg = session.next_message()
+    if msg is not None:
+        msg = parse_message(msg)
+        return jsonify({"message": msg, "chat_status": session.chat_status}), 200
+    elif session.chat_status == "queued":
+        return (
+            jsonify(
+                {
+                    "message": None,
+                    "chat_status": session.chat_status,
+                    "queue_position": chat_pool.queue_position(session.session_id),
+                }
+            ),
+            200,
+        )
+    else:
+        return jsonify({"message": None, "chat_status": session.chat_status}), 200
 
-    if not print_queue.empty():
-        msg = print_queue.get()
 
-        # If msg is already a dict, skip json.loads
-        if isinstance(msg, str):  # Only attempt to load if it's a string
-            try:
-                msg = json.loads(msg)
-            except json.JSONDecodeError:
-                pass  # If `msg` is not a JSON string, keep it as is
+@app.route("/api/poll_messages", methods=["GET"])
+def poll_messages():
+    """
+    Long-poll: waits up to `timeout` seconds for messages after `cursor` and
+    returns the whole backlog at once along with the cursor to resume from.
+    """
+    session = sessions.get(request.args.get("session_id"))
+    if session is None:
+        return jsonify({"messages": [], "chat_status": "Session not found"}), 404
 
-        # Ensure the 'message' part is also parsed if it's a JSON string
-        if isinstance(msg, dict) and isinstance(msg.get("message"), str):
-            try:
-                msg["message"] = json.loads(msg["message"])
-            except json.JSONDecodeError:
-                pass  # If the 'message' is not a JSON string, keep it as is
+    cursor = request.args.get("cursor", 0, type=int)
+    timeout = min(request.args.get("timeout", 25, type=float), 60)
 
-        return jsonify({"message": msg, "chat_status": chat_status}), 200
-    else:
-        return jsonify({"message": None, "chat_status": chat_status}), 200
+    batch, cursor = session.messages_since(cursor, timeout=timeout)
+    return (
+        jsonify(
+            {
+                "messages": [parse_message(msg) for msg in batch],
+                "cursor": cursor,
+                "chat_status": session.chat_status,
+            }
+        ),
+        200,
+    )
+
+
+@app.route("/api/stream_messages", methods=["GET"])
+def stream_messages():
+    """
+    Server-Sent Events stream of the chat. Resumes after the `cursor` query
+    parameter or the Last-Event-ID header sent by a reconnecting EventSource.
+    """
+    session = sessions.get(request.args.get("session_id"))
+    if session is None:
+        return jsonify({"chat_status": "Session not found"}), 404
+
+    cursor = request.headers.get("Last-Event-ID", type=int)
+    if cursor is None:
+        cursor = request.args.get("cursor", 0, type=int)
+
+    return Response(
+        stream_with_context(sse_events(session, cursor)),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.route("/metrics", methods=["GET"])
+def prometheus_metrics():
+    extra = metrics.service_metrics(
+        sessions,
+        chat_pool,
+        SPEAKER_GRAPH,
+        agent_templates,
+        llm_cache.response_cache,
+        db_pool=pool_stats(),
+    )
+    return Response(
+        metrics.registry.render(extra), mimetype="text/plain; version=0.0.4"
+    )
+
+
+@app.route("/api/session_metrics", methods=["GET"])
+def session_metrics():
+    """Per-agent latency, token and cost summary of one chat session."""
+    tracked = metrics.registry.get_session(request.args.get("session_id"))
+    if tracked is None:
+        return jsonify({"status": "Session not found"}), 404
+    return jsonify(tracked.summary()), 200
 
 
 # def get_messages():
@@ -0,0 +1,502 @@
+"""
+Purpose:
+    End-to-end throughput / latency benchmark of the chat APIs.
+
+    N concurrent synthetic customers drive /api/start_chat, /api/get_message
+    and /api/send_message the way the UI does, across the recommendation,
+    order-status, damage-claim and fraud-bill scenarios. Meant to run
+    against the mock LLM server and a local Postgres seeded from
+    clothShop.sql, so numbers only move when the code does:
+
+        python -m agents.mock_llm_server --seed 1
+        LLM_BASE_URL=http://localhost:5010/v1 LLM_CACHE_TTL=0 python -m agents.api1
+        LLM_BASE_URL=http://localhost:5010/v1 LLM_CACHE_TTL=0 flask --app agents.api2 run --port 5009
+        python -m agents.benchmark --customers 8 --chats 5 --seed-db
+
+    Per scenario it reports p50 / p95 / p99 time to first message and time
+    to decision, LLM calls and tokens per chat (from /api/session_metrics)
+    and chats per second. Every run is saved as JSON under
+    BENCHMARK_RESULTS_DIR and compared with the latest earlier run of the
+    same configuration, so regressions show up between commits.
+"""
+
+import argparse
+import glob
+import json
+import math
+import os
+import re
+import subprocess
+import threading
+import time
+from collections import defaultdict
+from typing import Dict, List, Optional
+
+import psycopg2
+import requests
+from dotenv import load_dotenv
+
+from agents.modules import intents
+
+load_dotenv()
+
+BENCHMARK_RESULTS_DIR = os.environ.get("BENCHMARK_RESULTS_DIR", "benchmark_results")
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+IMAGES_DIR = os.path.join(ROOT_DIR, "images")
+SEED_SQL = os.path.join(ROOT_DIR, "clothShop.sql")
+
+# senders whose messages are not agent output
+NON_AGENT_USERS = ("System", "User_Proxy", "Operator_Agent")
+FINISHED_STATUSES = ("ended", "error", "Session not found")
+
+# a metric got worse when it moved by more than this fraction
+REGRESSION_THRESHOLD = 0.10
+
+# message: opening request, replies: answers to each "Please input..." prompt
+# (then "exit"), app: which api serves it, decided_by: agents whose first
+# reply counts as the decision
+SCENARIOS = {
+    intents.RECOMMENDATION: {
+        "app": "api1",
+        "message": "Can you recommend some jeans for me?",
+        "replies": ["I want to buy product 3"],
+        "decided_by": ["product_recommendation_agent"],
+    },
+    intents.ORDER_STATUS: {
+        "app": "api1",
+        "message": "Can you check the status of my order?",
+        "replies": ["My order ID is 12"],
+        "decided_by": ["order_status_agent"],
+    },
+    intents.DAMAGE_CLAIM: {
+        "app": "api2",
+        "message": "My package arrived damaged, what is its condition? <img {images}/damaged_package/dam1.png>",
+        "replies": [],
+        "decided_by": [
+            "package_shipping_status_agent",
+            "product_shipping_status_agent",
+        ],
+    },
+    intents.FRAUD_BILL: {
+        "app": "api2",
+        "message": "Please check this bill for fraud <img {images}/fraud_bill/ft1.png>",
+        "replies": [],
+        "decided_by": ["Fraudulent_Transactions_AI_Agent"],
+    },
+}
+
+
+# ------------------ one customer ------------------
+
+
+class Customer:
+    """Plays one scenario through the HTTP API and times it."""
+
+    def __init__(self, base_url: str, scenario: str, options):
+        self.base_url = base_url.rstrip("/")
+        self.scenario = scenario
+        self.spec = SCENARIOS[scenario]
+        self.options = options
+        self.http = requests.Session()
+
+    def start(self) -> Dict:
+        """start_chat, retrying while the server answers 429."""
+        payload = {
+            "message": self.spec["message"].format(images=IMAGES_DIR),
+            "stream": self.options.stream,
+        }
+        rejected = 0
+        while True:
+            response = self.http.post(
+                f"{self.base_url}/api/start_chat", json=payload, timeout=30
+            )
+            if response.status_code != 429:
+                response.raise_for_status()
+                return {**response.json(), "rejected": rejected}
+            rejected += 1
+            time.sleep(float(response.headers.get("Retry-After", 1)))
+
+    def run(self) -> Dict:
+        result = {
+            "scenario": self.scenario,
+            "outcome": "ended",
+            "first_message_seconds": None,
+            "decision_seconds": None,
+        }
+        start = time.perf_counter()
+        try:
+            started = self.start()
+            session_id = started["session_id"]
+            result["rejected"] = started["rejected"]
+            replies = list(self.spec["replies"])
+
+            deadline = start + self.options.timeout
+            while True:
+                if time.perf_counter() > deadline:
+                    result["outcome"] = "timeout"
+                    break
+
+                data = self.http.get(
+                    f"{self.base_url}/api/get_message",
+                    params={"session_id": session_id},
+                    timeout=30,
+                ).json()
+                msg = data.get("message")
+                if msg is None:
+                    if data.get("chat_status") in FINISHED_STATUSES:
+                        result["outcome"] = data["chat_status"]
+                        break
+                    time.sleep(self.options.poll_interval)
+                    continue
+
+                elapsed = time.perf_counter() - start
+                user = msg.get("user") if isinstance(msg, dict) else None
+                if user not in NON_AGENT_USERS:
+                    if result["first_message_seconds"] is None:
+                        result["first_message_seconds"] = elapsed
+                    if (
+                        result["decision_seconds"] is None
+                        and user in self.spec["decided_by"]
+                        and msg.get("message")
+                    ):
+                        result["decision_seconds"] = elapsed
+                elif user == "System" and str(msg.get("message")).startswith(
+                    "Please input"
+                ):
+                    reply = replies.pop(0) if replies else "exit"
+                    self.http.post(
+                        f"{self.base_url}/api/send_message",
+                        json={"session_id": session_id, "message": reply},
+                        timeout=30,
+                    )
+
+            result["chat_seconds"] = time.perf_counter() - start
+            result.update(self.session_metrics(session_id))
+        except requests.RequestException as e:
+            result.update(
+                outcome="error",
+                error=str(e),
+                chat_seconds=time.perf_counter() - start,
+            )
+        return result
+
+    def session_metrics(self, session_id: str) -> Dict:
+        response = self.http.get(
+            f"{self.base_url}/api/session_metrics",
+            params={"session_id": session_id},
+            timeout=30,
+        )
+        if response.status_code != 200:
+            return {}
+        summary = response.json()
+        return {
+            key: summary.get(key)
+            for key in ("llm_calls", "prompt_tokens", "completion_tokens", "cost")
+        }
+
+
+# ------------------ load ------------------
+
+
+def run_load(options) -> List[Dict]:
+    """`customers` threads, each playing `chats` chats round-robin over the scenarios."""
+    results = []
+    lock = threading.Lock()
+
+    def customer(index):
+        for chat in range(options.chats):
+            scenario = options.scenarios[(index + chat) % len(options.scenarios)]
+            base_url = (
+                options.api1 if SCENARIOS[scenario]["app"] == "api1" else options.api2
+            )
+            result = Customer(base_url, scenario, options).run()
+            print(
+                f"customer {index} {scenario}: {result['outcome']} "
+                f"in {result['chat_seconds']:.2f}s"
+            )
+            with lock:
+                results.append(result)
+
+    threads = [
+        threading.Thread(target=customer, args=(index,), daemon=True)
+        for index in range(options.customers)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def mock_stats(mock_url: Optional[str], reset: bool = False) -> Optional[Dict]:
+    if not mock_url:
+        return None
+    try:
+        method = requests.delete if reset else requests.get
+        return method(f"{mock_url.rstrip('/')}/stats", timeout=10).json()
+    except requests.RequestException as e:
+        print(f"mock LLM stats unavailable: {e}")
+        return None
+
+
+# ------------------ report ------------------
+
+
+def percentile(values: List[float], pct: float) -> Optional[float]:
+    """Nearest-rank percentile, None for no values."""
+    if not values:
+        return None
+    values = sorted(values)
+    return values[max(1, math.ceil(pct / 100 * len(values))) - 1]
+
+
+def mean(values: List[float]) -> Optional[float]:
+    return sum(values) / len(values) if values else None
+
+
+def summarize(results: List[Dict], wall_seconds: float) -> Dict:
+    def collect(key, rows):
+        return [row[key] for row in rows if row.get(key) is not None]
+
+    def stats(rows):
+        ok = [row for row in rows if row["outcome"] == "ended"]
+        summary = {
+            "chats": len(rows),
+            "ended": len(ok),
+            "errors": sum(row["outcome"] == "error" for row in rows),
+            "timeouts": sum(row["outcome"] == "timeout" for row in rows),
+            "rejected_starts": sum(row.get("rejected", 0) for row in rows),
+            "chats_per_sec": len(ok) / wall_seconds if wall_seconds else 0.0,
+            "llm_calls_per_chat": mean(collect("llm_calls", ok)),
+            "prompt_tokens_per_chat": mean(collect("prompt_tokens", ok)),
+            "completion_tokens_per_chat": mean(collect("completion_tokens", ok)),
+        }
+        for key, name in (
+            ("first_message_seconds", "first_message"),
+            ("decision_seconds", "decision"),
+            ("chat_seconds", "chat"),
+        ):
+            values = collect(key, ok)
+            for pct in (50, 95, 99):
+                summary[f"{name}_p{pct}"] = percentile(values, pct)
+        return summary
+
+    by_scenario = defaultdict(list)
+    for row in results:
+        by_scenario[row["scenario"]].append(row)
+
+    return {
+        "overall": stats(results),
+        "scenarios": {name: stats(rows) for name, rows in sorted(by_scenario.items())},
+    }
+
+
+def print_summary(summary: Dict):
+    columns = [
+        ("chats", "chats", "{:.0f}"),
+        ("ok", "ended", "{:.0f}"),
+        ("ttfm p50", "first_message_p50", "{:.2f}"),
+        ("ttfm p95", "first_message_p95", "{:.2f}"),
+        ("ttfm p99", "first_message_p99", "{:.2f}"),
+        ("ttd p50", "decision_p50", "{:.2f}"),
+        ("ttd p95", "decision_p95", "{:.2f}"),
+        ("ttd p99", "decision_p99", "{:.2f}"),
+        ("llm/chat", "llm_calls_per_chat", "{:.1f}"),
+        ("chats/s", "chats_per_sec", "{:.3f}"),
+    ]
+    rows = [("scenario", *[title for title, _, _ in columns])]
+    for name, stats in [*summary["scenarios"].items(), ("overall", summary["overall"])]:
+        rows.append(
+            (
+                name,
+                *[
+                    "-" if stats[key] is None else fmt.format(stats[key])
+                    for _, key, fmt in columns
+                ],
+            )
+        )
+    widths = [max(len(row[i]) for row in rows) for i in range(len(rows[0]))]
+    for row in rows:
+        print("  ".join(cell.rjust(width) for cell, width in zip(row, widths)))
+
+
+# ------------------ regressions ------------------
+
+# metric -> True when bigger is better
+COMPARED_METRICS = {
+    "first_message_p50": False,
+    "first_message_p95": False,
+    "decision_p50": False,
+    "decision_p95": False,
+    "llm_calls_per_chat": False,
+    "prompt_tokens_per_chat": False,
+    "chats_per_sec": True,
+}
+
+
+def git_commit() -> str:
+    try:
+        commit = subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT_DIR, text=True
+        ).strip()
+        dirty = subprocess.check_output(
+            ["git", "status", "--porcelain", "--untracked-files=no"],
+            cwd=ROOT_DIR,
+            text=True,
+        ).strip()
+        return f"{commit}-dirty" if dirty else commit
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def save_run(run: Dict, results_dir: str) -> str:
+    os.makedirs(results_dir, exist_ok=True)
+    stamp = time.strftime("%Y%m%d-%H%M%S", time.localtime(run["started_at"]))
+    path = os.path.join(results_dir, f"{stamp}_{run['commit']}.json")
+    with open(path, "w") as f:
+        json.dump(run, f, indent=2)
+    return path
+
+
+def latest_run(results_dir: str, config: Dict, exclude: str = None) -> Optional[str]:
+    """Most recent saved run with the same configuration."""
+    for path in sorted(glob.glob(os.path.join(results_dir, "*.json")), reverse=True):
+        if path == exclude:
+            continue
+        try:
+            with open(path) as f:
+                if json.load(f).get("config") == config:
+                    return path
+        except (OSError, json.JSONDecodeError):
+            continue
+    return None
+
+
+def compare(run: Dict, baseline: Dict, threshold: float) -> List[str]:
+    """Metrics that got worse than `baseline` by more than `threshold`."""
+    regressions = []
+    sections = [("overall", run["summary"]["overall"], baseline["summary"]["overall"])]
+    for name, stats in run["summary"]["scenarios"].items():
+        if name in baseline["summary"]["scenarios"]:
+            sections.append((name, stats, baseline["summary"]["scenarios"][name]))
+
+    for name, stats, before in sections:
+        for metric, higher_is_better in COMPARED_METRICS.items():
+            new, old = stats.get(metric), before.get(metric)
+            if not new or not old:
+                continue
+            change = (new - old) / old
+            if (-change if higher_is_better else change) > threshold:
+                regressions.append(
+                    f"{name} {metric}: {old:.3f} -> {new:.3f} ({change:+.0%})"
+                )
+    return regressions
+
+
+# ------------------ database ------------------
+
+
+def seed_database(database_url: str, sql_path: str = SEED_SQL):
+    """Recreate the clothShop tables, so every run starts from the same rows."""
+    with open(sql_path) as f:
+        sql = f.read()
+    tables = re.findall(r"CREATE TABLE\s+(\w+)", sql, re.IGNORECASE)
+
+    conn = psycopg2.connect(database_url)
+    try:
+        with conn, conn.cursor() as cur:
+            for table in reversed(tables):
+                cur.execute(f"DROP TABLE IF EXISTS {table} CASCADE")
+            cur.execute(sql)
+    finally:
+        conn.close()
+    print(f"Seeded {len(tables)} tables from {sql_path}")
+
+
+# ------------------ main ------------------
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--api1", default="http://localhost:5008")
+    parser.add_argument("--api2", default="http://localhost:5009")
+    parser.add_argument("--mock-llm", default="http://localhost:5010")
+    parser.add_argument(
+        "--scenarios",
+        default=",".join(SCENARIOS),
+        help=f"comma separated subset of {', '.join(SCENARIOS)}",
+    )
+    parser.add_argument("--customers", type=int, default=4, help="concurrent customers")
+    parser.add_argument("--chats", type=int, default=3, help="chats per customer")
+    parser.add_argument("--stream", action="store_true", help="start chats with stream")
+    parser.add_argument("--timeout", type=float, default=300, help="seconds per chat")
+    parser.add_argument("--poll-interval", type=float, default=0.05)
+    parser.add_argument(
+        "--seed-db", action="store_true", help="reload clothShop.sql into DATABASE_URL"
+    )
+    parser.add_argument("--results-dir", default=BENCHMARK_RESULTS_DIR)
+    parser.add_argument("--baseline", help="saved run to compare with")
+    parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD)
+    parser.add_argument(
+        "--fail-on-regression",
+        action="store_true",
+        help="exit with status 1 when a metric regressed",
+    )
+    options = parser.parse_args()
+
+    options.scenarios = [name.strip() for name in options.scenarios.split(",")]
+    unknown = [name for name in options.scenarios if name not in SCENARIOS]
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(unknown)}")
+
+    if options.seed_db:
+        seed_database(os.environ["DATABASE_URL"])
+
+    config = {
+        "scenarios": options.scenarios,
+        "customers": options.customers,
+        "chats": options.chats,
+        "stream": options.stream,
+    }
+    mock_stats(options.mock_llm, reset=True)
+
+    started_at = time.time()
+    start = time.perf_counter()
+    results = run_load(options)
+    wall_seconds = time.perf_counter() - start
+
+    run = {
+        "commit": git_commit(),
+        "started_at": started_at,
+        "wall_seconds": wall_seconds,
+        "config": config,
+        "summary": summarize(results, wall_seconds),
+        "mock_llm": mock_stats(options.mock_llm),
+        "chats": results,
+    }
+    print()
+    print_summary(run["summary"])
+
+    path = save_run(run, options.results_dir)
+    print(f"\nSaved {path}")
+
+    baseline_path = options.baseline or latest_run(
+        options.results_dir, config, exclude=path
+    )
+    if baseline_path is None:
+        return
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    regressions = compare(run, baseline, options.threshold)
+    print(f"Compared with {baseline_path} ({baseline['commit']})")
+    for regression in regressions:
+        print(f"  REGRESSION {regression}")
+    if not regressions:
+        print("  no regressions")
+    elif options.fail_on_regression:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
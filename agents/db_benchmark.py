@@ -0,0 +1,151 @@
+"""
+Purpose:
+    Micro-benchmark of the fixed PostgresManager lookups, plain SQL text
+    vs prepared statements.
+
+    Each lookup (order status, total price, damaged package / defective
+    product image, product price) is called many times from a few threads
+    over the shared connection pool, once sending the SQL text on every call
+    and once executing the statement prepared on each connection:
+
+        python -m agents.db_benchmark --calls 20000 --threads 8
+
+    Per lookup and mode it reports calls per second and mean / p50 / p95 /
+    p99 latency per call, then the prepared speed-up.
+"""
+
+import argparse
+import os
+import threading
+import time
+from typing import Callable, Dict, List
+
+from dotenv import load_dotenv
+
+from agents.benchmark import mean, percentile
+from agents.modules.db import PostgresManager
+
+
+def product_price(db: PostgresManager, options):
+    # the price lookup buy_product runs before inserting the order
+    with db.connection() as pooled, pooled.conn.cursor() as cur:
+        db.execute_prepared(pooled, cur, "product_price", (options.product_id,))
+        return cur.fetchone()
+
+
+LOOKUPS: Dict[str, Callable] = {
+    "order_status": lambda db, options: db.get_order_status(options.order_id),
+    "totalprice": lambda db, options: db.get_totalprice(options.order_id),
+    "damaged_package": lambda db, options: db.fetch_damaged_package_url(
+        options.damaged_order_id
+    ),
+    "defect_product": lambda db, options: db.fetch_defect_product_url(
+        options.defect_order_id
+    ),
+    "product_price": product_price,
+}
+
+
+def run_lookup(db: PostgresManager, lookup: Callable, options) -> Dict:
+    """Call `lookup` options.calls times from options.threads threads."""
+    latencies: List[float] = []
+    lock = threading.Lock()
+    per_thread = max(1, options.calls // options.threads)
+
+    def worker():
+        mine = []
+        for _ in range(per_thread):
+            started = time.perf_counter()
+            lookup(db, options)
+            mine.append(time.perf_counter() - started)
+        with lock:
+            latencies.extend(mine)
+
+    for _ in range(options.warmup):
+        lookup(db, options)
+
+    threads = [threading.Thread(target=worker) for _ in range(options.threads)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall_seconds = time.perf_counter() - started
+
+    ms = [latency * 1000 for latency in latencies]
+    return {
+        "calls": len(ms),
+        "calls_per_second": len(ms) / wall_seconds if wall_seconds else 0,
+        "mean_ms": mean(ms),
+        "p50_ms": percentile(ms, 50),
+        "p95_ms": percentile(ms, 95),
+        "p99_ms": percentile(ms, 99),
+    }
+
+
+def print_results(results: Dict[str, Dict[str, Dict]]):
+    print(
+        f"{'lookup':<16} {'mode':<9} {'calls/s':>9} {'mean ms':>8} "
+        f"{'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}"
+    )
+    for name, modes in results.items():
+        for mode, stats in modes.items():
+            print(
+                f"{name:<16} {mode:<9} {stats['calls_per_second']:>9.0f} "
+                f"{stats['mean_ms']:>8.3f} {stats['p50_ms']:>8.3f} "
+                f"{stats['p95_ms']:>8.3f} {stats['p99_ms']:>8.3f}"
+            )
+        plain, prepared = modes["plain"], modes["prepared"]
+        throughput = prepared["calls_per_second"] / plain["calls_per_second"]
+        latency = plain["mean_ms"] / prepared["mean_ms"]
+        print(f"{name:<16} speed-up  {throughput:>8.2f}x (mean {latency:.2f}x)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument(
+        "--lookups",
+        default=",".join(LOOKUPS),
+        help=f"comma separated subset of {', '.join(LOOKUPS)}",
+    )
+    parser.add_argument(
+        "--calls", type=int, default=5000, help="calls per lookup and mode"
+    )
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--warmup", type=int, default=50, help="untimed calls first")
+    parser.add_argument("--order-id", type=int, default=1)
+    parser.add_argument("--damaged-order-id", type=int, default=5)
+    parser.add_argument("--defect-order-id", type=int, default=11)
+    parser.add_argument("--product-id", type=int, default=1)
+    options = parser.parse_args()
+
+    options.lookups = [name.strip() for name in options.lookups.split(",")]
+    unknown = [name for name in options.lookups if name not in LOOKUPS]
+    if unknown:
+        parser.error(f"unknown lookups: {', '.join(unknown)}")
+
+    load_dotenv()
+    database_url = os.environ.get("DATABASE_URL")
+    managers = {
+        "plain": PostgresManager(use_prepared=False),
+        "prepared": PostgresManager(use_prepared=True),
+    }
+    for db in managers.values():
+        db.connect_with_url(database_url)
+    if options.threads > db.pool.max_size:
+        print(
+            f"warning: {options.threads} threads share {db.pool.max_size} pooled "
+            "connections (POSTGRES_POOL_MAX), calls will also wait for the pool"
+        )
+
+    results = {}
+    for name in options.lookups:
+        results[name] = {
+            mode: run_lookup(db, LOOKUPS[name], options)
+            for mode, db in managers.items()
+        }
+    print_results(results)
+
+
+if __name__ == "__main__":
+    main()
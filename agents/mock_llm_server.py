@@ -0,0 +1,421 @@
+"""
+Purpose:
+    Local stand-in for the OpenAI chat completions endpoint.
+
+    Lets api1 / api2 (and benchmarks) run the whole multi-agent flow without
+    spending tokens or adding network jitter. Point the apps at it with
+        LLM_BASE_URL=http://localhost:5010/v1
+    and start it with
+        python -m agents.mock_llm_server --script agents/mock_llm_script.json
+
+    Every request is answered from, in order:
+        1) recorded responses (--recordings), matched exactly on the request
+        2) the first scripted rule whose patterns all match the request
+    Rules match regexes against the request (system message, last message,
+    whole conversation); named groups, with "defaults", fill $placeholders in
+    the answer. Rules can return text, a function call (recommend_product,
+    buy_product, get_totalprice_from_db...) or pick the next speaker for
+    autogen's GroupChat, after a latency drawn from a configurable
+    distribution. Streamed requests get their answer back as SSE chunks.
+
+    --record FILE --upstream URL forwards every request to a real endpoint and
+    appends request + response to FILE for later replay.
+"""
+
+import argparse
+import ast
+import hashlib
+import json
+import os
+import random
+import re
+import string
+import threading
+import time
+import uuid
+from collections import Counter
+
+import requests
+from autogen.code_utils import content_str
+from flask import Flask, Response, jsonify, request
+
+from agents.modules import tokens
+from agents.modules.llm_cache import cache_key
+
+DEFAULT_SCRIPT = os.path.join(os.path.dirname(__file__), "mock_llm_script.json")
+
+# autogen fills {agentlist} with the repr of a list of names, e.g. ['a', 'b']
+SELECT_SPEAKER_PATTERN = re.compile(r"select the next role from (\[[^\]]*\])")
+
+# like OpenAI prompt caching: prefixes from 1024 tokens, in 128 token steps
+PROMPT_CACHE_MIN_TOKENS = 1024
+PROMPT_CACHE_STEP = 128
+
+app = Flask(__name__)
+
+# set in main()
+script = {"rules": []}
+recordings = {}
+record_file = None
+upstream = None
+rng = random.Random()
+
+stats = Counter()  # requests answered per rule name
+stats_lock = threading.Lock()
+record_lock = threading.Lock()
+seen_prefixes = set()  # hashes of every request prefix answered so far
+prefix_lock = threading.Lock()
+
+
+# ------------------ latency ------------------
+
+
+def sample_ms(spec) -> float:
+    """
+    Draw a latency in ms from `spec`:
+        {"dist": "constant", "ms": 300}
+        {"dist": "uniform", "min_ms": 200, "max_ms": 800}
+        {"dist": "normal", "mean_ms": 500, "sd_ms": 100}
+        {"dist": "lognormal", "median_ms": 500, "sigma": 0.5}
+    """
+    if not spec:
+        return 0.0
+    dist = spec.get("dist", "constant")
+    if dist == "uniform":
+        value = rng.uniform(spec["min_ms"], spec["max_ms"])
+    elif dist == "normal":
+        value = rng.gauss(spec["mean_ms"], spec["sd_ms"])
+    elif dist == "lognormal":
+        value = spec["median_ms"] * rng.lognormvariate(0, spec.get("sigma", 0.5))
+    else:
+        value = spec.get("ms", 0)
+    return max(0.0, value)
+
+
+# ------------------ matching ------------------
+
+
+def message_content(message) -> str:
+    return content_str(message.get("content")) if message.get("content") else ""
+
+
+def request_fields(body):
+    messages = body.get("messages", [])
+    last = messages[-1] if messages else {}
+    system = next(
+        (message_content(m) for m in messages if m.get("role") == "system"), ""
+    )
+    return {
+        "system": system,
+        "last": message_content(last),
+        "last_role": last.get("role", ""),
+        "last_name": last.get("name", ""),
+        "conversation": "\n".join(message_content(m) for m in messages),
+        "model": body.get("model", ""),
+    }
+
+
+def match_rule(rule, fields):
+    """Template variables captured by the rule's patterns, or None when it does not match."""
+    variables = {}
+    for field, pattern in rule.get("match", {}).items():
+        if field == "last_role":
+            if fields["last_role"] != pattern:
+                return None
+            continue
+        found = re.search(pattern, fields[field], re.IGNORECASE | re.DOTALL)
+        if found is None:
+            return None
+        variables.update(
+            {key: value for key, value in found.groupdict().items() if value}
+        )
+    return variables
+
+
+def render(value, variables):
+    """Fill $name / ${name} placeholders in strings, lists and dicts."""
+    if isinstance(value, str):
+        return string.Template(value).safe_substitute(variables)
+    if isinstance(value, list):
+        return [render(item, variables) for item in value]
+    if isinstance(value, dict):
+        return {key: render(item, variables) for key, item in value.items()}
+    return value
+
+
+def pick_speaker(fields) -> str:
+    """Stand-in for autogen's LLM speaker selection: the role the request talks about most."""
+    found = SELECT_SPEAKER_PATTERN.search(fields["last"])
+    try:
+        roles = ast.literal_eval(found.group(1)) if found else []
+    except (SyntaxError, ValueError):
+        roles = [role.strip(" '\"") for role in found.group(1)[1:-1].split(",")]
+    roles = [str(role) for role in roles if str(role).strip()]
+    if not roles:
+        return "User_Proxy"
+
+    conversation = fields["conversation"].lower()
+    candidates = [role for role in roles if role != "User_Proxy"] or roles
+
+    def score(role):
+        words = re.split(r"[_\W]+", role.lower())
+        return sum(conversation.count(word) for word in words if len(word) > 3)
+
+    return max(candidates, key=score)
+
+
+def scripted_message(body):
+    """(rule name, assistant message, latency spec) for a request."""
+    fields = request_fields(body)
+    for rule in script["rules"]:
+        variables = match_rule(rule, fields)
+        if variables is None:
+            continue
+
+        variables = {
+            **rule.get("defaults", {}),
+            "last_content": fields["last"],
+            "last_name": fields["last_name"],
+            **variables,
+        }
+        message = {"role": "assistant", "content": None}
+        if rule.get("select_speaker"):
+            message["content"] = pick_speaker(fields)
+        elif "function_call" in rule:
+            call = render(rule["function_call"], variables)
+            arguments = call.get("arguments", {})
+            if not isinstance(arguments, str):
+                arguments = json.dumps(arguments)
+            message["function_call"] = {"name": call["name"], "arguments": arguments}
+        else:
+            message["content"] = render(rule.get("content", ""), variables)
+
+        latency = rule.get("latency", script.get("latency"))
+        return rule.get("name", "rule"), message, latency
+
+    return "fallback", {"role": "assistant", "content": "OK."}, script.get("latency")
+
+
+def as_tool_call(message, body):
+    """Requests offering `tools` instead of `functions` expect tool_calls."""
+    if "function_call" in message and body.get("tools"):
+        message["tool_calls"] = [
+            {
+                "id": f"call_{uuid.uuid4().hex[:24]}",
+                "type": "function",
+                "function": message.pop("function_call"),
+            }
+        ]
+    return message
+
+
+# ------------------ responses ------------------
+
+
+def offered_functions(body):
+    return body.get("functions") or body.get("tools") or []
+
+
+def cached_prompt_tokens(body, prompt_tokens: int) -> int:
+    """
+    Tokens of the longest prompt prefix seen in an earlier request. The
+    prompt (model, tools, then every message) is hashed in chunks of about
+    PROMPT_CACHE_STEP tokens, so like the real cache a change anywhere only
+    loses what follows it.
+    """
+    text = json.dumps(
+        [body.get("model"), offered_functions(body), body.get("messages", [])],
+        sort_keys=True,
+    )
+    chunk = max(1, len(text) * PROMPT_CACHE_STEP // max(1, prompt_tokens))
+    digest = hashlib.sha256()
+    cached_chars = 0
+    with prefix_lock:
+        for end in range(chunk, len(text) + 1, chunk):
+            digest.update(text[end - chunk : end].encode())
+            key = digest.hexdigest()
+            if key in seen_prefixes:
+                cached_chars = end
+            seen_prefixes.add(key)
+    cached = prompt_tokens * cached_chars // len(text)
+    if cached < PROMPT_CACHE_MIN_TOKENS:
+        return 0
+    return cached // PROMPT_CACHE_STEP * PROMPT_CACHE_STEP
+
+
+def completion(body, message):
+    # like the real API, offered function schemas count as prompt tokens
+    prompt_tokens = tokens.count_messages_tokens(body.get("messages", []))
+    prompt_tokens += tokens.count_functions_tokens(offered_functions(body))
+    completion_tokens = tokens.count_message_tokens(message)
+    finish_reason = "stop"
+    if message.get("function_call"):
+        finish_reason = "function_call"
+    elif message.get("tool_calls"):
+        finish_reason = "tool_calls"
+    return {
+        "id": f"chatcmpl-{uuid.uuid4().hex}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": body.get("model", "gpt-4o-mini"),
+        "choices": [{"index": 0, "message": message, "finish_reason": finish_reason}],
+        "usage": {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+            "prompt_tokens_details": {
+                "cached_tokens": cached_prompt_tokens(body, prompt_tokens)
+            },
+        },
+    }
+
+
+def stream_chunks(result, token_ms):
+    """SSE events replaying `result` as chat.completion.chunk deltas."""
+    choice = result["choices"][0]
+    message = choice["message"]
+
+    def chunk(delta, finish_reason=None):
+        data = {
+            "id": result["id"],
+            "object": "chat.completion.chunk",
+            "created": result["created"],
+            "model": result["model"],
+            "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+        }
+        return f"data: {json.dumps(data)}\n\n"
+
+    yield chunk({"role": "assistant", "content": ""})
+    if message.get("function_call"):
+        yield chunk({"function_call": message["function_call"]})
+    elif message.get("tool_calls"):
+        yield chunk(
+            {"tool_calls": [{"index": 0, **call} for call in message["tool_calls"]]}
+        )
+    else:
+        for word in re.findall(r"\S+\s*", message.get("content") or ""):
+            time.sleep(sample_ms(token_ms) / 1000)
+            yield chunk({"content": word})
+    yield chunk({}, choice["finish_reason"])
+    yield "data: [DONE]\n\n"
+
+
+def recording_key(body):
+    return cache_key(
+        {
+            key: body.get(key)
+            for key in ("model", "messages", "functions", "tools", "temperature")
+        }
+    )
+
+
+def forward(body):
+    """Ask the real endpoint, and keep its answer for replay."""
+    payload = {**body, "stream": False}
+    response = requests.post(
+        f"{upstream.rstrip('/')}/chat/completions",
+        json=payload,
+        headers={"Authorization": f"Bearer {os.environ.get('OPENAI_API_KEY')}"},
+        timeout=120,
+    )
+    response.raise_for_status()
+    result = response.json()
+    with record_lock, open(record_file, "a") as f:
+        f.write(json.dumps({"key": recording_key(body), "response": result}) + "\n")
+    return result
+
+
+@app.route("/v1/chat/completions", methods=["POST"])
+def chat_completions():
+    body = request.json
+    start = time.perf_counter()
+
+    result = recordings.get(recording_key(body))
+    if result is not None:
+        name, latency = "recording", script.get("latency")
+    elif upstream:
+        name, latency, result = "upstream", None, forward(body)
+    else:
+        name, message, latency = scripted_message(body)
+        result = completion(body, as_tool_call(message, body))
+
+    with stats_lock:
+        stats[name] += 1
+
+    # the time to first token, spent before any byte is sent
+    delay = sample_ms(latency) / 1000 - (time.perf_counter() - start)
+    if delay > 0:
+        time.sleep(delay)
+
+    if body.get("stream"):
+        return Response(
+            stream_chunks(result, script.get("token_ms")),
+            mimetype="text/event-stream",
+        )
+    return jsonify(result)
+
+
+@app.route("/v1/models", methods=["GET"])
+def models():
+    return jsonify(
+        {
+            "object": "list",
+            "data": [{"id": "gpt-4o-mini", "object": "model", "owned_by": "mock"}],
+        }
+    )
+
+
+@app.route("/stats", methods=["GET", "DELETE"])
+def request_stats():
+    """Requests answered per rule; DELETE resets the counters."""
+    with stats_lock:
+        counts = dict(stats)
+        if request.method == "DELETE":
+            stats.clear()
+    return jsonify({"requests": sum(counts.values()), "by_rule": counts})
+
+
+def load_recordings(path):
+    loaded = {}
+    with open(path) as f:
+        for line in f:
+            if line.strip():
+                entry = json.loads(line)
+                loaded[entry["key"]] = entry["response"]
+    return loaded
+
+
+def main():
+    global script, recordings, record_file, upstream
+
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=5010)
+    parser.add_argument("--script", default=DEFAULT_SCRIPT)
+    parser.add_argument("--recordings", help="JSONL file of recorded responses")
+    parser.add_argument("--record", help="append upstream responses to this file")
+    parser.add_argument(
+        "--upstream", help="real endpoint to record, e.g. https://api.openai.com/v1"
+    )
+    parser.add_argument("--seed", type=int, help="seed the latency distributions")
+    args = parser.parse_args()
+
+    with open(args.script) as f:
+        script = json.load(f)
+    if args.recordings:
+        recordings = load_recordings(args.recordings)
+    if args.record:
+        if not args.upstream:
+            parser.error("--record needs --upstream")
+        record_file, upstream = args.record, args.upstream
+    if args.seed is not None:
+        rng.seed(args.seed)
+
+    print(
+        f"Mock LLM server: {len(script['rules'])} rules, {len(recordings)} recordings"
+    )
+    app.run(host=args.host, port=args.port, threaded=True)
+
+
+if __name__ == "__main__":
+    main()
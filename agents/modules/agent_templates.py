@@ -0,0 +1,121 @@
+"""
+Purpose:
+    Build agents once at startup and hand out cheap per-session clones.
+
+    Constructing an autogen agent deep-copies its llm_config and creates an
+    OpenAI client; doing that for six agents, a GroupChatManager and a
+    VisionCapability on every /api/start_chat is pure overhead. A template
+    holds one fully constructed prototype. Clones share its parsed config and
+    client but get their own message history, reply functions and hooks.
+
+    Agents that can stream get a second, streaming prototype. Streamed
+    completions carry no usage (autogen counts their tokens with tiktoken and
+    the provider's cached-token count is lost), so only sessions that show
+    reply deltas clone it.
+"""
+
+import copy
+from collections import defaultdict
+from typing import Callable, Dict, Iterable, Optional, Type
+
+import autogen
+
+
+def clone_agent(prototype: autogen.ConversableAgent) -> autogen.ConversableAgent:
+    """
+    Shallow-copy `prototype` and reset every piece of per-conversation state.
+    llm_config and client are shared; they are not mutated during a chat.
+    """
+    agent = copy.copy(prototype)
+    agent._oai_messages = defaultdict(list)
+    agent._oai_system_message = copy.deepcopy(prototype._oai_system_message)
+    agent._consecutive_auto_reply_counter = defaultdict(int)
+    agent._max_consecutive_auto_reply_dict = defaultdict(
+        agent.max_consecutive_auto_reply
+    )
+    agent._function_map = dict(prototype._function_map)
+    agent._reply_func_list = [
+        {**reply, "config": copy.copy(reply["init_config"])}
+        for reply in prototype._reply_func_list
+    ]
+    agent._human_input = []
+    agent.reply_at_receive = defaultdict(bool)
+    agent.hook_lists = {
+        hookable_method: list(hooks)
+        for hookable_method, hooks in prototype.hook_lists.items()
+    }
+    agent.client_cache = None
+    return agent
+
+
+class AgentTemplate:
+    def __init__(
+        self,
+        agent_class: Type[autogen.ConversableAgent],
+        tools: Optional[Iterable[str]] = None,
+        stream: bool = False,
+        **kwargs,
+    ):
+        self.name = kwargs["name"]
+        # functions clones may execute, None for any
+        self.tools = None if tools is None else set(tools)
+        self.prototype = agent_class(**kwargs)
+        self.streaming_prototype = None
+        if stream:
+            llm_config = {**kwargs["llm_config"], "stream": True}
+            self.streaming_prototype = agent_class(
+                **{**kwargs, "llm_config": llm_config}
+            )
+        self.capabilities = []
+
+    def add_capability(self, capability):
+        """Capabilities register hooks on the prototypes, clones inherit them."""
+        capability.add_to_agent(self.prototype)
+        if self.streaming_prototype is not None:
+            capability.add_to_agent(self.streaming_prototype)
+        self.capabilities.append(capability)
+
+    def instantiate(
+        self, function_map: Optional[Dict[str, Callable]] = None, stream: bool = False
+    ) -> autogen.ConversableAgent:
+        """A fresh agent, streaming its replies when `stream` and it can."""
+        if stream and self.streaming_prototype is not None:
+            agent = clone_agent(self.streaming_prototype)
+        else:
+            agent = clone_agent(self.prototype)
+        if function_map and self.tools is not None:
+            function_map = {
+                name: function
+                for name, function in function_map.items()
+                if name in self.tools
+            }
+        if function_map:
+            agent.register_function(function_map)
+        return agent
+
+
+class GroupChatManagerTemplate:
+    """
+    GroupChatManager bakes its groupchat into its reply functions, so clones
+    swap the placeholder groupchat of the prototype for the session's own.
+    """
+
+    def __init__(self, **kwargs):
+        self._placeholder = autogen.GroupChat(agents=[], messages=[])
+        self.prototype = autogen.GroupChatManager(groupchat=self._placeholder, **kwargs)
+
+    def instantiate(self, groupchat: autogen.GroupChat) -> autogen.GroupChatManager:
+        manager = clone_agent(self.prototype)
+        manager._groupchat = groupchat
+        for reply in manager._reply_func_list:
+            if reply["init_config"] is self._placeholder:
+                reply["config"] = groupchat
+                reply["init_config"] = groupchat
+        return manager
+
+
+def select_templates(templates, names=None):
+    """The templates a pipeline needs, or all of them when `names` is None."""
+    if names is None:
+        return list(templates)
+    return [template for template in templates if template.name in names]
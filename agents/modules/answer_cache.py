@@ -0,0 +1,184 @@
+"""
+Purpose:
+    Answer cache for repeated product recommendation requests.
+
+    Many requests are near-duplicates ("show me black women's jeans under 40"
+    / "black jeans for women under $40?"). A request is normalised to its
+    search slots (item, colour, size, gender, price, order ID) plus whatever
+    words are left after dropping stopwords. Together with the version stamp
+    of the Products table, that is the key of the agent's final answer. A hit
+    is shown to the customer (marked "cached") without running any agent;
+    only when the customer follows up (e.g. to buy one of the products) do
+    the agents start, with the answer already given in their prompt. Every
+    write to Products bumps its version row (a trigger, see clothShop.sql),
+    so answers about an older catalog are never served.
+
+    Only requests the keyword rules classify as recommendations are cached.
+    Anything that wants something done (buy, cancel, images...) is not.
+"""
+
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from agents.modules import intents
+from agents.modules.fast_path import ORDER_ID_PATTERN
+from agents.modules.sql_templates import (
+    COLOUR_PATTERN,
+    GENDERS,
+    ITEM_PATTERN,
+    SIZES,
+    extract_slots,
+)
+
+ANSWER_CACHE_SIZE = int(os.environ.get("ANSWER_CACHE_SIZE", 1000))
+# seconds an answer is served, 0 disables the cache
+ANSWER_CACHE_TTL = int(os.environ.get("ANSWER_CACHE_TTL", 3600))
+
+# appended to the prompt when the customer follows up on a cached answer
+CACHED_ANSWER_PROMPT = (
+    "The customer was already shown this answer to the request:\n\n{answer}"
+    "\n\nThe customer replied: {reply}"
+)
+
+# requests that change something or carry an image always go to the agents
+NOT_CACHEABLE_PATTERN = re.compile(
+    r"\b(buy|purchase|cancel\w*|return\w*|refund\w*|change|update|replace\w*)\b|<img",
+    re.IGNORECASE,
+)
+WORD_PATTERN = re.compile(r"[a-z0-9$]+(?:['-][a-z0-9]+)*")
+STOPWORDS = set("""
+    a an the and or of for to in on at by with from me my i i'm we you your
+    please can could would will do does is are am be it this that these those
+    some any any other show see find get give want wanted need looking look
+    recommend recommendation recommendations suggest suggestions something
+    have has got there here what which like also just good nice new
+    under below less than over above more between max min maximum minimum up
+    upto within cheaper price priced cost costs around about size sized
+    colour color coloured colored
+    """.split())
+
+
+def slot_words(text: str) -> set:
+    """Words of `text` that extract_slots already turned into slots."""
+    patterns = [ITEM_PATTERN, COLOUR_PATTERN]
+    patterns += [
+        re.compile(pattern, re.IGNORECASE)
+        for pattern in [*GENDERS.values(), *SIZES.values()]
+    ]
+    words = set()
+    for pattern in patterns:
+        for match in pattern.finditer(text):
+            words.update(WORD_PATTERN.findall(match.group(0).lower()))
+    return words
+
+
+def normalize(text: str) -> Optional[Dict]:
+    """Slots plus leftover words of a cacheable request, or None."""
+    if not text or NOT_CACHEABLE_PATTERN.search(text):
+        return None
+    candidates = [intents.RECOMMENDATION, intents.ORDER_STATUS]
+    if intents.classify_with_rules(text, candidates) != intents.RECOMMENDATION:
+        return None
+
+    slots = extract_slots(text)
+    order_ids = ORDER_ID_PATTERN.findall(text)
+    if order_ids:
+        slots["order_id"] = sorted(int(order_id) for order_id in order_ids)
+    if not slots:
+        return None
+
+    skip = STOPWORDS | slot_words(text)
+    words = [
+        word
+        for word in WORD_PATTERN.findall(text.lower())
+        if word not in skip and not word.strip("$").isdigit()
+    ]
+    return {"slots": slots, "words": sorted(set(words))}
+
+
+def final_answer(
+    messages: List, agent: str, searched: bool = False
+) -> Optional[Tuple[str, str]]:
+    """
+    (agent, answer) of a finished chat: the first text `agent` wrote after
+    its product search returned (or at once when the prompt carried the
+    products), else None.
+    """
+    for msg in messages:
+        if not isinstance(msg, dict):
+            continue
+        if msg.get("user") == "recommend_product":
+            searched = True
+        elif (
+            searched
+            and msg.get("user") == agent
+            and isinstance(msg.get("message"), str)
+            and msg["message"].strip()
+        ):
+            return agent, msg["message"]
+    return None
+
+
+class AnswerCache:
+    def __init__(
+        self, max_entries: int = ANSWER_CACHE_SIZE, ttl: float = ANSWER_CACHE_TTL
+    ):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._answers: "OrderedDict[str, Dict]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, normalized: Dict, catalog_version: str) -> str:
+        data = json.dumps([normalized, catalog_version], sort_keys=True)
+        return hashlib.sha256(data.encode()).hexdigest()
+
+    def lookup(self, db, text: str) -> Tuple[Optional[str], Optional[Dict]]:
+        """(key, cached answer) for `text`; the key is None when it is not cacheable."""
+        if self.ttl <= 0:
+            return None, None
+        normalized = normalize(text)
+        if normalized is None:
+            return None, None
+
+        catalog_version = db.get_table_version("products")
+        if catalog_version is None:
+            return None, None
+        key = self.key(normalized, catalog_version)
+        with self._lock:
+            entry = self._answers.get(key)
+            if entry is not None and time.time() - entry["stored_at"] > self.ttl:
+                del self._answers[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return key, None
+            self._answers.move_to_end(key)
+            self.hits += 1
+            return key, entry
+
+    def put(self, key: str, agent: str, message: str):
+        with self._lock:
+            self._answers[key] = {
+                "agent": agent,
+                "message": message,
+                "stored_at": time.time(),
+            }
+            self._answers.move_to_end(key)
+            while len(self._answers) > self.max_entries:
+                self._answers.popitem(last=False)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "entries": len(self._answers),
+                "hits": self.hits,
+                "misses": self.misses,
+            }
@@ -0,0 +1,159 @@
+"""
+Purpose:
+    Cheap-first model routing with escalation on bad output.
+
+    An agent with a "cascade" entry in its agent_info gets a config_list of
+    [its own model, the escalation model] plus a filter_func. autogen's
+    OpenAIWrapper tries configs in order and only moves on when filter_func
+    rejects a response, so the larger model is called just for replies of
+    the cheap one that fail the agent's checks:
+
+        "function_call"  every call names an offered function and its
+                         arguments parse as JSON with all required parameters
+        "decision"       a text reply states one of the agent's "decisions",
+                         e.g. Refund / Replace / Escalate
+        "confident"      the reply is not empty and does not hedge
+
+        "cascade": {
+            "escalate_to": "gpt-4o",              # optional, LLM_STRONG_MODEL
+            "checks": ["function_call", "decision"],
+            "decisions": ["Refund", "Replace", "Escalate"],
+        }
+
+    Routing turns (speaker selection, intent classification) use FAST_MODEL.
+    A streamed reply that gets escalated is streamed twice; the final message
+    replaces both.
+"""
+
+import json
+import os
+import re
+from typing import Any, Dict, Iterable, List, Optional
+
+from agents.modules import metrics
+
+FAST_MODEL = os.environ.get("LLM_FAST_MODEL", "gpt-4o-mini")
+STRONG_MODEL = os.environ.get("LLM_STRONG_MODEL", "gpt-4o")
+
+DEFAULT_CHECKS = ("function_call", "confident")
+
+HEDGE_PATTERN = re.compile(
+    r"\b(i'?m not sure|i am not sure|i (?:cannot|can'?t|am unable to) determine|"
+    r"unable to determine|it is unclear|not enough information)\b",
+    re.IGNORECASE,
+)
+
+
+def response_message(response):
+    choices = getattr(response, "choices", None) or []
+    return choices[0].message if choices else None
+
+
+def function_calls(message) -> List[tuple]:
+    """(name, arguments) of every function / tool call in a completion message."""
+    calls = []
+    if getattr(message, "function_call", None):
+        calls.append((message.function_call.name, message.function_call.arguments))
+    for tool_call in getattr(message, "tool_calls", None) or []:
+        calls.append((tool_call.function.name, tool_call.function.arguments))
+    return calls
+
+
+# ------------------ checks ------------------
+
+
+def check_function_call(message, policy: "CascadePolicy") -> bool:
+    for name, arguments in function_calls(message):
+        spec = policy.functions.get(name)
+        if spec is None:
+            return False
+        try:
+            args = json.loads(arguments or "{}")
+        except json.JSONDecodeError:
+            return False
+        if not isinstance(args, dict):
+            return False
+        required = spec.get("parameters", {}).get("required", [])
+        if any(key not in args for key in required):
+            return False
+    return True
+
+
+def check_decision(message, policy: "CascadePolicy") -> bool:
+    if function_calls(message):
+        return True  # a lookup on the way to the decision
+    content = message.content or ""
+    return any(
+        re.search(rf"\b{re.escape(decision)}", content, re.IGNORECASE)
+        for decision in policy.decisions
+    )
+
+
+def check_confident(message, policy: "CascadePolicy") -> bool:
+    if function_calls(message):
+        return True
+    content = (message.content or "").strip()
+    return bool(content) and not HEDGE_PATTERN.search(content)
+
+
+CHECKS = {
+    "function_call": check_function_call,
+    "decision": check_decision,
+    "confident": check_confident,
+}
+
+
+class CascadePolicy:
+    """autogen filter_func: True keeps the response, False escalates it."""
+
+    def __init__(
+        self,
+        checks: Iterable[str] = DEFAULT_CHECKS,
+        decisions: Iterable[str] = (),
+        functions: Iterable[Dict[str, Any]] = (),
+    ):
+        self.checks = list(checks)
+        unknown = [check for check in self.checks if check not in CHECKS]
+        if unknown:
+            raise ValueError(f"unknown cascade checks: {', '.join(unknown)}")
+        self.decisions = list(decisions)
+        if "decision" in self.checks and not self.decisions:
+            raise ValueError('the "decision" check needs a list of "decisions"')
+        self.functions = {function["name"]: function for function in functions}
+
+    def failed_check(self, response) -> Optional[str]:
+        message = response_message(response)
+        if message is None:
+            return "confident"
+        for check in self.checks:
+            if not CHECKS[check](message, self):
+                return check
+        return None
+
+    def __call__(self, context=None, response=None) -> bool:
+        check = self.failed_check(response)
+        if check is None:
+            return True
+        model = getattr(response, "model", None) or "unknown"
+        print(f"cascade: {model} reply failed the {check} check")
+        metrics.registry.record_llm_rejection(model, check)
+        return False
+
+    def __deepcopy__(self, memo):
+        # agents deep-copy their llm_config; keep one policy per agent template
+        return self
+
+
+def llm_config(agent_info: Dict, functions: Iterable[Dict[str, Any]] = ()) -> Dict:
+    """config_list (and filter_func) entries of an agent's llm_config."""
+    spec = agent_info.get("cascade")
+    if not spec:
+        return {"config_list": [agent_info["llm"]]}
+
+    policy = CascadePolicy(
+        checks=spec.get("checks", DEFAULT_CHECKS),
+        decisions=spec.get("decisions", ()),
+        functions=functions,
+    )
+    escalate_to = {**agent_info["llm"], "model": spec.get("escalate_to", STRONG_MODEL)}
+    return {"config_list": [agent_info["llm"], escalate_to], "filter_func": policy}
@@ -0,0 +1,124 @@
+"""
+Purpose:
+    Run group chats on a bounded pool of worker threads with admission control.
+    Each worker keeps one long-lived event loop that it reuses for every chat,
+    instead of a fresh thread and a fresh asyncio.run per /api/start_chat.
+"""
+
+import asyncio
+import os
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional
+
+from agents.modules.sessions import ChatSession
+
+DEFAULT_MAX_CONCURRENT_CHATS = 16
+DEFAULT_MAX_WAITING_CHATS = 32
+
+_worker = threading.local()
+
+
+class ChatPoolFull(Exception):
+    """Raised when both the running slots and the wait queue are taken."""
+
+
+def run_on_worker_loop(coro):
+    """
+    Run `coro` to completion on the calling worker's event loop.
+    Unlike asyncio.run the loop (and its default executor used by autogen for
+    LLM calls) survives between chats; only leftover tasks are cancelled.
+    """
+    loop = getattr(_worker, "loop", None)
+    if loop is None or loop.is_closed():
+        loop = asyncio.new_event_loop()
+        _worker.loop = loop
+    asyncio.set_event_loop(loop)
+    try:
+        return loop.run_until_complete(coro)
+    finally:
+        leftovers = asyncio.all_tasks(loop)
+        for task in leftovers:
+            task.cancel()
+        if leftovers:
+            loop.run_until_complete(asyncio.gather(*leftovers, return_exceptions=True))
+
+
+class ChatPool:
+    """
+    At most `max_concurrent` chats run at once; up to `max_waiting` more are
+    queued in arrival order. Anything beyond that is refused with ChatPoolFull
+    so latency stays predictable under a traffic spike.
+    """
+
+    def __init__(
+        self,
+        max_concurrent: Optional[int] = None,
+        max_waiting: Optional[int] = None,
+    ):
+        self.max_concurrent = max_concurrent or int(
+            os.environ.get("MAX_CONCURRENT_CHATS", DEFAULT_MAX_CONCURRENT_CHATS)
+        )
+        self.max_waiting = (
+            max_waiting
+            if max_waiting is not None
+            else int(os.environ.get("MAX_WAITING_CHATS", DEFAULT_MAX_WAITING_CHATS))
+        )
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.max_concurrent, thread_name_prefix="chat-worker"
+        )
+        self._lock = threading.Lock()
+        self._running = 0
+        self._pending = deque()  # session ids submitted but not started yet
+
+    def submit(self, session: ChatSession, fn: Callable, *args) -> int:
+        """
+        Schedule `fn(session, *args)` and return the session's queue position
+        (0 when it starts right away).
+        """
+        with self._lock:
+            admitted = self._running + len(self._pending)
+            if admitted >= self.max_concurrent + self.max_waiting:
+                raise ChatPoolFull(
+                    f"{self._running} chats running and {len(self._pending)} waiting"
+                )
+            self._pending.append(session.session_id)
+            position = self._position_locked(len(self._pending) - 1)
+
+        if position:
+            session.set_status("queued")
+        self._executor.submit(self._run, session, fn, args)
+        return position
+
+    def queue_position(self, session_id: str) -> int:
+        with self._lock:
+            try:
+                index = self._pending.index(session_id)
+            except ValueError:
+                return 0
+            return self._position_locked(index)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "running": self._running,
+                "waiting": len(self._pending),
+                "max_concurrent": self.max_concurrent,
+                "max_waiting": self.max_waiting,
+            }
+
+    def _position_locked(self, index: int) -> int:
+        return max(0, self._running + index + 1 - self.max_concurrent)
+
+    def _run(self, session: ChatSession, fn: Callable, args: tuple):
+        with self._lock:
+            self._pending.remove(session.session_id)
+            self._running += 1
+        try:
+            if session.chat_status == "queued":
+                session.set_status("Chat ongoing")
+            fn(session, *args)
+        finally:
+            with self._lock:
+                self._running -= 1
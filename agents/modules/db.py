@@ -1,26 +1,289 @@
+from contextlib import contextmanager
 from datetime import datetime
 import json
+import os
+import re
+import threading
+import time
 import psycopg2
+import psycopg2.errors
+import psycopg2.extensions
 from psycopg2.sql import SQL, Identifier
 
+POSTGRES_POOL_MIN = int(os.environ.get("POSTGRES_POOL_MIN", 1))
+POSTGRES_POOL_MAX = int(os.environ.get("POSTGRES_POOL_MAX", 10))
+# seconds a call waits for a free connection before giving up
+POSTGRES_POOL_TIMEOUT = float(os.environ.get("POSTGRES_POOL_TIMEOUT", 30))
+# connections idle longer than this are pinged before they are handed out
+POSTGRES_POOL_CHECK_AFTER = float(os.environ.get("POSTGRES_POOL_CHECK_AFTER", 30))
+# seconds the table definitions are served from memory before the schema
+# fingerprint is compared again, 0 compares on every call
+SCHEMA_CHECK_INTERVAL = float(os.environ.get("SCHEMA_CHECK_INTERVAL", 60))
+
+# every column of every public table, in prompt order
+TABLE_COLUMNS_FROM = """
+    FROM pg_class c
+    JOIN pg_namespace n ON n.oid = c.relnamespace
+    JOIN pg_attribute a ON a.attrelid = c.oid
+    WHERE n.nspname = 'public'
+        AND c.relkind IN ('r', 'p')
+        AND a.attnum > 0
+        AND NOT a.attisdropped
+        AND c.relname <> 'table_versions'
+"""
+TABLE_COLUMNS_STMT = (
+    "SELECT c.relname, a.attname, format_type(a.atttypid, a.atttypmod)"
+    + TABLE_COLUMNS_FROM
+    + "ORDER BY c.relname, a.attnum"
+)
+SCHEMA_FINGERPRINT_STMT = (
+    "SELECT md5(string_agg(c.relname || '.' || a.attname || ' ' "
+    "|| format_type(a.atttypid, a.atttypmod), ',' ORDER BY c.relname, a.attnum))"
+    + TABLE_COLUMNS_FROM
+)
+
+# rows of an agent's query that are sent back to it, the rest is only counted
+RESULT_MAX_ROWS = int(os.environ.get("RESULT_MAX_ROWS", 50))
+# longer text values (descriptions...) are cut to this many characters
+RESULT_MAX_VALUE_CHARS = int(os.environ.get("RESULT_MAX_VALUE_CHARS", 300))
+# comma separated columns left out of every result
+RESULT_OMIT_COLUMNS = {
+    column.strip().lower()
+    for column in os.environ.get("RESULT_OMIT_COLUMNS", "creditcardnumber").split(",")
+    if column.strip()
+}
+# limits of agent-written SQL, see PostgresManager.run_bounded; 0 turns a check off
+SQL_STATEMENT_TIMEOUT_MS = int(os.environ.get("SQL_STATEMENT_TIMEOUT_MS", 5000))
+SQL_MAX_COST = float(os.environ.get("SQL_MAX_COST", 100000))
+SQL_MAX_PLAN_ROWS = int(os.environ.get("SQL_MAX_PLAN_ROWS", 100000))
+# errors of the guards above, returned to the agent instead of raised
+GUARD_ERRORS = (psycopg2.errors.QueryCanceled, psycopg2.errors.ReadOnlySqlTransaction)
+# statements a server-side cursor can be declared for
+CURSOR_QUERY_PATTERN = re.compile(r"^\s*(select|with|values|table)\b", re.IGNORECASE)
+WRITE_QUERY_PATTERN = re.compile(
+    r"\b(insert|update|delete|merge|into|for\s+(update|share))\b", re.IGNORECASE
+)
+
+# fixed lookups, prepared once per pooled connection, see execute_prepared
+PREPARED_STATEMENTS = {
+    "order_status": "SELECT orderdate, orderstatus FROM orders WHERE orderid = $1",
+    "order_totalprice": "SELECT totalprice FROM orders WHERE orderid = $1",
+    "damaged_package_img": (
+        "SELECT damaged_package_img FROM Package_damaged WHERE orderid = $1"
+    ),
+    "defect_product_img": (
+        "SELECT defect_product_img FROM Product_defect WHERE orderid = $1"
+    ),
+    "product_price": "SELECT price FROM products WHERE productid = $1",
+}
+# 0 sends the plain SQL text on every call instead
+POSTGRES_PREPARED = os.environ.get("POSTGRES_PREPARED", "1") != "0"
+PLACEHOLDER_PATTERN = re.compile(r"\$(\d+)")
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+class PooledConnection:
+    def __init__(self, conn):
+        self.conn = conn
+        self.prepared = set()  # names of statements prepared on this connection
+        self.released_at = time.monotonic()
+
+
+class ConnectionPool:
+    """
+    Thread-safe pool of connections to one database. Connections are opened
+    on demand up to `max_size`, `min_size` of them when the pool is created.
+    A caller that finds none free waits up to `timeout` seconds.
+    """
+
+    def __init__(
+        self,
+        url,
+        min_size=POSTGRES_POOL_MIN,
+        max_size=POSTGRES_POOL_MAX,
+        timeout=POSTGRES_POOL_TIMEOUT,
+        check_after=POSTGRES_POOL_CHECK_AFTER,
+    ):
+        self.url = url
+        self.min_size = min(min_size, max_size)
+        self.max_size = max_size
+        self.timeout = timeout
+        self.check_after = check_after
+        self._idle = []
+        self._size = 0  # open connections, idle or in use
+        self._waiting = 0
+        self._timeouts = 0
+        self._discarded = 0
+        self._cond = threading.Condition()
+        for _ in range(self.min_size):
+            self._idle.append(PooledConnection(psycopg2.connect(url)))
+            self._size += 1
+
+    def getconn(self, timeout=None):
+        deadline = time.monotonic() + (self.timeout if timeout is None else timeout)
+        while True:
+            pooled, create = None, False
+            with self._cond:
+                while not self._idle and self._size >= self.max_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._timeouts += 1
+                        raise PoolTimeout(
+                            f"no database connection free after {self.timeout:g}s "
+                            f"({self.max_size} in use)"
+                        )
+                    self._waiting += 1
+                    try:
+                        self._cond.wait(remaining)
+                    finally:
+                        self._waiting -= 1
+                if self._idle:
+                    pooled = self._idle.pop()
+                else:
+                    self._size += 1
+                    create = True
+
+            if create:
+                try:
+                    return PooledConnection(psycopg2.connect(self.url))
+                except Exception:
+                    self._forget()
+                    raise
+            if self._healthy(pooled):
+                return pooled
+            self._discard(pooled)
+
+    def putconn(self, pooled):
+        status = (
+            psycopg2.extensions.TRANSACTION_STATUS_UNKNOWN
+            if pooled.conn.closed
+            else pooled.conn.get_transaction_status()
+        )
+        if status != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+            self._discard(pooled)
+            return
+        pooled.released_at = time.monotonic()
+        with self._cond:
+            self._idle.append(pooled)
+            self._cond.notify()
+
+    def _healthy(self, pooled):
+        if pooled.conn.closed:
+            return False
+        if time.monotonic() - pooled.released_at < self.check_after:
+            return True
+        try:
+            with pooled.conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            pooled.conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def _discard(self, pooled):
+        try:
+            pooled.conn.close()
+        except psycopg2.Error:
+            pass
+        with self._cond:
+            self._discarded += 1
+        self._forget()
+
+    def _forget(self):
+        with self._cond:
+            self._size -= 1
+            self._cond.notify()
+
+    def closeall(self):
+        with self._cond:
+            idle, self._idle = self._idle, []
+            self._size -= len(idle)
+        for pooled in idle:
+            pooled.conn.close()
+
+    def stats(self):
+        with self._cond:
+            return {
+                "size": self._size,
+                "idle": len(self._idle),
+                "in_use": self._size - len(self._idle),
+                "waiting": self._waiting,
+                "timeouts": self._timeouts,
+                "discarded": self._discarded,
+            }
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+# database URL -> {"fingerprint", "definitions", "checked_at"}
+_schemas = {}
+_schemas_lock = threading.Lock()
+
+
+def get_pool(url):
+    """The process-wide pool of `url`, created on first use."""
+    with _pools_lock:
+        if url not in _pools:
+            _pools[url] = ConnectionPool(url)
+        return _pools[url]
+
+
+def pool_stats():
+    """stats() of all pools of this process, added up."""
+    with _pools_lock:
+        pools = list(_pools.values())
+    total = {}
+    for pool in pools:
+        for key, value in pool.stats().items():
+            total[key] = total.get(key, 0) + value
+    return total
+
 
 class PostgresManager:
-    def __init__(self):
-        self.conn = None
-        self.cur = None
+    """
+    Database access for the agents. Every call borrows a connection from the
+    shared pool and returns it when done, so one manager can be used by
+    concurrent chats.
+    """
+
+    def __init__(self, use_prepared=POSTGRES_PREPARED):
+        self.pool = None
+        self.use_prepared = use_prepared
 
     def __enter__(self):
         return self
 
-    def __exit__(self, exc_type, exc_val):
-        if self.cur:
-            self.cur.close()
-        if self.conn:
-            self.conn.close()
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        pass  # connections go back to the pool after every call
 
     def connect_with_url(self, url):
-        self.conn = psycopg2.connect(url)
-        self.cur = self.conn.cursor()
+        self.pool = get_pool(url)
+
+    @contextmanager
+    def connection(self):
+        """A pooled connection for one call, committed or rolled back at the end."""
+        pooled = self.pool.getconn()
+        try:
+            yield pooled
+            pooled.conn.commit()
+        except BaseException:
+            if not pooled.conn.closed:
+                try:
+                    pooled.conn.rollback()
+                except psycopg2.Error:
+                    pass
+            raise
+        finally:
+            self.pool.putconn(pooled)
+
+    @contextmanager
+    def cursor(self):
+        with self.connection() as pooled:
+            with pooled.conn.cursor() as cur:
+                yield cur
 
     def upsert(self, table_name, _dict):
         columns = _dict.keys()
@@ -38,35 +301,30 @@ class PostgresManager:
                 ]
             ),
         )
-        self.cur.execute(upsert_stmt, list(_dict.values()))
-        self.conn.commit()
+        with self.cursor() as cur:
+            cur.execute(upsert_stmt, list(_dict.values()))
 
     def delete(self, table_name, _id):
         delete_stmt = SQL("DELETE FROM {} WHERE id = %s").format(Identifier(table_name))
-        self.cur.execute(delete_stmt, (_id,))
-        self.conn.commit()
+        with self.cursor() as cur:
+            cur.execute(delete_stmt, (_id,))
 
     def get(self, table_name, _id):
         select_stmt = SQL("SELECT * FROM {} WHERE customerid = %s").format(
             Identifier(table_name)
         )
-        self.cur.execute(select_stmt, (_id,))
-        return self.cur.fetchone()
+        with self.cursor() as cur:
+            cur.execute(select_stmt, (_id,))
+            return cur.fetchone()
 
     def get_all(self, table_name):
         select_all_stmt = SQL("SELECT * FROM {}").format(Identifier(table_name))
-        self.cur.execute(select_all_stmt)
-        return self.cur.fetchall()
+        with self.cursor() as cur:
+            cur.execute(select_all_stmt)
+            return cur.fetchall()
 
     def run_sql(self, sql) -> str:
-        self.cur.execute(sql)
-        columns = [desc[0] for desc in self.cur.description]
-        res = self.cur.fetchall()
-
-        list_of_dicts = [dict(zip(columns, row)) for row in res]
-
-        json_result = json.dumps(list_of_dicts, indent=4, default=self.datetime_handler)
-        return json_result
+        return self.run_bounded(sql)
 
     def datetime_handler(self, obj):
         if isinstance(obj, datetime):
@@ -85,9 +343,11 @@ class PostgresManager:
         WHERE pg_attribute.attnum > 0
             AND pg_class.relname = %s
             AND pg_namespace.nspname = 'public'
+        ORDER BY pg_attribute.attnum
         """
-        self.cur.execute(get_def_stmt, (table_name,))
-        rows = self.cur.fetchall()
+        with self.cursor() as cur:
+            cur.execute(get_def_stmt, (table_name,))
+            rows = cur.fetchall()
         create_table_stmt = "CREATE TABLE {} (\n".format(table_name)
         for row in rows:
             create_table_stmt += "{} {},\n".format(row[2], row[3])
@@ -96,36 +356,291 @@ class PostgresManager:
 
     def get_all_table_names(self):
         get_all_tables_stmt = (
-            "SELECT tablename FROM pg_tables WHERE schemaname = 'public';"
+            "SELECT tablename FROM pg_tables WHERE schemaname = 'public' "
+            "ORDER BY tablename;"
         )
-        self.cur.execute(get_all_tables_stmt)
-        return [row[0] for row in self.cur.fetchall()]
+        with self.cursor() as cur:
+            cur.execute(get_all_tables_stmt)
+            return [row[0] for row in cur.fetchall()]
 
     def get_table_definitions_for_prompt(self):
-        table_names = self.get_all_table_names()
-        definitions = []
-        for table_name in table_names:
-            definitions.append(self.get_table_definition(table_name))
-        return "\n\n".join(definitions)
+        """
+        CREATE TABLE text of every public table. Built with one catalog query
+        and kept in memory while the schema fingerprint stays the same.
+        """
+        with _schemas_lock:
+            cached = _schemas.get(self.pool.url)
+        now = time.monotonic()
+        if cached and now - cached["checked_at"] < SCHEMA_CHECK_INTERVAL:
+            return cached["definitions"]
+
+        with self.cursor() as cur:
+            cur.execute(SCHEMA_FINGERPRINT_STMT)
+            fingerprint = cur.fetchone()[0]
+            if cached and cached["fingerprint"] == fingerprint:
+                definitions = cached["definitions"]
+            else:
+                cur.execute(TABLE_COLUMNS_STMT)
+                definitions = self.format_table_definitions(cur.fetchall())
+                print(f"Loaded table definitions, schema {fingerprint}")
+
+        with _schemas_lock:
+            _schemas[self.pool.url] = {
+                "fingerprint": fingerprint,
+                "definitions": definitions,
+                "checked_at": now,
+            }
+        return definitions
+
+    def format_table_definitions(self, rows):
+        """(table, column, type) rows as get_table_definition's CREATE TABLE text."""
+        columns = {}
+        for table_name, column, column_type in rows:
+            columns.setdefault(table_name, []).append(f"{column} {column_type}")
+        return "\n\n".join(
+            "CREATE TABLE {} (\n{}\n);".format(table_name, ",\n".join(table_columns))
+            for table_name, table_columns in columns.items()
+        )
+
+    def refresh_table_definitions(self):
+        """Drop the cached table definitions, e.g. right after running DDL."""
+        with _schemas_lock:
+            _schemas.pop(self.pool.url, None)
+
+    def get_table_version(self, table_name):
+        """
+        A stamp that changes whenever rows of `table_name` are written, from
+        the Table_versions row its trigger bumps (see clothShop.sql) and the
+        table's oid, which changes when the table is recreated. None when the
+        table is not versioned.
+        """
+        get_version_stmt = """
+        SELECT c.oid, COALESCE(v.version, 0)
+        FROM pg_class c
+        JOIN pg_namespace n ON n.oid = c.relnamespace
+        LEFT JOIN table_versions v ON v.table_name = c.relname
+        WHERE n.nspname = 'public' AND c.relname = %s
+            AND EXISTS (
+                SELECT 1 FROM pg_trigger t
+                WHERE t.tgrelid = c.oid AND t.tgname = %s
+            )
+        """
+        table_name = table_name.lower()
+        try:
+            with self.cursor() as cur:
+                cur.execute(get_version_stmt, (table_name, f"{table_name}_version"))
+                row = cur.fetchone()
+        except psycopg2.errors.UndefinedTable:
+            return None  # database created before Table_versions existed
+        return "-".join(map(str, row)) if row else None
 
     # New function to handle product recommendation
     def recommend_product(self, sql) -> str:
-        self.cur.execute(sql)
-        columns = [desc[0] for desc in self.cur.description]
-        res = self.cur.fetchall()
+        return self.run_bounded(sql)
 
-        list_of_dicts = [dict(zip(columns, row)) for row in res]
+    def run_bounded(self, sql, max_rows=None) -> str:
+        """
+        Run agent-written `sql` and return at most `max_rows` rows as compact
+        JSON, plus the total row count. Read-only queries go through a
+        server-side cursor, so rows past the cap are counted by the server
+        and never sent.
+
+        The statement runs in a read-only transaction under
+        SQL_STATEMENT_TIMEOUT_MS. A plan estimated above SQL_MAX_COST or
+        SQL_MAX_PLAN_ROWS runs with a LIMIT when that makes it cheap enough,
+        else it is not run. Rejections come back as {"error": ...} so the
+        agent can retry with a cheaper query.
+        """
+        max_rows = RESULT_MAX_ROWS if max_rows is None else max_rows
+        statement = sql.strip().rstrip(";")
+        if ";" in statement:
+            return self.reject("Send a single SQL statement.")
+        read_query = CURSOR_QUERY_PATTERN.match(statement)
+        cursor_query = read_query and not WRITE_QUERY_PATTERN.search(statement)
 
-        json_result = json.dumps(list_of_dicts, indent=4, default=self.datetime_handler)
-        return json_result
+        try:
+            with self.connection() as pooled:
+                with pooled.conn.cursor() as cur:
+                    self.guard(cur)
+                    cost, plan_rows = self.estimate(cur, statement)
+                    if self.too_expensive(cost, plan_rows):
+                        limited = (
+                            f"SELECT * FROM ({statement}) AS limited "
+                            f"LIMIT {max_rows + 1}"
+                        )
+                        if not cursor_query or self.too_expensive(
+                            *self.estimate(cur, limited)
+                        ):
+                            return self.reject(
+                                f"The query is too expensive to run (estimated cost "
+                                f"{cost:.0f}, about {plan_rows} rows). Filter on "
+                                "indexed columns, select fewer rows or add a LIMIT.",
+                                estimated_cost=cost,
+                                estimated_rows=plan_rows,
+                            )
+                        print(
+                            f"SQL guard: limited a query estimated at cost {cost:.0f}"
+                        )
+                        cur.execute(limited)
+                        rows = cur.fetchall()
+                        columns = [desc[0] for desc in cur.description]
+                        return self.encode_result(
+                            columns,
+                            rows[:max_rows],
+                            None if len(rows) > max_rows else len(rows),
+                        )
+                    if not cursor_query:
+                        cur.execute(statement)
+                        return self.fetch_json(cur, max_rows)
+
+                with pooled.conn.cursor(name="agent_result") as cur:
+                    cur.execute(statement)
+                    rows = cur.fetchmany(max_rows)
+                    columns = [desc[0] for desc in cur.description]
+                    with pooled.conn.cursor() as counter:
+                        counter.execute(
+                            SQL("MOVE FORWARD ALL IN {}").format(Identifier(cur.name))
+                        )
+                        total = len(rows) + max(counter.rowcount, 0)
+        except GUARD_ERRORS as e:
+            return self.guard_rejection(e)
+        return self.encode_result(columns, rows, total)
+
+    def guard(self, cur):
+        """Make the current transaction read-only under SQL_STATEMENT_TIMEOUT_MS."""
+        cur.execute("SET TRANSACTION READ ONLY")
+        cur.execute("SET LOCAL statement_timeout = %s", (SQL_STATEMENT_TIMEOUT_MS,))
+
+    def guard_rejection(self, error) -> str:
+        if isinstance(error, psycopg2.errors.QueryCanceled):
+            return self.reject(
+                f"The query was cancelled after {SQL_STATEMENT_TIMEOUT_MS} ms. "
+                "Filter on indexed columns, select fewer rows or add a LIMIT."
+            )
+        return self.reject("Only read-only queries are allowed.")
+
+    def estimate(self, cur, statement, params=None):
+        """Planner (total cost, rows) of `statement`, without running it."""
+        if isinstance(statement, str):
+            statement = SQL(statement)
+        cur.execute(SQL("EXPLAIN (FORMAT JSON) ") + statement, params)
+        plan = cur.fetchone()[0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return plan[0]["Plan"]["Total Cost"], plan[0]["Plan"]["Plan Rows"]
+
+    def too_expensive(self, cost, plan_rows):
+        return (SQL_MAX_COST > 0 and cost > SQL_MAX_COST) or (
+            SQL_MAX_PLAN_ROWS > 0 and plan_rows > SQL_MAX_PLAN_ROWS
+        )
+
+    def reject(self, reason, **details) -> str:
+        print(f"SQL guard: {reason}")
+        return json.dumps({"error": reason, **details})
+
+    def fetch_json(self, cur, max_rows=None) -> str:
+        """Rows of an executed client-side cursor, bounded like run_bounded."""
+        max_rows = RESULT_MAX_ROWS if max_rows is None else max_rows
+        if cur.description is None:
+            # a write: row_count is the number of rows it affected
+            affected = max(cur.rowcount, 0)
+            return json.dumps(
+                {"columns": [], "rows": [], "row_count": affected, "truncated": False}
+            )
+        rows = cur.fetchmany(max_rows)
+        columns = [desc[0] for desc in cur.description]
+        return self.encode_result(columns, rows, max(cur.rowcount, len(rows)))
+
+    def encode_result(self, columns, rows, total) -> str:
+        keep = [
+            i
+            for i, column in enumerate(columns)
+            if column.lower() not in RESULT_OMIT_COLUMNS
+        ]
+        result = {
+            "columns": [columns[i] for i in keep],
+            "rows": [[self.compact_value(row[i]) for i in keep] for row in rows],
+            "row_count": total,  # None when the query ran with a LIMIT, uncounted
+            "truncated": total is None or total > len(rows),
+        }
+        if total is None:
+            result["note"] = (
+                f"Only the first {len(rows)} rows were fetched, "
+                "add filters to narrow the query."
+            )
+        elif result["truncated"]:
+            result["note"] = (
+                f"Only the first {len(rows)} of {total} rows are shown, "
+                "add filters or a LIMIT to narrow the query."
+            )
+        return json.dumps(result, separators=(",", ":"), default=self.datetime_handler)
+
+    def compact_value(self, value):
+        if isinstance(value, str) and len(value) > RESULT_MAX_VALUE_CHARS:
+            return value[:RESULT_MAX_VALUE_CHARS] + "..."
+        return value
+
+    def run_prepared(self, name, sql, params, max_rows=None) -> str:
+        """
+        Run agent-learned `sql` ($1, $2... placeholders) as a prepared
+        statement, prepared once per connection, under the guards of
+        run_bounded: read-only, statement_timeout and the EXPLAIN cost gate.
+        It is prepared with a LIMIT one row past `max_rows`, so no more rows
+        are ever sent; row_count is None when the result was cut.
+        """
+        max_rows = RESULT_MAX_ROWS if max_rows is None else max_rows
+        statement = sql.strip().rstrip(";")
+        limited = f"SELECT * FROM ({statement}) AS limited LIMIT {max_rows + 1}"
+        try:
+            with self.connection() as pooled, pooled.conn.cursor() as cur:
+                self.guard(cur)
+                execute_stmt, args = self.statement_for(
+                    pooled, cur, f"{name}_{max_rows + 1}", params, limited
+                )
+                cost, plan_rows = self.estimate(cur, execute_stmt, args)
+                if self.too_expensive(cost, plan_rows):
+                    return self.reject(
+                        f"The query is too expensive to run (estimated cost "
+                        f"{cost:.0f}, about {plan_rows} rows).",
+                        estimated_cost=cost,
+                        estimated_rows=plan_rows,
+                    )
+                cur.execute(execute_stmt, args)
+                rows = cur.fetchall()
+                columns = [desc[0] for desc in cur.description]
+        except GUARD_ERRORS as e:
+            return self.guard_rejection(e)
+        total = None if len(rows) > max_rows else len(rows)
+        return self.encode_result(columns, rows[:max_rows], total)
+
+    def execute_prepared(self, pooled, cur, name, params, sql=None):
+        """
+        EXECUTE statement `name` ($1, $2... placeholders; PREPARED_STATEMENTS
+        unless `sql` is given) on `pooled`, preparing it on first use of
+        that connection. Without use_prepared the plain text is sent instead.
+        """
+        cur.execute(*self.statement_for(pooled, cur, name, params, sql))
+
+    def statement_for(self, pooled, cur, name, params, sql=None):
+        """(statement, parameters) that run `name`, preparing it if needed."""
+        sql = sql or PREPARED_STATEMENTS[name]
+        if not self.use_prepared:
+            plain = PLACEHOLDER_PATTERN.sub(r"%(p\1)s", sql.replace("%", "%%"))
+            return plain, {f"p{i}": value for i, value in enumerate(params, 1)}
+        if name not in pooled.prepared:
+            cur.execute(SQL("PREPARE {} AS ").format(Identifier(name)) + SQL(sql))
+            pooled.prepared.add(name)
+        execute_stmt = SQL("EXECUTE {}").format(Identifier(name))
+        if params:
+            placeholders = SQL(", ").join([SQL("%s")] * len(params))
+            execute_stmt += SQL(" (") + placeholders + SQL(")")
+        return execute_stmt, params
 
     def fetch_damaged_package_url(self, order_id):
         try:
-            self.cur.execute(
-                "SELECT damaged_package_img FROM Package_damaged WHERE orderid = %s",
-                (order_id,),
-            )
-            result = self.cur.fetchone()
+            with self.connection() as pooled, pooled.conn.cursor() as cur:
+                self.execute_prepared(pooled, cur, "damaged_package_img", (order_id,))
+                result = cur.fetchone()
             if result:
                 damaged_package_url = result[0]
                 # return f"<img {damaged_package_url}>"
@@ -137,11 +652,9 @@ class PostgresManager:
 
     def fetch_defect_product_url(self, order_id):
         try:
-            self.cur.execute(
-                "SELECT defect_product_img FROM Product_defect WHERE orderid = %s",
-                (order_id,),
-            )
-            result = self.cur.fetchone()
+            with self.connection() as pooled, pooled.conn.cursor() as cur:
+                self.execute_prepared(pooled, cur, "defect_product_img", (order_id,))
+                result = cur.fetchone()
             if result:
                 defect_product_url = result[0]
                 # return f"<img {defect_product_url}>"
@@ -162,7 +675,7 @@ class PostgresManager:
         productid,
         quantity,
     ):
-        try:
+        with self.connection() as pooled, pooled.conn.cursor() as cur:
             # Step 1: Insert customer details into the `customers` table
             insert_customer_query = """
             INSERT INTO customers (firstname, lastname, email, phonenumber, shippingaddress, creditcardnumber)
@@ -179,14 +692,12 @@ class PostgresManager:
             )
 
             # Execute the insert query and get the new customerid
-            self.cur.execute(insert_customer_query, customer_data)
-            customerid = self.cur.fetchone()[0]  # Fetch the generated customerid
+            cur.execute(insert_customer_query, customer_data)
+            customerid = cur.fetchone()[0]  # Fetch the generated customerid
 
             # Step 2: Fetch product price
-            self.cur.execute(
-                "SELECT price FROM products WHERE productid = %s", (productid,)
-            )
-            product_price = self.cur.fetchone()[0]
+            self.execute_prepared(pooled, cur, "product_price", (productid,))
+            product_price = cur.fetchone()[0]
             total_price = product_price * quantity
 
             # Step 3: Insert order details into the `orders` table
@@ -205,20 +716,15 @@ class PostgresManager:
             )
 
             # Execute the insert query and get the new orderid
-            self.cur.execute(insert_order_query, order_data)
-            orderid = self.cur.fetchone()[0]  # Fetch the generated orderid
+            cur.execute(insert_order_query, order_data)
+            orderid = cur.fetchone()[0]  # Fetch the generated orderid
 
-            # Commit the transaction
-            self.conn.commit()
+            # The transaction is committed when the connection goes back,
+            # or rolled back if any step failed
 
             # Return the newly created orderid as confirmation
             return orderid
 
-        except Exception as e:
-            # Rollback the transaction in case of any error
-            self.conn.rollback()
-            raise e
-
         # old recommend_product function
         # def recommend_product(self, gender=None, primary_color=None, price_range=None):
         # query = "SELECT * FROM products WHERE 1=1"
@@ -279,11 +785,9 @@ class PostgresManager:
 
     def get_order_status(self, order_id):
         try:
-            self.cur.execute(
-                "SELECT orderdate, orderstatus FROM orders WHERE orderid = %s",
-                (order_id,),
-            )
-            order_status = self.cur.fetchone()
+            with self.connection() as pooled, pooled.conn.cursor() as cur:
+                self.execute_prepared(pooled, cur, "order_status", (order_id,))
+                order_status = cur.fetchone()
             if order_status:
                 return order_status
             else:
@@ -297,11 +801,9 @@ class PostgresManager:
         """
         try:
             # Execute SQL query to retrieve totalprice for the specified order_id
-            self.cur.execute(
-                "SELECT totalprice FROM orders WHERE orderid = %s",
-                (order_id,),
-            )
-            total_price = self.cur.fetchone()
+            with self.connection() as pooled, pooled.conn.cursor() as cur:
+                self.execute_prepared(pooled, cur, "order_totalprice", (order_id,))
+                total_price = cur.fetchone()
 
             # Check if the result exists and return it, otherwise return "Order not found"
             if total_price:
@@ -313,8 +815,9 @@ class PostgresManager:
 
     # Helper function to generate unique order ID (custom logic can be implemented)
     def _generate_order_id(self):
-        self.cur.execute("SELECT MAX(orderid) FROM orders")
-        max_order_id = self.cur.fetchone()[0]
+        with self.cursor() as cur:
+            cur.execute("SELECT MAX(orderid) FROM orders")
+            max_order_id = cur.fetchone()[0]
         if max_order_id is None:
             return 1
         return max_order_id + 1
@@ -0,0 +1,87 @@
+"""
+Purpose:
+    Answer plain order-status and total-price questions without any LLM call.
+    "where is order 12?" is a single indexed lookup; running it through the
+    group chat manager, order_status_agent, a function call and a summary
+    costs three or more model round trips. Anything that is not clearly one
+    such lookup falls through to the agents.
+"""
+
+import re
+from datetime import datetime
+from typing import Optional, Tuple
+
+ORDER_STATUS = "order_status"
+TOTAL_PRICE = "total_price"
+
+ORDER_ID_PATTERN = re.compile(
+    r"\border\s*(?:id|#|no\.?|number)?\s*(?:is\s*)?[:#]?\s*(\d+)\b", re.IGNORECASE
+)
+STATUS_PATTERN = re.compile(
+    r"\b(status|where is|track\w*|shipped|deliver\w*|arriv\w*)\b", re.IGNORECASE
+)
+PRICE_PATTERN = re.compile(
+    r"\b(total|price|cost|how much|amount|charged)\b", re.IGNORECASE
+)
+# anything else the customer wants done needs the agents
+AMBIGUOUS_PATTERN = re.compile(
+    r"\b(recommend\w*|buy|purchase|damag\w*|defect\w*|fraud\w*|bill(ed)?|"
+    r"cancel\w*|return\w*|refund\w*|change|update|replace\w*)\b|<img",
+    re.IGNORECASE,
+)
+
+RESPONSE_TEMPLATES = {
+    ORDER_STATUS: "Order {order_id} was placed on {orderdate} and its current status is **{orderstatus}**.",
+    TOTAL_PRICE: "The total price of order {order_id} is **${totalprice}**.",
+}
+NOT_FOUND_TEMPLATE = (
+    "I could not find order {order_id}. Please check the order ID and try again."
+)
+
+
+def match_fast_path(text: str) -> Optional[Tuple[str, int]]:
+    """(lookup, order_id) when `text` is clearly a single lookup, else None."""
+    if not text or AMBIGUOUS_PATTERN.search(text):
+        return None
+
+    order_ids = set(ORDER_ID_PATTERN.findall(text))
+    if len(order_ids) != 1:
+        return None
+
+    wants_status = bool(STATUS_PATTERN.search(text))
+    wants_price = bool(PRICE_PATTERN.search(text))
+    if wants_status == wants_price:
+        return None
+
+    lookup = ORDER_STATUS if wants_status else TOTAL_PRICE
+    return lookup, int(order_ids.pop())
+
+
+def format_date(value) -> str:
+    if isinstance(value, datetime):
+        return value.strftime("%B %d, %Y")
+    return str(value)
+
+
+def answer(db, lookup: str, order_id: int) -> str:
+    if lookup == ORDER_STATUS:
+        result = db.get_order_status(order_id)
+        if result == "Order not found":
+            return NOT_FOUND_TEMPLATE.format(order_id=order_id)
+        orderdate, orderstatus = result
+        return RESPONSE_TEMPLATES[ORDER_STATUS].format(
+            order_id=order_id, orderdate=format_date(orderdate), orderstatus=orderstatus
+        )
+
+    result = db.get_totalprice(order_id)
+    if result == "Order not found":
+        return NOT_FOUND_TEMPLATE.format(order_id=order_id)
+    return RESPONSE_TEMPLATES[TOTAL_PRICE].format(order_id=order_id, totalprice=result)
+
+
+def try_answer(db, text: str) -> Optional[str]:
+    """Templated answer for a plain lookup, or None to fall through to the agents."""
+    match = match_fast_path(text)
+    if match is None:
+        return None
+    return answer(db, *match)
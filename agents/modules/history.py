@@ -0,0 +1,176 @@
+"""
+Purpose:
+    Token-budgeted history compaction for long group chats.
+
+    autogen resends the whole transcript on every turn, so over 50-60 rounds
+    input tokens grow quadratically. This capability rewrites the messages an
+    agent sends to the model (its stored history is left untouched):
+        - the first message (the task, with TABLE_DEFINITIONS) and the last
+          `keep_last` messages are always kept verbatim
+        - older bulky tool outputs and JSON results (run_sql,
+          recommend_product) are replaced by a one-line summary
+        - if the prompt is over the token budget, the oldest of the remaining
+          messages are dropped and replaced by a single note. A function or
+          tool call and its results are kept or dropped together, the API
+          rejects a result whose call is missing
+"""
+
+import json
+import threading
+from collections import defaultdict
+from typing import Dict, List
+
+from autogen.agentchat.contrib.capabilities.agent_capability import AgentCapability
+
+from agents.modules import tokens
+
+DEFAULT_MAX_HISTORY_TOKENS = 6000
+DEFAULT_KEEP_LAST = 6
+# tool outputs / JSON bodies above this size get summarised once they are old
+DEFAULT_MAX_OUTPUT_TOKENS = 200
+
+
+def summarise_output(content: str, name: str = None) -> str:
+    """One-line stand-in for a bulky tool output or JSON result."""
+    label = f"{name} result" if name else "Earlier result"
+    try:
+        data = json.loads(content)
+    except (TypeError, ValueError):
+        return f"[{label} compacted: {content[:200]}...]"
+
+    if isinstance(data, dict) and isinstance(data.get("rows"), list):
+        # PostgresManager query result
+        rows = data["rows"]
+        first = (
+            json.dumps(dict(zip(data.get("columns", []), rows[0])), default=str)
+            if rows
+            else ""
+        )
+        return f"[{label} compacted: {data.get('row_count', len(rows))} rows. First row: {first}]"
+    if isinstance(data, list):
+        first = json.dumps(data[0], default=str) if data else ""
+        return f"[{label} compacted: {len(data)} rows. First row: {first}]"
+    if isinstance(data, dict):
+        return f"[{label} compacted: object with keys {', '.join(list(data)[:10])}]"
+    return f"[{label} compacted: {str(data)[:200]}]"
+
+
+def is_json(content: str) -> bool:
+    content = content.lstrip()
+    return content[:1] in ("[", "{")
+
+
+def is_call(message: Dict) -> bool:
+    return bool(message.get("function_call") or message.get("tool_calls"))
+
+
+def is_result(message: Dict) -> bool:
+    return message.get("role") in ("function", "tool")
+
+
+def group_calls(messages: List[Dict]) -> List[List[Dict]]:
+    """Split `messages` into groups, each call together with the results after it."""
+    groups = []
+    for message in messages:
+        if groups and is_result(message) and is_call(groups[-1][0]):
+            groups[-1].append(message)
+        else:
+            groups.append([message])
+    return groups
+
+
+class HistoryCompaction(AgentCapability):
+    def __init__(
+        self,
+        max_tokens: int = DEFAULT_MAX_HISTORY_TOKENS,
+        keep_last: int = DEFAULT_KEEP_LAST,
+        max_output_tokens: int = DEFAULT_MAX_OUTPUT_TOKENS,
+        model: str = tokens.DEFAULT_MODEL,
+    ):
+        self.max_tokens = max_tokens
+        self.keep_last = keep_last
+        self.max_output_tokens = max_output_tokens
+        self.model = model
+
+        # agent name -> {"calls", "tokens_before", "tokens_after"}
+        self.savings: Dict[str, Dict[str, int]] = defaultdict(
+            lambda: {"calls": 0, "tokens_before": 0, "tokens_after": 0}
+        )
+        self._lock = threading.Lock()
+
+    def add_to_agent(self, agent):
+        name = agent.name
+        agent.register_hook(
+            hookable_method="process_all_messages_before_reply",
+            hook=lambda messages: self.compact(messages, name),
+        )
+
+    def compact(self, messages: List[Dict], agent_name: str = "") -> List[Dict]:
+        head_size = 1
+        if len(messages) <= head_size + self.keep_last:
+            return messages
+
+        # the kept tail must not start with results whose call is outside it
+        tail_start = len(messages) - self.keep_last
+        while tail_start > head_size and is_result(messages[tail_start]):
+            tail_start -= 1
+        head = messages[:head_size]
+        groups = group_calls(
+            [
+                self._compact_message(message)
+                for message in messages[head_size:tail_start]
+            ]
+        )
+        tail = messages[tail_start:]
+
+        budget = self.max_tokens - tokens.count_messages_tokens(head + tail, self.model)
+        sizes = [tokens.count_messages_tokens(group, self.model) for group in groups]
+        dropped = 0
+        while groups and sum(sizes) > budget:
+            dropped += len(groups.pop(0))
+            sizes.pop(0)
+        middle = [message for group in groups for message in group]
+        if dropped:
+            note = {
+                "role": "user",
+                "name": "History",
+                "content": f"[{dropped} earlier messages omitted to save tokens]",
+            }
+            middle.insert(0, note)
+
+        compacted = head + middle + tail
+        if not dropped and all(a is b for a, b in zip(compacted, messages)):
+            return messages
+
+        before = tokens.count_messages_tokens(messages, self.model)
+        after = tokens.count_messages_tokens(compacted, self.model)
+        with self._lock:
+            stats = self.savings[agent_name]
+            stats["calls"] += 1
+            stats["tokens_before"] += before
+            stats["tokens_after"] += after
+        return compacted
+
+    def _compact_message(self, message: Dict) -> Dict:
+        content = message.get("content")
+        if not isinstance(content, str):
+            return message  # e.g. multimodal content with images, keep as is
+
+        is_tool_output = message.get("role") in ("function", "tool")
+        if not (is_tool_output or is_json(content)):
+            return message
+        if tokens.count_tokens(content, self.model) <= self.max_output_tokens:
+            return message
+
+        return {**message, "content": summarise_output(content, message.get("name"))}
+
+    def report(self) -> Dict[str, Dict[str, int]]:
+        """Per-agent token savings so far."""
+        with self._lock:
+            return {
+                agent_name: {
+                    **stats,
+                    "tokens_saved": stats["tokens_before"] - stats["tokens_after"],
+                }
+                for agent_name, stats in self.savings.items()
+            }
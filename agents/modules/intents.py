@@ -0,0 +1,102 @@
+"""
+Purpose:
+    Front-door intent classification.
+    Routes a customer request to a pipeline that only builds the agents the
+    intent needs. Keyword rules decide most requests for free; a single small
+    LLM call breaks ties, and None means "use the full group chat".
+"""
+
+import re
+from typing import Dict, Iterable, Optional
+
+from agents.modules import cascade, llm
+
+RECOMMENDATION = "recommendation"
+ORDER_STATUS = "order_status"
+DAMAGE_CLAIM = "damage_claim"
+FRAUD_BILL = "fraud_bill"
+
+INTENT_DESCRIPTIONS = {
+    RECOMMENDATION: "looking for product recommendations or wants to buy a product",
+    ORDER_STATUS: "asks about the status, date or price of an existing order",
+    DAMAGE_CLAIM: "reports a damaged package or a defective product",
+    FRAUD_BILL: "wants a bill, invoice or receipt checked for a fraudulent charge",
+}
+
+INTENT_RULES = {
+    RECOMMENDATION: [
+        r"\b(recommend\w*|suggest\w*|show me|looking for|want to buy|purchase)\b",
+        r"\b(shirts?|t-shirts?|jeans|dress(es)?|shorts|jackets?|trousers|pants|shoes)\b",
+        r"\b(size|colou?r|men'?s|women'?s|under \$?\d+)\b",
+    ],
+    ORDER_STATUS: [
+        r"\border\s*(id|#|no\.?|number)?\s*#?\s*\d+",
+        r"\b(status of (my )?order|where is my order|track(ing)?|delivered|shipped)\b",
+        r"\b(total|price) of (my )?order\b",
+    ],
+    DAMAGE_CLAIM: [
+        r"\b(damag\w*|defect\w*|broken|torn|crushed|wet|stain\w*)\b",
+        r"\bcondition of\b",
+    ],
+    FRAUD_BILL: [
+        r"\b(bill(ed)?|invoice|receipt|overcharg\w*|charged)\b",
+        r"\bfraud\w*\b",
+    ],
+}
+
+_COMPILED_RULES = {
+    intent: [re.compile(pattern, re.IGNORECASE) for pattern in patterns]
+    for intent, patterns in INTENT_RULES.items()
+}
+
+
+def rule_scores(text: str, candidates: Iterable[str]) -> Dict[str, int]:
+    return {
+        intent: sum(1 for rule in _COMPILED_RULES[intent] if rule.search(text))
+        for intent in candidates
+    }
+
+
+def classify_with_rules(text: str, candidates: Iterable[str]) -> Optional[str]:
+    """The single best scoring intent, or None on no match or a tie."""
+    scores = rule_scores(text, candidates)
+    best = max(scores.values(), default=0)
+    winners = [intent for intent, score in scores.items() if score == best]
+    if best == 0 or len(winners) > 1:
+        return None
+    return winners[0]
+
+
+def classify_with_llm(
+    text: str, candidates: Iterable[str], model: str = cascade.FAST_MODEL
+) -> Optional[str]:
+    candidates = list(candidates)
+    options = "\n".join(
+        f"- {intent}: {INTENT_DESCRIPTIONS[intent]}" for intent in candidates
+    )
+    answer = llm.prompt(
+        f"Classify this customer request of a cloth retail shop into exactly one of these intents:\n"
+        f"{options}\n\n"
+        f"Answer with the intent name only, or 'unknown' if none fits.\n\n"
+        f"Request: {text}",
+        model=model,
+        source="intent_classifier",
+    )
+    answer = (answer or "").strip().lower()
+    for intent in candidates:
+        if intent in answer:
+            return intent
+    return None
+
+
+def classify_intent(
+    text: str, candidates: Iterable[str], use_llm: bool = True
+) -> Optional[str]:
+    candidates = list(candidates)
+    intent = classify_with_rules(text, candidates)
+    if intent is None and use_llm:
+        try:
+            intent = classify_with_llm(text, candidates)
+        except Exception as e:
+            print(f"intent classification failed, using the full group chat: {e}")
+    return intent
@@ -2,22 +2,59 @@
 Purpose:
     Interact with the OpenAI API.
     Provide supporting prompt engineering functions.
+
+    Every model call of the process, whether from llm.prompt / a_prompt or
+    from an autogen agent whose llm_config includes `client_config()`, goes
+    through one LLMLimiter: a global cap on in-flight requests, a token
+    bucket of requests per minute for each model, and exponential backoff
+    on 429 / 5xx responses. Chat sessions share that bounded pool instead of
+    each hitting the API on its own and failing together on rate limits.
 """
 
-import sys
-from dotenv import load_dotenv
+import asyncio
 import os
-from typing import Any, Dict
+import random
+import re
+import threading
+import time
+import weakref
+from typing import Any, Dict, Iterable, List, Optional
+
+import httpx
 import openai
+from dotenv import load_dotenv
+
+from agents.modules import llm_cache, metrics
 
 # load .env file
 load_dotenv()
 
-assert os.environ.get("OPENAI_API_KEY")
-
 # get openai api key
 openai.api_key = os.environ.get("OPENAI_API_KEY")
 
+LLM_MAX_CONCURRENCY = int(os.environ.get("LLM_MAX_CONCURRENCY", 8))
+LLM_REQUESTS_PER_MINUTE = int(os.environ.get("LLM_REQUESTS_PER_MINUTE", 500))
+LLM_MAX_RETRIES = int(os.environ.get("LLM_MAX_RETRIES", 5))
+# e.g. http://localhost:5010/v1 for the local mock server (agents/mock_llm_server.py)
+LLM_BASE_URL = os.environ.get("LLM_BASE_URL")
+# streamed completions count prompt tokens with tiktoken, which has to download
+# its encodings; LLM_STREAMING=0 turns streaming off on machines without network
+LLM_STREAMING = os.environ.get("LLM_STREAMING", "1") != "0"
+
+# per-model overrides of LLM_REQUESTS_PER_MINUTE
+MODEL_REQUESTS_PER_MINUTE: Dict[str, int] = {}
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+BACKOFF_BASE = 0.5
+BACKOFF_MAX = 30.0
+
+MODEL_PATTERN = re.compile(rb'"model"\s*:\s*"([^"]+)"')
+
+
+class MissingAPIKeyError(RuntimeError):
+    pass
+
+
 # ------------------ helpers ------------------
 
 
@@ -42,31 +79,381 @@ def response_parser(response: Dict[str, Any]):
     return safe_get(response, "choices.0.message.content")
 
 
-# ------------------ content generators ------------------
+# ------------------ rate limiting ------------------
+
+
+class TokenBucket:
+    """`rate_per_minute` requests per minute, bursts of up to `capacity`."""
+
+    def __init__(self, rate_per_minute: float, capacity: float = None):
+        self.rate = rate_per_minute / 60
+        self.capacity = capacity or max(1.0, self.rate * 10)
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def take(self) -> float:
+        """Take one token; returns 0 on success, else the seconds to wait before retrying."""
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(
+                self.capacity, self.tokens + (now - self.updated_at) * self.rate
+            )
+            self.updated_at = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0.0
+            return (1 - self.tokens) / self.rate
+
+
+class LLMLimiter:
+    """
+    Process-wide limits on model calls. Slots are plain threading primitives
+    so chats running on different threads and event loops share them.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = LLM_MAX_CONCURRENCY,
+        requests_per_minute: int = LLM_REQUESTS_PER_MINUTE,
+        max_retries: int = LLM_MAX_RETRIES,
+    ):
+        self.max_concurrency = max_concurrency
+        self.requests_per_minute = requests_per_minute
+        self.max_retries = max_retries
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._lock = threading.Lock()
+
+    def bucket(self, model: str) -> TokenBucket:
+        with self._lock:
+            if model not in self._buckets:
+                self._buckets[model] = TokenBucket(
+                    MODEL_REQUESTS_PER_MINUTE.get(model, self.requests_per_minute)
+                )
+            return self._buckets[model]
+
+    def acquire(self, model: str):
+        start = time.perf_counter()
+        while (wait := self.bucket(model).take()) > 0:
+            time.sleep(wait)
+        self._slots.acquire()
+        metrics.registry.record_llm_wait(model, time.perf_counter() - start)
+
+    async def a_acquire(self, model: str):
+        start = time.perf_counter()
+        while (wait := self.bucket(model).take()) > 0:
+            await asyncio.sleep(wait)
+        if not self._slots.acquire(blocking=False):
+            # block a thread on the slot instead of polling; waiters are woken
+            # in the order they started waiting
+            acquired = asyncio.get_running_loop().run_in_executor(
+                None, self._slots.acquire
+            )
+            try:
+                await asyncio.shield(acquired)
+            except asyncio.CancelledError:
+                # the thread still takes the slot, give it back once it has
+                acquired.add_done_callback(lambda _: self.release())
+                raise
+        metrics.registry.record_llm_wait(model, time.perf_counter() - start)
+
+    def release(self):
+        self._slots.release()
+
+    def backoff(self, attempt: int, response: Optional[httpx.Response] = None):
+        """Exponential backoff with jitter, at least what the server asked for."""
+        delay = min(BACKOFF_MAX, BACKOFF_BASE * 2**attempt) * random.uniform(0.5, 1)
+        if response is not None:
+            try:
+                if "retry-after-ms" in response.headers:
+                    delay = max(delay, float(response.headers["retry-after-ms"]) / 1000)
+                elif "retry-after" in response.headers:
+                    delay = max(delay, float(response.headers["retry-after"]))
+            except ValueError:
+                pass
+        return min(delay, BACKOFF_MAX)
+
+
+def request_model(request: httpx.Request) -> str:
+    match = MODEL_PATTERN.search(request.content or b"")
+    return match.group(1).decode() if match else "unknown"
+
+
+class ReleasingStream(httpx.SyncByteStream):
+    """Response body that gives the request slot back once it is closed."""
+
+    def __init__(self, stream, release):
+        self._stream = stream
+        self._release = release
+        self._released = False
+
+    def __iter__(self):
+        yield from self._stream
+
+    def close(self):
+        try:
+            self._stream.close()
+        finally:
+            if not self._released:
+                self._released = True
+                self._release()
+
+
+class AsyncReleasingStream(httpx.AsyncByteStream):
+    def __init__(self, stream, release):
+        self._stream = stream
+        self._release = release
+        self._released = False
+
+    async def __aiter__(self):
+        async for chunk in self._stream:
+            yield chunk
+
+    async def aclose(self):
+        try:
+            await self._stream.aclose()
+        finally:
+            if not self._released:
+                self._released = True
+                self._release()
+
+
+class LimitedTransport(httpx.BaseTransport):
+    """
+    Wraps `transport` (a plain HTTPTransport by default), holding a limiter
+    slot per request and retrying 429 / 5xx.
+    """
 
+    def __init__(
+        self,
+        limiter: LLMLimiter,
+        transport: Optional[httpx.BaseTransport] = None,
+        **kwargs,
+    ):
+        self.limiter = limiter
+        self.transport = transport or httpx.HTTPTransport(**kwargs)
 
-def prompt(prompt: str, model: str = "gpt-4o-mini") -> str:
-    # validate the openai api key - if it's not valid, raise an error
+    def close(self):
+        self.transport.close()
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        model = request_model(request)
+        for attempt in range(self.limiter.max_retries + 1):
+            last_attempt = attempt == self.limiter.max_retries
+            self.limiter.acquire(model)
+            try:
+                response = self.transport.handle_request(request)
+            except httpx.TransportError:
+                self.limiter.release()
+                if last_attempt:
+                    raise
+                metrics.registry.record_llm_retry(model, "connection")
+                time.sleep(self.limiter.backoff(attempt))
+                continue
+
+            if response.status_code in RETRY_STATUSES and not last_attempt:
+                response.close()
+                self.limiter.release()
+                metrics.registry.record_llm_retry(model, str(response.status_code))
+                time.sleep(self.limiter.backoff(attempt, response))
+                continue
+
+            if response.is_closed:  # body already read, nothing left to stream
+                self.limiter.release()
+            else:
+                response.stream = ReleasingStream(response.stream, self.limiter.release)
+            return response
+
+
+class AsyncLimitedTransport(httpx.AsyncBaseTransport):
+    def __init__(
+        self,
+        limiter: LLMLimiter,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+        **kwargs,
+    ):
+        self.limiter = limiter
+        self.transport = transport or httpx.AsyncHTTPTransport(**kwargs)
+
+    async def aclose(self):
+        await self.transport.aclose()
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        model = request_model(request)
+        for attempt in range(self.limiter.max_retries + 1):
+            last_attempt = attempt == self.limiter.max_retries
+            await self.limiter.a_acquire(model)
+            try:
+                response = await self.transport.handle_async_request(request)
+            except httpx.TransportError:
+                self.limiter.release()
+                if last_attempt:
+                    raise
+                metrics.registry.record_llm_retry(model, "connection")
+                await asyncio.sleep(self.limiter.backoff(attempt))
+                continue
+
+            if response.status_code in RETRY_STATUSES and not last_attempt:
+                await response.aclose()
+                self.limiter.release()
+                metrics.registry.record_llm_retry(model, str(response.status_code))
+                await asyncio.sleep(self.limiter.backoff(attempt, response))
+                continue
+
+            if response.is_closed:
+                self.limiter.release()
+            else:
+                response.stream = AsyncReleasingStream(
+                    response.stream, self.limiter.release
+                )
+            return response
+
+
+class SharedHTTPClient(httpx.Client):
+    # agents deep-copy their llm_config, the client (and its limiter) must stay shared
+    def __deepcopy__(self, memo):
+        return self
+
+
+limiter = LLMLimiter()
+http_client = SharedHTTPClient(
+    transport=LimitedTransport(limiter), timeout=httpx.Timeout(120, connect=10)
+)
+
+
+def client_config() -> Dict[str, Any]:
+    """llm_config entries routing autogen's OpenAI calls through `limiter` and LLM_BASE_URL."""
+    # retries happen in the transport, openai's own retries would bypass the limiter
+    config = {"http_client": http_client, "max_retries": 0}
+    if LLM_BASE_URL:
+        config["base_url"] = LLM_BASE_URL
+    return config
+
+
+_client: Optional[openai.OpenAI] = None
+# AsyncOpenAI clients are bound to the event loop they were created on
+_async_clients = weakref.WeakKeyDictionary()
+_clients_lock = threading.Lock()
+
+
+def check_api_key():
     if not openai.api_key:
-        sys.exit(
-            """
-ERORR: OpenAI API key not found. Please export your key to OPENAI_API_KEY
-Example bash command:
-    export OPENAI_API_KEY=<your openai apikey>
-            """
+        raise MissingAPIKeyError(
+            "OpenAI API key not found. Please export your key to OPENAI_API_KEY, "
+            "e.g. export OPENAI_API_KEY=<your openai apikey>"
         )
 
-    response = openai.ChatCompletion.create(
-        model=model,
-        messages=[
+
+def get_client() -> openai.OpenAI:
+    global _client
+    check_api_key()
+    with _clients_lock:
+        if _client is None:
+            _client = openai.OpenAI(
+                api_key=openai.api_key,
+                base_url=LLM_BASE_URL,
+                http_client=http_client,
+                max_retries=0,
+            )
+        return _client
+
+
+def get_async_client() -> openai.AsyncOpenAI:
+    check_api_key()
+    loop = asyncio.get_running_loop()
+    with _clients_lock:
+        if loop not in _async_clients:
+            _async_clients[loop] = openai.AsyncOpenAI(
+                api_key=openai.api_key,
+                base_url=LLM_BASE_URL,
+                http_client=httpx.AsyncClient(
+                    transport=AsyncLimitedTransport(limiter),
+                    timeout=httpx.Timeout(120, connect=10),
+                ),
+                max_retries=0,
+            )
+        return _async_clients[loop]
+
+
+# ------------------ content generators ------------------
+
+
+def build_request(prompt: str, model: str) -> Dict[str, Any]:
+    return {
+        "model": model,
+        "messages": [
             {
                 "role": "user",
                 "content": prompt,
             }
         ],
+    }
+
+
+def record_call(source: str, result: Dict[str, Any], start: float, cached: bool):
+    # `source` labels the call in the metrics, like an agent name
+    usage = result.get("usage") or {}
+    metrics.registry.record_llm_call(
+        source,
+        result.get("model"),
+        usage.get("prompt_tokens", 0),
+        usage.get("completion_tokens", 0),
+        time.perf_counter() - start,
+        cached=cached,
+        cached_tokens=metrics.cached_prompt_tokens(usage),
     )
 
-    return response_parser(response)
+
+def prompt(prompt: str, model: str = "gpt-4o-mini", source: str = "llm.prompt") -> str:
+    request = build_request(prompt, model)
+
+    cache = llm_cache.response_cache
+    start = time.perf_counter()
+    result = cache.get(request, source=source) if cache else None
+    cached = result is not None
+    if not cached:
+        result = get_client().chat.completions.create(**request).model_dump()
+        if cache:
+            cache.set(request, result)
+
+    record_call(source, result, start, cached)
+    return response_parser(result)
+
+
+async def a_prompt(
+    prompt: str, model: str = "gpt-4o-mini", source: str = "llm.prompt"
+) -> str:
+    request = build_request(prompt, model)
+
+    cache = llm_cache.response_cache
+    start = time.perf_counter()
+    result = cache.get(request, source=source) if cache else None
+    cached = result is not None
+    if not cached:
+        response = await get_async_client().chat.completions.create(**request)
+        result = response.model_dump()
+        if cache:
+            cache.set(request, result)
+
+    record_call(source, result, start, cached)
+    return response_parser(result)
+
+
+async def prompt_many(
+    prompts: Iterable[str],
+    model: str = "gpt-4o-mini",
+    source: str = "llm.prompt",
+    return_exceptions: bool = False,
+) -> List[Optional[str]]:
+    """
+    Send all `prompts` concurrently, answers come back in the same order.
+    The limiter decides how many are actually in flight.
+    """
+    return await asyncio.gather(
+        *(a_prompt(text, model=model, source=source) for text in prompts),
+        return_exceptions=return_exceptions,
+    )
 
 
 def add_cap_ref(
@@ -74,14 +461,16 @@ def add_cap_ref(
 ) -> str:
     """
     Attaches a capitalized reference to the prompt.
+    The static reference comes first and the per-request `prompt` last, so
+    every request starts with the same bytes and can hit provider prompt caches.
     Example
-        prompt = 'Recommend a product for a customer'
+        prompt = 'Refactor this code.'
         prompt_suffix = 'Make it more readable using this EXAMPLE.'
         cap_ref = 'EXAMPLE'
         cap_ref_content = 'def foo():\n    return True'
-        returns 'Refactor this code. Make it more readable using this EXAMPLE.\n\nEXAMPLE\n\ndef foo():\n    return True'
+        returns 'Make it more readable using this EXAMPLE.\n\nEXAMPLE\n\ndef foo():\n    return True\n\nRefactor this code.'
     """
 
-    new_prompt = f"""{prompt} {prompt_suffix}\n\n{cap_ref}\n\n{cap_ref_content}"""
+    new_prompt = f"""{prompt_suffix}\n\n{cap_ref}\n\n{cap_ref_content}\n\n{prompt}"""
 
     return new_prompt
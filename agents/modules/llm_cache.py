@@ -0,0 +1,118 @@
+"""
+Purpose:
+    Persistent, content-addressed cache of LLM responses.
+
+    The agents run with temperature 0 and a fixed seed, so the same request
+    (same model, messages, tools and params) keeps getting the same answer.
+    Responses are stored on disk with diskcache under a sha256 of the request,
+    expire after LLM_CACHE_TTL seconds and are evicted least-recently-used
+    once the cache grows past LLM_CACHE_SIZE_MB.
+
+    One ResponseCache is shared by llm.prompt and, through `cache_config()`
+    in every llm_config, by all autogen agents, speaker selection and the
+    VisionCapability. Set LLM_CACHE_TTL=0 to turn caching off.
+"""
+
+import hashlib
+import json
+import os
+import threading
+from collections import Counter
+from typing import Any, Dict, Optional
+
+import diskcache
+import dotenv
+
+dotenv.load_dotenv()
+
+LLM_CACHE_DIR = os.environ.get("LLM_CACHE_DIR", ".cache/llm_responses")
+LLM_CACHE_TTL = int(os.environ.get("LLM_CACHE_TTL", 24 * 60 * 60))
+LLM_CACHE_SIZE_MB = int(os.environ.get("LLM_CACHE_SIZE_MB", 512))
+
+
+def cache_key(request) -> str:
+    """sha256 of a request; dicts are serialised with sorted keys first."""
+    if not isinstance(request, str):
+        request = json.dumps(request, sort_keys=True, default=str)
+    return hashlib.sha256(request.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """
+    Implements autogen's cache protocol (get / set / close and the context
+    manager) so it can be put in an llm_config as "cache". `source` only
+    labels the hit / miss counters.
+    """
+
+    def __init__(
+        self,
+        directory: str = LLM_CACHE_DIR,
+        ttl: int = LLM_CACHE_TTL,
+        size_limit_mb: int = LLM_CACHE_SIZE_MB,
+    ):
+        self.directory = directory
+        self.ttl = ttl
+        self._store = diskcache.Cache(
+            directory,
+            size_limit=size_limit_mb * 1024 * 1024,
+            eviction_policy="least-recently-used",
+        )
+        self._lock = threading.Lock()
+        self.hits = Counter()
+        self.misses = Counter()
+
+    def get(self, key, default: Any = None, source: str = "autogen") -> Any:
+        try:
+            value = self._store.get(cache_key(key), default)
+        except Exception as e:
+            print(f"LLM cache read failed, calling the model: {e}")
+            value = default
+
+        with self._lock:
+            if value is default:
+                self.misses[source] += 1
+            else:
+                self.hits[source] += 1
+        return value
+
+    def set(self, key, value: Any) -> None:
+        try:
+            self._store.set(cache_key(key), value, expire=self.ttl)
+        except Exception as e:
+            print(f"LLM cache write failed: {e}")
+
+    def clear(self) -> None:
+        self._store.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "hits": dict(self.hits),
+                "misses": dict(self.misses),
+                "entries": len(self._store),
+                "size_bytes": self._store.volume(),
+            }
+
+    def close(self) -> None:
+        """autogen closes its cache after every call; the shared store stays open."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __deepcopy__(self, memo):
+        # agents deep-copy their llm_config, the cache must stay shared
+        return self
+
+
+response_cache: Optional[ResponseCache] = ResponseCache() if LLM_CACHE_TTL > 0 else None
+
+
+def cache_config() -> Dict[str, Any]:
+    """llm_config entries routing autogen completions through `response_cache`."""
+    if response_cache is None:
+        # also switch off autogen's own unbounded cache_seed disk cache
+        return {"cache_seed": None}
+    return {"cache": response_cache}
@@ -0,0 +1,744 @@
+"""
+Purpose:
+    Per-session and per-agent latency, token and cost metrics.
+
+    Records, for every chat, each agent turn (wall time, tokens, model), every
+    LLM call, every tool call and the time spent picking the next speaker.
+    Process-wide totals are rendered in the Prometheus text format for
+    /metrics; each session also keeps a summary for /api/session_metrics.
+
+    LLM calls made through autogen are picked up from its runtime logging
+    hook, which tells us the calling agent. Agents are mapped to the session
+    they belong to with `track`; anything created or run on a chat's event
+    loop thread (speaker selection agents, the VisionCapability, tools) is
+    mapped through the `current_session` context variable set by run_chat.
+"""
+
+import functools
+import threading
+import time
+import uuid
+import weakref
+from collections import OrderedDict, defaultdict
+from contextvars import ContextVar
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+import autogen
+from autogen import runtime_logging
+from autogen.logger.base_logger import BaseLogger
+
+# summaries of at most this many sessions are kept for /api/session_metrics,
+# each until its session expires from the SessionRegistry
+MAX_SESSIONS_KEPT = 1000
+
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+# USD per 1k prompt / completion tokens, autogen's own table lacks the 4o models
+MODEL_PRICES = {
+    "gpt-4o-mini": (0.00015, 0.0006),
+    "gpt-4o": (0.0025, 0.01),
+    "gpt-4-turbo": (0.01, 0.03),
+    "gpt-4": (0.03, 0.06),
+    "gpt-3.5-turbo": (0.0005, 0.0015),
+}
+
+# session id of the chat running on this thread / event loop
+current_session: ContextVar[Optional[str]] = ContextVar(
+    "metrics_current_session", default=None
+)
+
+
+def model_price(model: str):
+    """Price of the longest MODEL_PRICES key `model` starts with, e.g. gpt-4o-mini-2024-07-18."""
+    matches = [name for name in MODEL_PRICES if model and model.startswith(name)]
+    if not matches:
+        return None
+    return MODEL_PRICES[max(matches, key=len)]
+
+
+def estimate_cost(model: str, prompt_tokens: int, completion_tokens: int) -> float:
+    price = model_price(model)
+    if price is None:
+        return 0.0
+    return (prompt_tokens * price[0] + completion_tokens * price[1]) / 1000
+
+
+def agent_name(agent) -> str:
+    if agent is None:
+        return "untracked"
+    return agent if isinstance(agent, str) else agent.name
+
+
+class Histogram:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+        self.sum += value
+        self.count += 1
+
+    def samples(self, labels: Dict[str, str]):
+        for bound, count in zip(self.buckets, self.counts):
+            yield "_bucket", {**labels, "le": str(bound)}, count
+        yield "_bucket", {**labels, "le": "+Inf"}, self.count
+        yield "_sum", labels, self.sum
+        yield "_count", labels, self.count
+
+
+def cached_prompt_tokens(usage) -> int:
+    """Prompt tokens the provider served from its prompt cache, from a usage object or dict."""
+    if isinstance(usage, dict):
+        details = usage.get("prompt_tokens_details") or {}
+        return details.get("cached_tokens") or 0
+    details = getattr(usage, "prompt_tokens_details", None)
+    return getattr(details, "cached_tokens", 0) or 0
+
+
+def cached_token_ratio(cached_tokens: int, prompt_tokens: int) -> float:
+    return cached_tokens / prompt_tokens if prompt_tokens else 0.0
+
+
+def format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    escaped = (
+        (key, str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for key, value in labels.items()
+    )
+    return "{" + ",".join(f'{key}="{value}"' for key, value in escaped) + "}"
+
+
+class SessionMetrics:
+    """Everything measured for one chat session."""
+
+    def __init__(self, session_id: str):
+        self.session_id = session_id
+        self.started_at = time.time()
+        self.finished_at = None
+        self.status = None
+        self.intent = None
+
+        self.turns: List[Dict] = []
+        self.llm_calls: List[Dict] = []
+        self.tool_calls: List[Dict] = []
+        self.speaker_selections: List[float] = []
+        self.human_wait_seconds = 0.0
+
+        self._lock = threading.Lock()
+        self._last_turn_at = time.perf_counter()
+        # time since the last turn that belongs to no agent (speaker selection, human)
+        self._excluded = 0.0
+        self._pending_llm_calls: List[Dict] = []
+
+    def add_llm_call(self, call: Dict):
+        with self._lock:
+            self.llm_calls.append(call)
+            self._pending_llm_calls.append(call)
+
+    def add_tool_call(self, call: Dict):
+        with self._lock:
+            self.tool_calls.append(call)
+
+    def add_speaker_selection(self, seconds: float):
+        with self._lock:
+            self.speaker_selections.append(seconds)
+            self._excluded += seconds
+
+    def add_human_wait(self, seconds: float):
+        with self._lock:
+            self.human_wait_seconds += seconds
+            self._excluded += seconds
+
+    def add_turn(self, agent: str) -> Dict:
+        """Close the turn of `agent`, whose message has just been produced."""
+        now = time.perf_counter()
+        with self._lock:
+            calls = [c for c in self._pending_llm_calls if c["agent"] == agent]
+            turn = {
+                "agent": agent,
+                "seconds": max(0.0, now - self._last_turn_at - self._excluded),
+                "llm_calls": len(calls),
+                "prompt_tokens": sum(c["prompt_tokens"] for c in calls),
+                "completion_tokens": sum(c["completion_tokens"] for c in calls),
+                "cost": sum(c["cost"] for c in calls),
+                "models": sorted({c["model"] for c in calls}),
+            }
+            self.turns.append(turn)
+            self._last_turn_at = now
+            self._excluded = 0.0
+            self._pending_llm_calls = []
+        return turn
+
+    def finish(self, status: str):
+        self.status = status
+        self.finished_at = time.time()
+
+    def summary(self) -> Dict:
+        with self._lock:
+            agents = defaultdict(
+                lambda: {
+                    "turns": 0,
+                    "turn_seconds": 0.0,
+                    "llm_calls": 0,
+                    "llm_seconds": 0.0,
+                    "prompt_tokens": 0,
+                    "completion_tokens": 0,
+                    # prompt tokens of calls sent to the provider, and how many it had cached
+                    "sent_prompt_tokens": 0,
+                    "cached_prompt_tokens": 0,
+                    "cost": 0.0,
+                    "models": set(),
+                }
+            )
+            for turn in self.turns:
+                agents[turn["agent"]]["turns"] += 1
+                agents[turn["agent"]]["turn_seconds"] += turn["seconds"]
+            for call in self.llm_calls:
+                stats = agents[call["agent"]]
+                stats["llm_calls"] += 1
+                stats["llm_seconds"] += call["seconds"]
+                stats["prompt_tokens"] += call["prompt_tokens"]
+                stats["completion_tokens"] += call["completion_tokens"]
+                if not call["cached"]:
+                    stats["sent_prompt_tokens"] += call["prompt_tokens"]
+                    stats["cached_prompt_tokens"] += call["cached_tokens"]
+                stats["cost"] += call["cost"]
+                stats["models"].add(call["model"])
+            for stats in agents.values():
+                stats["models"] = sorted(stats["models"])
+                stats["cached_token_ratio"] = cached_token_ratio(
+                    stats["cached_prompt_tokens"], stats["sent_prompt_tokens"]
+                )
+
+            tools = defaultdict(lambda: {"calls": 0, "seconds": 0.0, "errors": 0})
+            for call in self.tool_calls:
+                tools[call["tool"]]["calls"] += 1
+                tools[call["tool"]]["seconds"] += call["seconds"]
+                tools[call["tool"]]["errors"] += int(call["error"])
+
+            end = self.finished_at or time.time()
+            return {
+                "session_id": self.session_id,
+                "status": self.status,
+                "intent": self.intent,
+                "wall_seconds": end - self.started_at,
+                "human_wait_seconds": self.human_wait_seconds,
+                "speaker_selection": {
+                    "count": len(self.speaker_selections),
+                    "seconds": sum(self.speaker_selections),
+                },
+                "llm_calls": len(self.llm_calls),
+                "prompt_tokens": sum(c["prompt_tokens"] for c in self.llm_calls),
+                "completion_tokens": sum(
+                    c["completion_tokens"] for c in self.llm_calls
+                ),
+                "cost": sum(c["cost"] for c in self.llm_calls),
+                "cached_token_ratio": cached_token_ratio(
+                    sum(stats["cached_prompt_tokens"] for stats in agents.values()),
+                    sum(stats["sent_prompt_tokens"] for stats in agents.values()),
+                ),
+                "slowest_agent": max(
+                    agents, key=lambda name: agents[name]["turn_seconds"], default=None
+                ),
+                "costliest_agent": max(
+                    agents, key=lambda name: agents[name]["cost"], default=None
+                ),
+                "agents": dict(agents),
+                "tools": dict(tools),
+                "turns": list(self.turns),
+            }
+
+
+class MetricsRegistry:
+    """Per-session metrics plus process-wide totals for Prometheus."""
+
+    def __init__(self, max_sessions: int = MAX_SESSIONS_KEPT):
+        self.max_sessions = max_sessions
+        self._lock = threading.Lock()
+        self._sessions: "OrderedDict[str, SessionMetrics]" = OrderedDict()
+        self._agents = weakref.WeakKeyDictionary()  # agent -> session id
+        self._counters = defaultdict(float)  # (name, labels) -> value
+        self._histograms: Dict = {}  # (name, labels) -> Histogram
+
+    # sessions and agents
+
+    def session(self, session_id: str) -> SessionMetrics:
+        """Metrics of `session_id`, created on first use."""
+        with self._lock:
+            metrics = self._sessions.get(session_id)
+            if metrics is None:
+                metrics = self._sessions[session_id] = SessionMetrics(session_id)
+                while len(self._sessions) > self.max_sessions:
+                    self._sessions.popitem(last=False)
+            return metrics
+
+    def get_session(self, session_id: str) -> Optional[SessionMetrics]:
+        with self._lock:
+            return self._sessions.get(session_id)
+
+    def remove_session(self, session_id: str):
+        """Forget the summary of a session that is gone, totals are kept."""
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def track(self, session_id: str, *agents: autogen.Agent):
+        """Attribute the LLM calls of `agents` to `session_id`."""
+        with self._lock:
+            for agent in agents:
+                self._agents[agent] = session_id
+
+    def session_id_for(self, agent) -> Optional[str]:
+        if agent is not None and not isinstance(agent, str):
+            with self._lock:
+                session_id = self._agents.get(agent)
+            if session_id is not None:
+                return session_id
+        return current_session.get()
+
+    # recording
+
+    def _inc(self, name: str, labels: Dict[str, str], value: float = 1):
+        self._counters[(name, tuple(labels.items()))] += value
+
+    def _observe(self, name: str, labels: Dict[str, str], value: float):
+        key = (name, tuple(labels.items()))
+        if key not in self._histograms:
+            self._histograms[key] = Histogram()
+        self._histograms[key].observe(value)
+
+    def record_llm_call(
+        self,
+        agent,
+        model: str,
+        prompt_tokens: int,
+        completion_tokens: int,
+        seconds: float,
+        cost: float = None,
+        cached: bool = False,
+        error: bool = False,
+        cached_tokens: int = 0,
+    ):
+        """`cached` is a response cache hit, `cached_tokens` the provider's prompt cache hits."""
+        name = agent_name(agent)
+        if cost is None or (not cost and not cached):
+            cost = estimate_cost(model, prompt_tokens, completion_tokens)
+        if cached:
+            cost = 0.0  # nothing was spent on a cache hit
+
+        labels = {"agent": name, "model": model or "unknown"}
+        with self._lock:
+            self._inc(
+                "chat_llm_requests_total", {**labels, "cached": str(cached).lower()}
+            )
+            if error:
+                self._inc("chat_llm_errors_total", labels)
+            self._inc("chat_llm_prompt_tokens_total", labels, prompt_tokens)
+            self._inc("chat_llm_completion_tokens_total", labels, completion_tokens)
+            if not cached:
+                # cached / sent is the provider prompt cache hit ratio
+                self._inc("chat_llm_sent_prompt_tokens_total", labels, prompt_tokens)
+                self._inc("chat_llm_cached_prompt_tokens_total", labels, cached_tokens)
+            self._inc("chat_llm_cost_usd_total", labels, cost)
+            self._observe("chat_llm_request_seconds", labels, seconds)
+
+        session_id = self.session_id_for(agent)
+        if session_id is not None:
+            self.session(session_id).add_llm_call(
+                {
+                    "agent": name,
+                    "model": model or "unknown",
+                    "prompt_tokens": prompt_tokens,
+                    "completion_tokens": completion_tokens,
+                    "cost": cost,
+                    "seconds": seconds,
+                    "cached": cached,
+                    "cached_tokens": cached_tokens,
+                    "error": error,
+                }
+            )
+
+    def record_llm_wait(self, model: str, seconds: float):
+        """Time a request spent waiting for the rate limiter before being sent."""
+        with self._lock:
+            self._observe("chat_llm_limiter_wait_seconds", {"model": model}, seconds)
+
+    def record_llm_retry(self, model: str, reason: str):
+        with self._lock:
+            self._inc("chat_llm_retries_total", {"model": model, "reason": reason})
+
+    def record_llm_rejection(self, model: str, check: str):
+        """A reply that failed its agent's cascade check and was escalated."""
+        with self._lock:
+            self._inc("chat_llm_rejections_total", {"model": model, "check": check})
+
+    def record_intent(self, session_id: str, intent: Optional[str]):
+        """The front-door intent of a session's request, None when unclassified."""
+        self.session(session_id).intent = intent
+        with self._lock:
+            self._inc("chat_intents_total", {"intent": intent or "unclassified"})
+
+    def record_turn(self, session_id: str, agent: str) -> Dict:
+        turn = self.session(session_id).add_turn(agent)
+        with self._lock:
+            self._observe("chat_agent_turn_seconds", {"agent": agent}, turn["seconds"])
+        return turn
+
+    def record_tool_call(
+        self, session_id: Optional[str], tool: str, seconds: float, error: bool
+    ):
+        with self._lock:
+            self._observe("chat_tool_call_seconds", {"tool": tool}, seconds)
+            if error:
+                self._inc("chat_tool_errors_total", {"tool": tool})
+        if session_id is not None:
+            self.session(session_id).add_tool_call(
+                {"tool": tool, "seconds": seconds, "error": error}
+            )
+
+    def record_speaker_selection(self, session_id: str, seconds: float):
+        with self._lock:
+            self._observe("chat_speaker_selection_seconds", {}, seconds)
+        self.session(session_id).add_speaker_selection(seconds)
+
+    def record_human_wait(self, session_id: str, seconds: float):
+        with self._lock:
+            self._inc("chat_human_input_wait_seconds_total", {}, seconds)
+        self.session(session_id).add_human_wait(seconds)
+
+    def finish_session(self, session_id: str, status: str):
+        self.session(session_id).finish(status)
+        with self._lock:
+            self._inc("chat_sessions_finished_total", {"status": status})
+
+    # rendering
+
+    def render(self, extra=()) -> str:
+        """
+        Prometheus text exposition of the totals. `extra` adds app-level
+        metrics as (name, type, help, [(labels, value), ...]) tuples.
+        """
+        with self._lock:
+            counters = dict(self._counters)
+            histograms = {
+                key: (list(h.samples(dict(key[1]))))
+                for key, h in self._histograms.items()
+            }
+
+        families = defaultdict(list)
+        for (name, labels), value in sorted(counters.items()):
+            families[(name, "counter")].append(("", dict(labels), value))
+        for (name, _), samples in sorted(histograms.items()):
+            families[(name, "histogram")].extend(samples)
+
+        lines = []
+        for (name, kind), samples in families.items():
+            lines.append(f"# TYPE {name} {kind}")
+            for suffix, labels, value in samples:
+                lines.append(f"{name}{suffix}{format_labels(labels)} {value}")
+        for name, kind, help_text, samples in extra:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in samples:
+                lines.append(f"{name}{format_labels(labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+    # tools
+
+    def timed_tool(self, fn: Callable, name: str = None) -> Callable:
+        """Wrap a function_map entry so each call is timed against the running session."""
+        name = name or fn.__name__
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            error = False
+            try:
+                return fn(*args, **kwargs)
+            except Exception:
+                error = True
+                raise
+            finally:
+                self.record_tool_call(
+                    current_session.get(), name, time.perf_counter() - start, error
+                )
+
+        return wrapper
+
+    def timed_tools(self, function_map: Optional[Dict[str, Callable]]):
+        if not function_map:
+            return function_map
+        return {name: self.timed_tool(fn, name) for name, fn in function_map.items()}
+
+
+class MetricsLogger(BaseLogger):
+    """autogen runtime logger that feeds LLM calls into a MetricsRegistry."""
+
+    def __init__(self, registry: MetricsRegistry):
+        self.registry = registry
+
+    def start(self) -> str:
+        return str(uuid.uuid4())
+
+    def log_chat_completion(
+        self,
+        invocation_id,
+        client_id,
+        wrapper_id,
+        source,
+        request,
+        response,
+        is_cached,
+        cost,
+        start_time,
+    ) -> None:
+        try:
+            started = datetime.strptime(start_time, "%Y-%m-%d %H:%M:%S.%f")
+            seconds = (datetime.utcnow() - started).total_seconds()
+
+            if isinstance(response, str):  # autogen logs failed calls as a string
+                self.registry.record_llm_call(
+                    source, request.get("model"), 0, 0, seconds, cost=0.0, error=True
+                )
+                return
+
+            usage = getattr(response, "usage", None)
+            self.registry.record_llm_call(
+                source,
+                getattr(response, "model", None) or request.get("model"),
+                getattr(usage, "prompt_tokens", 0) or 0,
+                getattr(usage, "completion_tokens", 0) or 0,
+                seconds,
+                cost=cost,
+                cached=bool(is_cached),
+                cached_tokens=cached_prompt_tokens(usage),
+            )
+        except Exception as e:
+            print(f"Failed to record LLM call metrics: {e}")
+
+    def log_new_agent(self, agent, init_args=None) -> None:
+        # agents created while a chat runs, e.g. GroupChat's speaker selection agents
+        session_id = current_session.get()
+        if session_id is not None:
+            self.registry.track(session_id, agent)
+
+    def log_event(self, source, name, **kwargs) -> None:
+        pass
+
+    def log_new_wrapper(self, wrapper, init_args) -> None:
+        pass
+
+    def log_new_client(self, client, wrapper, init_args) -> None:
+        pass
+
+    def log_function_use(self, source, function, args, returns) -> None:
+        pass
+
+    def stop(self) -> None:
+        pass
+
+    def get_connection(self) -> None:
+        return None
+
+
+@dataclass
+class TimedGroupChat(autogen.GroupChat):
+    """GroupChat that reports how long each speaker selection takes."""
+
+    metrics_session_id: Optional[str] = None
+
+    def _record_selection(self, start: float):
+        if self.metrics_session_id is not None:
+            registry.record_speaker_selection(
+                self.metrics_session_id, time.perf_counter() - start
+            )
+
+    def select_speaker(self, last_speaker, selector):
+        start = time.perf_counter()
+        try:
+            return super().select_speaker(last_speaker, selector)
+        finally:
+            self._record_selection(start)
+
+    async def a_select_speaker(self, last_speaker, selector):
+        start = time.perf_counter()
+        try:
+            return await super().a_select_speaker(last_speaker, selector)
+        finally:
+            self._record_selection(start)
+
+
+# autogen's runtime logger is process wide, so is the registry feeding it
+registry = MetricsRegistry()
+
+
+def enable():
+    """Route autogen's runtime logging into `registry`."""
+    if not isinstance(runtime_logging.autogen_logger, MetricsLogger):
+        runtime_logging.start(logger=MetricsLogger(registry))
+
+
+def service_metrics(
+    sessions,
+    chat_pool,
+    speaker_graph=None,
+    templates=(),
+    response_cache=None,
+    sql_templates=None,
+    answer_cache=None,
+    db_pool=None,
+):
+    """Gauges and counters owned by an api module, in render()'s `extra` format."""
+    pool = chat_pool.stats()
+    extra = [
+        (
+            "chat_sessions",
+            "gauge",
+            "Chat sessions held in memory",
+            [({}, len(sessions))],
+        ),
+        (
+            "chat_pool_running",
+            "gauge",
+            "Chats running on a worker",
+            [({}, pool["running"])],
+        ),
+        (
+            "chat_pool_waiting",
+            "gauge",
+            "Chats waiting for a worker",
+            [({}, pool["waiting"])],
+        ),
+    ]
+    if speaker_graph is not None:
+        extra.append(
+            (
+                "chat_speaker_decisions_total",
+                "counter",
+                "How the transition graph picked each speaker",
+                [
+                    ({"method": method}, count)
+                    for method, count in speaker_graph.decisions().items()
+                ],
+            )
+        )
+    saved = [
+        ({"agent": agent}, stats["tokens_saved"])
+        for template in templates
+        for capability in template.capabilities
+        if hasattr(capability, "report")
+        for agent, stats in capability.report().items()
+    ]
+    if saved:
+        extra.append(
+            (
+                "chat_history_tokens_saved_total",
+                "counter",
+                "Prompt tokens removed by history compaction",
+                saved,
+            )
+        )
+    if response_cache is not None:
+        cache = response_cache.stats()
+        extra += [
+            (
+                "chat_llm_cache_hits_total",
+                "counter",
+                "LLM responses served from the response cache",
+                [({"source": source}, n) for source, n in cache["hits"].items()],
+            ),
+            (
+                "chat_llm_cache_misses_total",
+                "counter",
+                "LLM requests the response cache could not answer",
+                [({"source": source}, n) for source, n in cache["misses"].items()],
+            ),
+            (
+                "chat_llm_cache_entries",
+                "gauge",
+                "Responses stored in the response cache",
+                [({}, cache["entries"])],
+            ),
+            (
+                "chat_llm_cache_size_bytes",
+                "gauge",
+                "Disk space used by the response cache",
+                [({}, cache["size_bytes"])],
+            ),
+        ]
+    if sql_templates is not None:
+        stats = sql_templates.stats()
+        extra += [
+            (
+                "chat_sql_template_lookups_total",
+                "counter",
+                "Product searches answered by a learned SQL template, or not",
+                [
+                    ({"result": "hit"}, stats["hits"]),
+                    ({"result": "miss"}, stats["misses"]),
+                ],
+            ),
+            (
+                "chat_sql_templates",
+                "gauge",
+                "Learned SQL templates",
+                [({}, stats["templates"])],
+            ),
+        ]
+    if answer_cache is not None:
+        stats = answer_cache.stats()
+        extra += [
+            (
+                "chat_answer_cache_lookups_total",
+                "counter",
+                "Cacheable requests answered from the answer cache, or not",
+                [
+                    ({"result": "hit"}, stats["hits"]),
+                    ({"result": "miss"}, stats["misses"]),
+                ],
+            ),
+            (
+                "chat_answer_cache_entries",
+                "gauge",
+                "Answers held in the answer cache",
+                [({}, stats["entries"])],
+            ),
+        ]
+    if db_pool:
+        extra += [
+            (
+                "chat_db_pool_connections",
+                "gauge",
+                "Open database connections by state",
+                [
+                    ({"state": "idle"}, db_pool["idle"]),
+                    ({"state": "in_use"}, db_pool["in_use"]),
+                ],
+            ),
+            (
+                "chat_db_pool_waiting",
+                "gauge",
+                "Calls waiting for a free database connection",
+                [({}, db_pool["waiting"])],
+            ),
+            (
+                "chat_db_pool_timeouts_total",
+                "counter",
+                "Calls that gave up waiting for a database connection",
+                [({}, db_pool["timeouts"])],
+            ),
+            (
+                "chat_db_pool_discarded_total",
+                "counter",
+                "Broken or unhealthy connections closed by the pool",
+                [({}, db_pool["discarded"])],
+            ),
+        ]
+    return extra
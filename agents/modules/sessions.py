@@ -0,0 +1,270 @@
+"""
+Purpose:
+    Keep per-customer chat state (message log, user input queue and chat
+    status) keyed by a session id, so one Flask process can run many group
+    chats side by side.
+"""
+
+import asyncio
+import json
+import threading
+import time
+import uuid
+from typing import Any, Dict, List, Optional, Tuple
+
+from autogen.code_utils import content_str
+
+from agents.modules import metrics
+
+# statuses after which a session no longer produces messages
+FINISHED_STATUSES = ("ended", "error")
+
+# finished sessions are dropped from the registry after this many seconds
+SESSION_TTL = 60 * 60
+
+# an agent waiting for the customer gives up after this many seconds
+HUMAN_INPUT_TIMEOUT = 600
+
+# what the customer is shown when an agent hands the turn back to them
+USER_INPUT_PROMPT = "Please input your further direction, or type 'approved' to proceed, or type 'exit' to end the conversation"
+
+
+def parse_message(msg):
+    """
+    Decode a queued message for the frontend.
+    Agent replies are often JSON strings (e.g. run_sql results), so both the
+    message itself and its 'message' part are parsed when possible.
+    """
+    # If msg is already a dict, skip json.loads
+    if isinstance(msg, str):  # Only attempt to load if it's a string
+        try:
+            msg = json.loads(msg)
+        except json.JSONDecodeError:
+            pass  # If `msg` is not a JSON string, keep it as is
+
+    # Ensure the 'message' part is also parsed if it's a JSON string
+    if isinstance(msg, dict) and isinstance(msg.get("message"), str):
+        msg = dict(msg)
+        try:
+            msg["message"] = json.loads(msg["message"])
+        except json.JSONDecodeError:
+            pass  # If the 'message' is not a JSON string, keep it as is
+
+    return msg
+
+
+def message_content(content):
+    """
+    Content of an agent message as the frontend gets it. Multimodal agents
+    keep a list of parts holding PIL images, which cannot be sent as JSON;
+    it becomes its text with an <image> token per picture.
+    """
+    if content is None or isinstance(content, str):
+        return content
+    try:
+        return content_str(content)
+    except (AssertionError, TypeError, ValueError):
+        return str(content)
+
+
+class ChatSession:
+    """
+    Messages for the frontend are kept in an append-only log.
+    A message's cursor is its position in the log plus one, so a client that
+    has seen cursor N resumes with everything after N - nothing is lost or
+    sent twice on reconnect.
+
+    User inputs arrive on Flask request threads and are handed to the chat's
+    event loop through an asyncio.Queue, so a waiting agent resumes as soon
+    as the input is posted and costs nothing while idle.
+    """
+
+    def __init__(self, session_id: str):
+        self.session_id = session_id
+        self.chat_status = "Chat ongoing"
+        self.created_at = time.time()
+        self.finished_at = None
+
+        self._messages: List[Any] = []  # stores messages to send to frontend
+        self._read_cursor = 0  # position of the one-message-per-GET reader
+        self._changed = threading.Condition()
+
+        self._input_lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._user_inputs: Optional[asyncio.Queue] = None  # stores user inputs
+        self._pending_inputs: List[str] = []  # inputs sent before the loop exists
+
+    @property
+    def is_finished(self) -> bool:
+        return self.chat_status in FINISHED_STATUSES
+
+    def set_status(self, status: str):
+        with self._changed:
+            self.chat_status = status
+            if status in FINISHED_STATUSES:
+                self.finished_at = time.time()
+            else:
+                self.finished_at = None
+            self._changed.notify_all()
+
+    def put_message(self, msg: Any):
+        with self._changed:
+            self._messages.append(msg)
+            self._changed.notify_all()
+
+    def next_message(self) -> Optional[Any]:
+        """Return the next unread message for /api/get_message, or None."""
+        with self._changed:
+            if self._read_cursor >= len(self._messages):
+                return None
+            msg = self._messages[self._read_cursor]
+            self._read_cursor += 1
+            return msg
+
+    def messages_since(
+        self, cursor: int, timeout: Optional[float] = None
+    ) -> Tuple[List[Any], int]:
+        """
+        Return every message after `cursor` and the new cursor.
+        Blocks up to `timeout` seconds while there is nothing new and the chat
+        is still running, so a burst of agent turns is drained in one call.
+        """
+        cursor = max(0, cursor)
+        with self._changed:
+            self._changed.wait_for(
+                lambda: len(self._messages) > cursor or self.is_finished,
+                timeout=timeout,
+            )
+            return self._messages[cursor:], len(self._messages)
+
+    def put_user_input(self, text: str):
+        """Hand a user input to the chat. Safe to call from any thread."""
+        with self._input_lock:
+            if self._loop is None:
+                self._pending_inputs.append(text)
+                return
+            loop, user_inputs = self._loop, self._user_inputs
+        try:
+            loop.call_soon_threadsafe(user_inputs.put_nowait, text)
+        except RuntimeError:
+            pass  # the chat's loop is closed, nobody is listening anymore
+
+    async def wait_user_input(
+        self, timeout: Optional[float] = HUMAN_INPUT_TIMEOUT
+    ) -> Optional[str]:
+        """Wait for the next user input, or return None after `timeout` seconds."""
+        self._bind_loop(asyncio.get_running_loop())
+        try:
+            return await asyncio.wait_for(self._user_inputs.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    async def ask(self, prompt: str = USER_INPUT_PROMPT) -> Optional[str]:
+        """Prompt the customer and wait for their reply, None when they left."""
+        self.put_message({"user": "System", "message": prompt})
+
+        self.set_status("inputting")
+        start = time.perf_counter()
+        input_value = await self.wait_user_input()
+        metrics.registry.record_human_wait(self.session_id, time.perf_counter() - start)
+        if input_value is None:
+            self.set_status("ended")
+            return None
+
+        self.set_status("Chat ongoing")
+        return input_value
+
+    def _bind_loop(self, loop: asyncio.AbstractEventLoop):
+        # runs on the chat's loop, so the queue can be filled directly
+        with self._input_lock:
+            if self._loop is loop:
+                return
+            self._loop = loop
+            self._user_inputs = asyncio.Queue()
+            for text in self._pending_inputs:
+                self._user_inputs.put_nowait(text)
+            self._pending_inputs.clear()
+
+    def is_expired(self, now: float, ttl: float = SESSION_TTL) -> bool:
+        return self.finished_at is not None and now - self.finished_at > ttl
+
+
+class SessionInputMixin:
+    """
+    For ConversableAgent subclasses: human input comes from the customer of
+    `session` instead of the console. A customer who left ends the chat.
+    """
+
+    def __init__(self, session: ChatSession, **kwargs):
+        super().__init__(**kwargs)
+        self.session = session
+
+    async def a_get_human_input(self, prompt: str) -> str:
+        input_value = await self.session.ask()
+        return "exit" if input_value is None else input_value
+
+
+class SessionRegistry:
+    """
+    Thread-safe map of session id -> ChatSession.
+    Flask request threads and chat threads both look sessions up here.
+    """
+
+    def __init__(self, ttl: float = SESSION_TTL):
+        self.ttl = ttl
+        self._sessions: Dict[str, ChatSession] = {}
+        self._lock = threading.Lock()
+
+    def create(self) -> ChatSession:
+        session = ChatSession(uuid.uuid4().hex)
+        with self._lock:
+            self._prune_locked()
+            self._sessions[session.session_id] = session
+        return session
+
+    def get(self, session_id: Optional[str]) -> Optional[ChatSession]:
+        if not session_id:
+            return None
+        with self._lock:
+            return self._sessions.get(session_id)
+
+    def remove(self, session_id: str):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+        metrics.registry.remove_session(session_id)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._sessions)
+
+    def _prune_locked(self):
+        now = time.time()
+        expired = [
+            session_id
+            for session_id, session in self._sessions.items()
+            if session.is_expired(now, self.ttl)
+        ]
+        for session_id in expired:
+            del self._sessions[session_id]
+            metrics.registry.remove_session(session_id)
+
+
+def sse_events(session: ChatSession, cursor: int = 0, keepalive: float = 15):
+    """
+    Yield Server-Sent Events for every message after `cursor` until the chat
+    finishes. Each event carries its cursor as the SSE id, so a reconnecting
+    EventSource resumes from Last-Event-ID.
+    """
+    while True:
+        batch, new_cursor = session.messages_since(cursor, timeout=keepalive)
+        for offset, msg in enumerate(batch, start=cursor + 1):
+            data = {"message": parse_message(msg), "chat_status": session.chat_status}
+            yield f"id: {offset}\ndata: {json.dumps(data, default=str)}\n\n"
+        cursor = new_cursor
+
+        if session.is_finished and not batch:
+            data = {"chat_status": session.chat_status}
+            yield f"id: {cursor}\nevent: end\ndata: {json.dumps(data)}\n\n"
+            return
+        if not batch:
+            yield ": keep-alive\n\n"
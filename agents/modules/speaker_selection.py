@@ -0,0 +1,125 @@
+"""
+Purpose:
+    Rule-based speaker selection for autogen.GroupChat.
+
+    With speaker_selection_method="auto" the GroupChatManager spends one LLM
+    call per round just to pick the next agent. Most of our workflows are
+    fixed sequences, so a transition graph plus small routing functions can
+    pick the next speaker directly; the LLM picker is only used at genuinely
+    ambiguous branch points, and then only among the allowed candidates.
+"""
+
+import re
+import threading
+from collections import Counter
+from typing import Callable, Dict, List, Optional
+
+import autogen
+from autogen.code_utils import content_str
+
+IMAGE_PATTERN = re.compile(
+    r"<img\s|https?://\S+\.(?:png|jpe?g|gif|webp)", re.IGNORECASE
+)
+
+# route(groupchat) -> name of the next speaker, or None when ambiguous
+Route = Callable[[autogen.GroupChat], Optional[str]]
+
+
+def message_text(message: Dict) -> str:
+    return content_str(message.get("content")) if message else ""
+
+
+def mentions(text: str, keywords) -> bool:
+    text = text.lower()
+    return any(keyword in text for keyword in keywords)
+
+
+def has_image(messages: List[Dict]) -> bool:
+    return any(IMAGE_PATTERN.search(message_text(message)) for message in messages)
+
+
+def called_functions(message: Dict) -> List[str]:
+    names = []
+    if message.get("function_call"):
+        names.append(message["function_call"]["name"])
+    for tool_call in message.get("tool_calls") or []:
+        if tool_call.get("type") == "function":
+            names.append(tool_call["function"]["name"])
+    return names
+
+
+def last_speaker_among(groupchat: autogen.GroupChat, names) -> Optional[str]:
+    """Name of the most recent message author that is in `names`."""
+    for message in reversed(groupchat.messages):
+        if message.get("name") in names:
+            return message["name"]
+    return None
+
+
+class TransitionGraph:
+    """
+    transitions: agent name -> names of the agents allowed to speak next.
+        A single allowed successor is picked without consulting anything.
+    routes: agent name -> route function deciding between several successors.
+    fallback: selection method used when no rule decides ("auto" = LLM).
+    """
+
+    def __init__(
+        self,
+        transitions: Dict[str, List[str]],
+        routes: Optional[Dict[str, Route]] = None,
+        fallback: str = "auto",
+    ):
+        self.transitions = transitions
+        self.routes = routes or {}
+        self.fallback = fallback
+        # how each turn was decided: rule / function_call / llm. One graph
+        # serves every chat, so updates go through _count
+        self.stats = Counter()
+        self._lock = threading.Lock()
+
+    def _count(self, method: str):
+        with self._lock:
+            self.stats[method] += 1
+
+    def decisions(self) -> Dict[str, int]:
+        """Snapshot of `stats`, safe to read while chats are running."""
+        with self._lock:
+            return dict(self.stats)
+
+    def allowed_transitions(self, agents: List[autogen.Agent]) -> Dict:
+        """The graph in the form GroupChat's allowed_or_disallowed_speaker_transitions expects."""
+        by_name = {agent.name: agent for agent in agents}
+        return {
+            by_name[source]: [by_name[name] for name in targets if name in by_name]
+            for source, targets in self.transitions.items()
+            if source in by_name
+        }
+
+    def __call__(self, last_speaker: autogen.Agent, groupchat: autogen.GroupChat):
+        last_message = groupchat.messages[-1] if groupchat.messages else {}
+        if last_message.get("function_call") or last_message.get("tool_calls"):
+            self._count("function_call")
+            if last_speaker.can_execute_function(called_functions(last_message)):
+                return last_speaker
+            # autogen hands the call to the only agent able to execute it, no LLM involved
+            return self.fallback
+
+        # pipelines may only build some of the agents in the graph
+        present = set(groupchat.agent_names)
+        candidates = [
+            name
+            for name in self.transitions.get(last_speaker.name, [])
+            if name in present
+        ]
+        name = candidates[0] if len(candidates) == 1 else None
+        if name is None and last_speaker.name in self.routes:
+            name = self.routes[last_speaker.name](groupchat)
+
+        agent = groupchat.agent_by_name(name) if name else None
+        if agent is not None:
+            self._count("rule")
+            return agent
+
+        self._count("llm")
+        return self.fallback
@@ -0,0 +1,345 @@
+"""
+Purpose:
+    Learned NL-to-SQL templates for recommend_product.
+
+    Product searches come in a few shapes: filter by gender / colour / size /
+    price, or ILIKE on the product name. Keyword rules pull the slots out of
+    a request ("blue shirts for men under $40" -> item, colour, gender,
+    max_price). When product_recommendation_agent's SQL for such a request
+    runs and returns rows, every literal carrying a slot value becomes a
+    parameter, and the result is kept as the template of that set of slots.
+
+    A later request with the same slots runs the template as a prepared
+    statement and hands the rows to the agent with the prompt, skipping the
+    SQL-writing LLM turn and the tool round trip. Novel shapes, and SQL with
+    literals no slot explains, still go through the LLM.
+
+    Templates are saved to SQL_TEMPLATE_FILE so they survive restarts.
+"""
+
+import contextlib
+import hashlib
+import json
+import os
+import re
+import tempfile
+import threading
+from typing import Callable, Dict, List, Optional
+
+SQL_TEMPLATE_FILE = os.environ.get(
+    "SQL_TEMPLATE_FILE", os.path.join(".cache", "sql_templates.json")
+)
+
+# appended to the prompt when a template answered the search
+TEMPLATE_RESULT_PROMPT = (
+    "These products were already retrieved with recommend_product for this "
+    "request, present them without calling it again:\n\n{products}"
+)
+
+# ------------------ slots ------------------
+
+GENDERS = {
+    "Women": r"\b(women'?s?|woman|female|ladies|girls?)\b",
+    "Men": r"\b(men'?s?|man|male|boys?|gents?)\b",
+    "Unisex": r"\bunisex\b",
+}
+# checked in order, "extra large" before "large"
+SIZES = {
+    "XL": r"\b(extra[- ]large|xl)\b",
+    "S": r"\b(small|size s)\b",
+    "M": r"\b(medium|size m)\b",
+    "L": r"\b(large|size l)\b",
+}
+COLOURS = (
+    "black white blue navy red green yellow pink purple brown beige grey gray "
+    "orange maroon olive cream"
+).split()
+ITEM_PATTERN = re.compile(
+    r"\b(t-shirt|shirt|jeans|dress|shorts|jacket|kurta|top|trousers|skirt|hoodie|"
+    r"sweater)(?:e?s)?\b",
+    re.IGNORECASE,
+)
+COLOUR_PATTERN = re.compile(rf"\b({'|'.join(COLOURS)})\b", re.IGNORECASE)
+MAX_PRICE_PATTERN = re.compile(
+    r"\b(?:under|below|less than|cheaper than|up ?to|within|max(?:imum)?)"
+    r"\s*\$?\s*(\d+)",
+    re.IGNORECASE,
+)
+MIN_PRICE_PATTERN = re.compile(
+    r"\b(?:over|above|more than|at least|min(?:imum)?)\s*\$?\s*(\d+)", re.IGNORECASE
+)
+BETWEEN_PATTERN = re.compile(
+    r"\bbetween\s*\$?\s*(\d+)\s*(?:and|-)\s*\$?\s*(\d+)", re.IGNORECASE
+)
+
+
+def extract_slots(text: str) -> Dict[str, object]:
+    """Search filters named in a customer request."""
+    slots = {}
+    if not text:
+        return slots
+
+    item = ITEM_PATTERN.search(text)
+    if item:
+        slots["item"] = item.group(1).lower()
+    colour = COLOUR_PATTERN.search(text)
+    if colour:
+        slots["colour"] = colour.group(1).title()
+    for value, pattern in GENDERS.items():
+        if re.search(pattern, text, re.IGNORECASE):
+            slots["gender"] = value
+            break
+    for value, pattern in SIZES.items():
+        if re.search(pattern, text, re.IGNORECASE):
+            slots["size"] = value
+            break
+
+    between = BETWEEN_PATTERN.search(text)
+    if between:
+        low, high = sorted(int(bound) for bound in between.groups())
+        slots["min_price"], slots["max_price"] = low, high
+    else:
+        high = MAX_PRICE_PATTERN.search(text)
+        low = MIN_PRICE_PATTERN.search(text)
+        if high:
+            slots["max_price"] = int(high.group(1))
+        if low:
+            slots["min_price"] = int(low.group(1))
+    return slots
+
+
+# ------------------ templates ------------------
+
+LITERAL_PATTERN = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+LIMIT_PATTERN = re.compile(r"\b(limit|offset)\s*$", re.IGNORECASE)
+WRITE_PATTERN = re.compile(
+    r"\b(insert|update|delete|drop|alter|create|truncate|grant|revoke|copy)\b",
+    re.IGNORECASE,
+)
+PRODUCTS_PATTERN = re.compile(r"\bfrom\s+products\b", re.IGNORECASE)
+
+CASES = {
+    "lower": str.lower,
+    "upper": str.upper,
+    "title": str.title,
+    "same": str,
+}
+
+
+def is_search_sql(sql: str) -> bool:
+    """A single read-only SELECT over products."""
+    statement = sql.strip().rstrip(";")
+    return (
+        statement.lower().startswith("select")
+        and ";" not in statement
+        and bool(PRODUCTS_PATTERN.search(statement))
+        and not WRITE_PATTERN.search(statement)
+    )
+
+
+def text_case(core: str, value: str) -> Optional[str]:
+    for case, convert in CASES.items():
+        if convert(value) == core:
+            return case
+    return None
+
+
+def parameterize(sql: str, slots: Dict[str, object]) -> Optional[Dict]:
+    """
+    Turn `sql` into a template with $1, $2... in place of slot values, or
+    None when it is not a product search, leaves a literal unexplained or
+    ignores one of the slots.
+    """
+    if not slots or not is_search_sql(sql):
+        return None
+    statement = sql.strip().rstrip(";")
+
+    parts, params = [], []
+    position = 0
+    for literal in LITERAL_PATTERN.finditer(statement):
+        before = statement[position : literal.start()]
+        parts.append(before)
+        position = literal.end()
+        text = literal.group(0)
+
+        if text.startswith("'"):
+            inner = text[1:-1].replace("''", "'")
+            core = inner.strip("%")
+            prefix = inner[: len(inner) - len(inner.lstrip("%"))]
+            suffix = inner[len(inner.rstrip("%")) :]
+            matches = [
+                (slot, text_case(core, value))
+                for slot, value in slots.items()
+                if isinstance(value, str) and core.lower() == value.lower()
+            ]
+            if len(matches) != 1 or matches[0][1] is None:
+                return None
+            slot, case = matches[0]
+            param = {"slot": slot, "case": case, "prefix": prefix, "suffix": suffix}
+        else:
+            if LIMIT_PATTERN.search("".join(parts)):
+                parts.append(text)  # row limits are part of the shape
+                continue
+            matches = [
+                slot
+                for slot, value in slots.items()
+                if isinstance(value, int) and float(text) == value
+            ]
+            if len(matches) != 1:
+                return None
+            param = {"slot": matches[0]}
+
+        params.append(param)
+        parts.append(f"${len(params)}")
+    parts.append(statement[position:])
+
+    if {param["slot"] for param in params} != set(slots):
+        return None
+    template_sql = "".join(parts)
+    return {
+        "name": "tpl_" + hashlib.sha1(template_sql.encode()).hexdigest()[:12],
+        "sql": template_sql,
+        "params": params,
+        "learned_from": statement,
+        "uses": 0,
+    }
+
+
+def fill(template: Dict, slots: Dict[str, object]) -> List:
+    values = []
+    for param in template["params"]:
+        value = slots[param["slot"]]
+        if "case" in param:
+            value = param["prefix"] + CASES[param["case"]](value) + param["suffix"]
+        values.append(value)
+    return values
+
+
+def slots_key(slots: Dict[str, object]) -> str:
+    return ",".join(sorted(slots))
+
+
+class TemplateCache:
+    """Templates keyed by the set of slot names they parameterize."""
+
+    def __init__(self, path: Optional[str] = SQL_TEMPLATE_FILE):
+        self.path = path
+        self._templates: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()  # one writer of self.path at a time
+        self.hits = 0
+        self.misses = 0
+        self.learned = 0
+        self._load()
+
+    def __len__(self):
+        return len(self._templates)
+
+    def run(self, db, text: str) -> Optional[str]:
+        """Rows (JSON) for `text` from a learned template, or None to let the agent write SQL."""
+        slots = extract_slots(text)
+        key = slots_key(slots)
+        with self._lock:
+            template = self._templates.get(key) if slots else None
+            if template is None:
+                self.misses += 1
+                return None
+
+        try:
+            result = db.run_prepared(
+                template["name"], template["sql"], fill(template, slots)
+            )
+        except Exception as e:
+            print(f"SQL template {key} failed, dropping it: {e}")
+            with self._lock:
+                self._templates.pop(key, None)
+                self.misses += 1
+            self._save()
+            return None
+
+        if "error" in json.loads(result):
+            # too expensive or cancelled for these values, the agent writes SQL
+            with self._lock:
+                self.misses += 1
+            return None
+
+        with self._lock:
+            template["uses"] += 1
+            self.hits += 1
+        return result
+
+    def learn(self, text: str, sql: str, result: str) -> bool:
+        """Keep `sql` as the template of `text`'s slots when it found products."""
+        try:
+            if not json.loads(result).get("rows"):
+                return False
+        except (AttributeError, TypeError, json.JSONDecodeError):
+            return False
+        slots = extract_slots(text)
+        template = parameterize(sql, slots)
+        if template is None:
+            return False
+
+        key = slots_key(slots)
+        with self._lock:
+            if key in self._templates:
+                return False
+            self._templates[key] = template
+            self.learned += 1
+        print(f"Learned SQL template for {key}: {template['sql']}")
+        self._save()
+        return True
+
+    def learning(self, recommend_product: Callable, text: str) -> Callable:
+        """Wrap the recommend_product tool of a chat started with `text`."""
+
+        def recommend_product_and_learn(sql):
+            result = recommend_product(sql)
+            try:
+                self.learn(text, sql, result)
+            except Exception as e:
+                print(f"Failed to learn SQL template: {e}")
+            return result
+
+        return recommend_product_and_learn
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "templates": len(self._templates),
+                "hits": self.hits,
+                "misses": self.misses,
+                "learned": self.learned,
+            }
+
+    def _load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path) as f:
+                self._templates = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"Ignoring unreadable SQL template file {self.path}: {e}")
+
+    def _save(self):
+        """Write the templates atomically; a failed write only costs persistence."""
+        if not self.path:
+            return
+        directory = os.path.dirname(self.path) or "."
+        with self._save_lock:
+            with self._lock:
+                data = json.dumps(self._templates, indent=2)
+            tmp_path = None
+            try:
+                os.makedirs(directory, exist_ok=True)
+                with tempfile.NamedTemporaryFile(
+                    "w", dir=directory, suffix=".tmp", delete=False
+                ) as f:
+                    tmp_path = f.name
+                    f.write(data)
+                os.replace(tmp_path, self.path)
+            except OSError as e:
+                print(f"Failed to save SQL templates to {self.path}: {e}")
+                if tmp_path and os.path.exists(tmp_path):
+                    with contextlib.suppress(OSError):
+                        os.remove(tmp_path)
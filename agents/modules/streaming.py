@@ -0,0 +1,63 @@
+"""
+Purpose:
+    Stream agent replies into the chat session token by token.
+
+    Agents whose llm_config has "stream": True make autogen print each
+    completion delta to the current IOStream, between a colour start and a
+    colour reset marker. SessionStream is that IOStream for one chat: it
+    still echoes everything to the console, and pushes the deltas into the
+    session's message log so the UI can render a reply while it is generated:
+
+        {"user": <agent>, "delta": <text>, "stream_id": n}   one per delta
+        {"user": <agent>, "stream_id": n, "stream_end": True} after the last one
+
+    The complete reply still follows as a regular message, which replaces the
+    streamed text. Deltas are only sent to sessions started with "stream": true.
+"""
+
+from autogen.io import IOConsole, IOStream
+
+# what autogen's OpenAIClient prints around a streamed completion
+STREAM_START = "\033[32m"
+STREAM_END = "\033[0m"
+
+
+class SessionStream(IOConsole):
+    def __init__(self, session):
+        self.session = session
+        # the agent currently generating, set by print_messages before each reply
+        self.speaker = None
+        self.stream_id = 0
+        self._streaming = False
+        self._deltas = 0
+
+    def print(self, *objects, sep: str = " ", end: str = "\n", flush: bool = False):
+        super().print(*objects, sep=sep, end=end, flush=flush)
+
+        text = sep.join(map(str, objects)) + end
+        if text == STREAM_START:
+            self._streaming = True
+            self._deltas = 0
+            self.stream_id += 1
+        elif self._streaming and text.startswith(STREAM_END):
+            self._streaming = False
+            if self._deltas:  # function calls stream no text
+                self.session.put_message(
+                    {
+                        "user": self.speaker,
+                        "stream_id": self.stream_id,
+                        "stream_end": True,
+                    }
+                )
+        elif self._streaming and text:
+            self._deltas += 1
+            self.session.put_message(
+                {"user": self.speaker, "delta": text, "stream_id": self.stream_id}
+            )
+
+
+def set_speaker(name: str):
+    """Label the deltas that follow with `name`, when the chat streams."""
+    iostream = IOStream.get_default()
+    if isinstance(iostream, SessionStream):
+        iostream.speaker = name
@@ -0,0 +1,62 @@
+"""
+Purpose:
+    Count prompt tokens with tiktoken.
+    tiktoken downloads its encodings on first use; when that is not possible
+    (e.g. an offline box) counts fall back to a ~4 characters per token
+    estimate instead of failing the chat.
+"""
+
+import json
+from functools import lru_cache
+from typing import Dict, List, Optional
+
+import tiktoken
+from autogen.code_utils import content_str
+
+DEFAULT_MODEL = "gpt-4o-mini"
+
+# per-message framing overhead of the chat format (role, separators)
+TOKENS_PER_MESSAGE = 4
+
+
+@lru_cache(maxsize=None)
+def get_encoding(model: str = DEFAULT_MODEL) -> Optional[tiktoken.Encoding]:
+    try:
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:  # a model tiktoken does not know yet
+            return tiktoken.get_encoding("o200k_base")
+    except Exception as e:
+        print(f"tiktoken encoding for {model} unavailable, estimating tokens: {e}")
+        return None
+
+
+def count_tokens(text: Optional[str], model: str = DEFAULT_MODEL) -> int:
+    if not text:
+        return 0
+    encoding = get_encoding(model)
+    if encoding is None:
+        return max(1, len(text) // 4)
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def message_text(message: Dict) -> str:
+    text = content_str(message.get("content")) if message.get("content") else ""
+    if message.get("function_call"):
+        text += json.dumps(message["function_call"])
+    if message.get("tool_calls"):
+        text += json.dumps(message["tool_calls"])
+    return text
+
+
+def count_message_tokens(message: Dict, model: str = DEFAULT_MODEL) -> int:
+    return TOKENS_PER_MESSAGE + count_tokens(message_text(message), model)
+
+
+def count_messages_tokens(messages: List[Dict], model: str = DEFAULT_MODEL) -> int:
+    return sum(count_message_tokens(message, model) for message in messages)
+
+
+def count_functions_tokens(functions: List[Dict], model: str = DEFAULT_MODEL) -> int:
+    """Estimate of what function schemas add to every request that offers them."""
+    return sum(count_tokens(json.dumps(function), model) for function in functions)
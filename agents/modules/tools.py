@@ -0,0 +1,68 @@
+"""
+Purpose:
+    Per-agent tool declarations.
+
+    Every tool schema is registered once in a ToolRegistry. Each agent_info
+    lists the "tools" it may call, and only those schemas go into its
+    llm_config and only those functions into its function_map. An agent then
+    neither pays prompt tokens for tools it cannot run nor gets tempted into
+    calling them.
+"""
+
+from typing import Dict, Iterable, List
+
+from agents.modules import tokens
+
+
+class ToolRegistry:
+    def __init__(self, schemas: Iterable[Dict]):
+        self.schemas = {schema["name"]: schema for schema in schemas}
+
+    def select(self, names: Iterable[str]) -> List[Dict]:
+        names = list(names)
+        unknown = [name for name in names if name not in self.schemas]
+        if unknown:
+            raise ValueError(f"unknown tools: {', '.join(unknown)}")
+        return [self.schemas[name] for name in names]
+
+    def llm_config(self, agent_info: Dict) -> Dict:
+        """The "functions" entry of an agent's llm_config, none without tools."""
+        schemas = self.select(agent_info.get("tools", ()))
+        # OpenAI rejects an empty functions list
+        return {"functions": schemas} if schemas else {}
+
+
+def prompt_token_report(
+    agents_info: List[Dict], registry: ToolRegistry, model: str = tokens.DEFAULT_MODEL
+) -> Dict[str, Dict[str, int]]:
+    """
+    Per agent, the system message and tool schema tokens every request
+    carries when offered all registered tools (before) vs its own (after).
+    """
+    all_tools = tokens.count_functions_tokens(list(registry.schemas.values()), model)
+    report = {}
+    for agent_info in agents_info:
+        if agent_info["type"] == "UserProxyAgent":
+            continue
+        system = tokens.count_tokens(agent_info["system_message"], model)
+        scoped = tokens.count_functions_tokens(
+            registry.select(agent_info.get("tools", ())), model
+        )
+        report[agent_info["name"]] = {
+            "before": system + all_tools,
+            "after": system + scoped,
+            "tool_tokens_before": all_tools,
+            "tool_tokens_after": scoped,
+        }
+    return report
+
+
+def print_prompt_token_report(report: Dict[str, Dict[str, int]]):
+    print("Prompt tokens per request (system message + tool schemas):")
+    for name, counts in report.items():
+        saved = counts["before"] - counts["after"]
+        print(
+            f"  {name}: {counts['before']} -> {counts['after']} "
+            f"({saved} saved, tools {counts['tool_tokens_before']} -> "
+            f"{counts['tool_tokens_after']})"
+        )
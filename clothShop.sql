@@ -127,6 +127,26 @@ SELECT
 FROM
     Products;
 
+-- Bumped by every write to a versioned table (Products), so caches keyed on
+-- the catalog can tell when it changed
+CREATE TABLE Table_versions (
+    table_name TEXT PRIMARY KEY,
+    version BIGINT NOT NULL
+);
+
+CREATE OR REPLACE FUNCTION bump_table_version() RETURNS trigger AS $$
+BEGIN
+    INSERT INTO Table_versions (table_name, version)
+    VALUES (lower(TG_TABLE_NAME), 1)
+    ON CONFLICT (table_name) DO UPDATE SET version = Table_versions.version + 1;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER products_version
+AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON Products
+FOR EACH STATEMENT EXECUTE FUNCTION bump_table_version();
+
 CREATE TABLE Customers (
     CustomerID INT GENERATED ALWAYS AS IDENTITY PRIMARY KEY,
     FirstName TEXT,
@@ -0,0 +1,85 @@
+import autogen
+
+from agents.modules.agent_templates import (
+    AgentTemplate,
+    GroupChatManagerTemplate,
+    clone_agent,
+)
+
+LLM_CONFIG = {"config_list": [{"model": "gpt-4o-mini", "api_key": "test"}]}
+
+
+def lookup(order_id):
+    return order_id
+
+
+def test_clones_do_not_share_per_chat_state():
+    prototype = autogen.AssistantAgent("assistant", llm_config=LLM_CONFIG)
+    prototype.register_hook("process_last_received_message", lambda text: text)
+    first, second = clone_agent(prototype), clone_agent(prototype)
+
+    assert first._oai_messages is not second._oai_messages
+    assert first._function_map is not prototype._function_map
+    assert first.hook_lists is not second.hook_lists
+    assert (
+        first.hook_lists["process_last_received_message"]
+        == prototype.hook_lists["process_last_received_message"]
+    )
+    for mine, theirs in zip(first._reply_func_list, second._reply_func_list):
+        assert mine["reply_func"] is theirs["reply_func"]
+        if mine["config"] is not None:
+            assert mine["config"] is not theirs["config"]
+
+    first.register_function({"lookup": lookup})
+    first.register_hook("process_all_messages_before_reply", lambda messages: messages)
+    assert "lookup" not in second._function_map
+    assert second.hook_lists["process_all_messages_before_reply"] == []
+
+    # the parsed llm_config and the OpenAI client are shared, not rebuilt
+    assert first.client is prototype.client
+    assert first.llm_config is prototype.llm_config
+
+
+def test_sequential_clones_start_with_an_empty_history():
+    template = AgentTemplate(
+        autogen.ConversableAgent,
+        name="assistant",
+        llm_config=False,
+        human_input_mode="NEVER",
+    )
+    user = autogen.ConversableAgent("user", llm_config=False)
+
+    first = template.instantiate()
+    first.receive("What is the status of order 12?", user, request_reply=False)
+    assert len(first.chat_messages[user]) == 1
+
+    second = template.instantiate()
+    assert second.chat_messages == {}
+    assert template.prototype.chat_messages == {}
+
+
+def test_manager_clones_run_their_own_groupchat():
+    template = GroupChatManagerTemplate(name="manager", llm_config=LLM_CONFIG)
+    agents = [autogen.ConversableAgent(name, llm_config=False) for name in "ab"]
+    first_chat = autogen.GroupChat(agents=agents, messages=[])
+    second_chat = autogen.GroupChat(agents=agents, messages=[])
+
+    first = template.instantiate(first_chat)
+    second = template.instantiate(second_chat)
+
+    def groupchats(manager):
+        return [
+            reply["config"]
+            for reply in manager._reply_func_list
+            if isinstance(reply["config"], autogen.GroupChat)
+        ]
+
+    assert first.groupchat is first_chat and second.groupchat is second_chat
+    assert groupchats(first) and all(chat is first_chat for chat in groupchats(first))
+    assert all(chat is second_chat for chat in groupchats(second))
+    # the prototype keeps its placeholder for the next session
+    assert all(
+        reply["init_config"] is template._placeholder
+        for reply in template.prototype._reply_func_list
+        if isinstance(reply["config"], autogen.GroupChat)
+    )
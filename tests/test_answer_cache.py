@@ -0,0 +1,102 @@
+import pytest
+
+from agents.modules import answer_cache
+from agents.modules.answer_cache import AnswerCache, final_answer, normalize
+
+REQUEST = "show me black women's jeans under 40"
+SAME_REQUEST = "can you recommend black jeans for women under $40?"
+
+
+class FakeDB:
+    def __init__(self, version="1"):
+        self.version = version
+
+    def get_table_version(self, table):
+        assert table == "products"
+        return self.version
+
+
+def test_near_duplicates_normalize_alike():
+    assert normalize(REQUEST) == normalize(SAME_REQUEST)
+    assert normalize(REQUEST) == {
+        "slots": {
+            "item": "jeans",
+            "colour": "Black",
+            "gender": "Women",
+            "max_price": 40,
+        },
+        "words": [],
+    }
+    assert normalize(REQUEST + " with pockets")["words"] == ["pockets"]
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        "",
+        "buy black jeans for women",
+        "I want to return the jeans",
+        "where is order 12",
+        "recommend something like <img https://x/y.png>",
+        "recommend something nice",  # no slots
+    ],
+)
+def test_not_cacheable(text):
+    assert normalize(text) is None
+
+
+def test_final_answer_follows_the_product_search():
+    messages = [
+        {"user": "product_recommendation_agent", "message": "Let me look."},
+        {"user": "recommend_product", "message": '{"rows": []}'},
+        {"user": "product_recommendation_agent", "message": "  "},
+        {"user": "product_recommendation_agent", "message": "Here are 3 jeans."},
+    ]
+    agent = "product_recommendation_agent"
+    assert final_answer(messages, agent) == (agent, "Here are 3 jeans.")
+    assert final_answer(messages[:1], agent) is None
+    assert final_answer(messages[:1], agent, searched=True) == (agent, "Let me look.")
+
+
+def test_hit_for_the_same_request_and_catalog():
+    cache, db = AnswerCache(), FakeDB()
+    key, entry = cache.lookup(db, REQUEST)
+    assert entry is None
+    cache.put(key, "product_recommendation_agent", "Here are 3 jeans.")
+
+    same_key, entry = cache.lookup(db, SAME_REQUEST)
+    assert same_key == key
+    assert entry["message"] == "Here are 3 jeans."
+    assert cache.stats() == {"entries": 1, "hits": 1, "misses": 1}
+
+
+def test_catalog_change_misses():
+    cache, db = AnswerCache(), FakeDB("1")
+    key, _ = cache.lookup(db, REQUEST)
+    cache.put(key, "agent", "answer")
+
+    db.version = "2"
+    new_key, entry = cache.lookup(db, REQUEST)
+    assert new_key != key and entry is None
+
+
+def test_without_a_version_nothing_is_cached():
+    assert AnswerCache().lookup(FakeDB(None), REQUEST) == (None, None)
+    assert AnswerCache(ttl=0).lookup(FakeDB(), REQUEST) == (None, None)
+
+
+def test_expired_and_evicted_answers(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(answer_cache.time, "time", lambda: now[0])
+    cache, db = AnswerCache(max_entries=1, ttl=10), FakeDB()
+
+    key, _ = cache.lookup(db, REQUEST)
+    cache.put(key, "agent", "answer")
+    now[0] += 11
+    assert cache.lookup(db, REQUEST) == (key, None)
+
+    cache.put(key, "agent", "answer")
+    other, _ = cache.lookup(db, "blue shirts for men")
+    cache.put(other, "agent", "other answer")
+    assert cache.lookup(db, REQUEST) == (key, None)
+    assert cache.stats()["entries"] == 1
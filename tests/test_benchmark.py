@@ -0,0 +1,134 @@
+from types import SimpleNamespace
+
+import pytest
+
+from agents import benchmark
+from agents.modules import intents
+
+
+class FakeResponse:
+    def __init__(self, data, status_code=200):
+        self.data = data
+        self.status_code = status_code
+        self.headers = {}
+
+    def json(self):
+        return self.data
+
+    def raise_for_status(self):
+        pass
+
+
+class FakeApi:
+    """Answers a Customer the way api1 does for one order-status chat."""
+
+    def __init__(self, messages):
+        self.messages = list(messages)
+        self.sent = []
+
+    def post(self, url, json, timeout):
+        if url.endswith("/api/start_chat"):
+            return FakeResponse({"session_id": "s1"})
+        self.sent.append(json["message"])
+        if json["message"] == "exit":
+            self.messages.append(None)
+        return FakeResponse({})
+
+    def get(self, url, params, timeout):
+        if url.endswith("/api/session_metrics"):
+            return FakeResponse({"llm_calls": 3, "prompt_tokens": 900, "cost": 0.01})
+        if not self.messages:
+            return FakeResponse({"message": None, "chat_status": "Chat ongoing"})
+        msg = self.messages.pop(0)
+        if msg is None:
+            return FakeResponse({"message": None, "chat_status": "ended"})
+        return FakeResponse({"message": msg, "chat_status": "Chat ongoing"})
+
+
+PROMPT = {"user": "System", "message": "Please input your further direction"}
+
+
+def test_customer_plays_the_scenario_and_times_the_decision():
+    api = FakeApi(
+        [
+            {"user": "User_Proxy", "message": "Can you check my order?"},
+            {"user": "order_status_agent", "message": "Your order ID?"},
+            PROMPT,
+            {"user": "order_status_agent", "message": "Order 12 has shipped."},
+            PROMPT,
+        ]
+    )
+    options = SimpleNamespace(stream=False, timeout=5, poll_interval=0)
+    customer = benchmark.Customer("http://api1", intents.ORDER_STATUS, options)
+    customer.http = api
+
+    result = customer.run()
+    assert api.sent == ["My order ID is 12", "exit"]
+    assert result["outcome"] == "ended" and result["rejected"] == 0
+    assert result["first_message_seconds"] == result["decision_seconds"]
+    assert result["llm_calls"] == 3 and result["prompt_tokens"] == 900
+
+
+def test_percentile_is_nearest_rank():
+    values = list(range(1, 101))
+    assert benchmark.percentile(values, 50) == 50
+    assert benchmark.percentile(values, 99) == 99
+    assert benchmark.percentile([3.0], 95) == 3.0
+    assert benchmark.percentile([], 50) is None
+
+
+def row(scenario, seconds, outcome="ended"):
+    return {
+        "scenario": scenario,
+        "outcome": outcome,
+        "first_message_seconds": seconds / 2,
+        "decision_seconds": seconds,
+        "chat_seconds": seconds,
+        "llm_calls": 4,
+    }
+
+
+def test_summarize_counts_only_ended_chats_in_latencies():
+    results = [row("order_status", 1.0), row("order_status", 3.0)]
+    results.append(row("recommendation", 9.0, outcome="timeout"))
+    summary = benchmark.summarize(results, wall_seconds=10)
+
+    overall = summary["overall"]
+    assert overall["chats"] == 3 and overall["ended"] == 2
+    assert overall["timeouts"] == 1
+    assert overall["chats_per_sec"] == pytest.approx(0.2)
+    assert overall["decision_p50"] == 1.0 and overall["decision_p95"] == 3.0
+    assert summary["scenarios"]["recommendation"]["decision_p50"] is None
+
+
+def run_with(decision_p50, chats_per_sec, config=None):
+    stats = {"decision_p50": decision_p50, "chats_per_sec": chats_per_sec}
+    return {
+        "config": config or {"customers": 4},
+        "summary": {"overall": stats, "scenarios": {"order_status": stats}},
+    }
+
+
+def test_compare_flags_metrics_worse_than_the_threshold():
+    baseline = run_with(decision_p50=2.0, chats_per_sec=1.0)
+
+    assert benchmark.compare(run_with(2.1, 0.95), baseline, 0.10) == []
+    regressions = benchmark.compare(run_with(2.5, 0.5), baseline, 0.10)
+    assert "overall decision_p50: 2.000 -> 2.500 (+25%)" in regressions
+    assert "order_status chats_per_sec: 1.000 -> 0.500 (-50%)" in regressions
+
+
+def test_latest_run_matches_the_configuration(tmp_path):
+    older = {**run_with(2.0, 1.0), "started_at": 1_700_000_000, "commit": "a1"}
+    other = {
+        **run_with(2.0, 1.0, config={"customers": 8}),
+        "started_at": 1_700_000_100,
+        "commit": "b2",
+    }
+    newer = {**run_with(2.0, 1.0), "started_at": 1_700_000_200, "commit": "c3"}
+    paths = [benchmark.save_run(run, str(tmp_path)) for run in (older, other, newer)]
+
+    config = {"customers": 4}
+    assert benchmark.latest_run(str(tmp_path), config) == paths[2]
+    assert benchmark.latest_run(str(tmp_path), config, exclude=paths[2]) == paths[0]
+    assert benchmark.latest_run(str(tmp_path), {"customers": 1}) is None
@@ -0,0 +1,93 @@
+from types import SimpleNamespace
+
+import pytest
+
+from agents.modules import cascade
+from agents.modules.cascade import CascadePolicy
+
+RUN_SQL = {
+    "name": "run_sql",
+    "parameters": {"type": "object", "required": ["sql"]},
+}
+
+
+def response(content=None, function_call=None, tool_calls=None):
+    message = SimpleNamespace(
+        content=content, function_call=function_call, tool_calls=tool_calls
+    )
+    return SimpleNamespace(
+        model="gpt-4o-mini", choices=[SimpleNamespace(message=message)]
+    )
+
+
+def function_call(name, arguments):
+    return SimpleNamespace(name=name, arguments=arguments)
+
+
+@pytest.mark.parametrize(
+    "arguments, check",
+    [
+        ('{"sql": "SELECT 1"}', None),
+        ('{"query": "SELECT 1"}', "function_call"),  # required argument missing
+        ("{not json", "function_call"),
+        ('["SELECT 1"]', "function_call"),
+    ],
+)
+def test_function_call_check(arguments, check):
+    policy = CascadePolicy(checks=["function_call"], functions=[RUN_SQL])
+    reply = response(function_call=function_call("run_sql", arguments))
+    assert policy.failed_check(reply) == check
+
+
+def test_unknown_function_fails():
+    policy = CascadePolicy(checks=["function_call"], functions=[RUN_SQL])
+    tool_call = SimpleNamespace(function=function_call("drop_table", "{}"))
+    assert policy.failed_check(response(tool_calls=[tool_call])) == "function_call"
+
+
+def test_decision_check():
+    policy = CascadePolicy(checks=["decision"], decisions=["Refund", "Replace"])
+    assert policy.failed_check(response("Decision: Replace the package")) is None
+    assert policy.failed_check(response("Let me think about it")) == "decision"
+
+
+def test_confident_check():
+    policy = CascadePolicy(checks=["confident"])
+    assert policy.failed_check(response("Here are three shirts")) is None
+    assert policy.failed_check(response("  ")) == "confident"
+    assert policy.failed_check(response("I'm not sure which one")) == "confident"
+    assert policy.failed_check(SimpleNamespace(choices=[])) == "confident"
+
+
+def test_rejection_is_recorded(monkeypatch):
+    rejections = []
+    monkeypatch.setattr(
+        cascade.metrics.registry,
+        "record_llm_rejection",
+        lambda model, check: rejections.append((model, check)),
+    )
+    policy = CascadePolicy(checks=["confident"])
+    assert policy(response=response("Sure")) is True
+    assert policy(response=response("")) is False
+    assert rejections == [("gpt-4o-mini", "confident")]
+
+
+def test_invalid_policies():
+    with pytest.raises(ValueError):
+        CascadePolicy(checks=["psychic"])
+    with pytest.raises(ValueError):
+        CascadePolicy(checks=["decision"])
+
+
+def test_llm_config_escalates_to_the_strong_model():
+    agent_info = {"llm": {"model": "gpt-4o-mini"}, "cascade": {"checks": ["confident"]}}
+    config = cascade.llm_config(agent_info)
+    assert [c["model"] for c in config["config_list"]] == [
+        "gpt-4o-mini",
+        cascade.STRONG_MODEL,
+    ]
+    assert isinstance(config["filter_func"], CascadePolicy)
+
+    assert cascade.llm_config({"llm": {"model": "gpt-4o-mini"}}) == {
+        "config_list": [{"model": "gpt-4o-mini"}]
+    }
@@ -0,0 +1,66 @@
+import asyncio
+import threading
+
+import pytest
+
+from agents.modules.chat_pool import ChatPool, ChatPoolFull, run_on_worker_loop
+from agents.modules.sessions import ChatSession
+
+
+def blocking_chat(release: threading.Event, started: threading.Semaphore):
+    def run(session):
+        started.release()
+        release.wait(5)
+
+    return run
+
+
+def test_run_on_worker_loop_reuses_the_thread_loop():
+    async def current_loop():
+        return asyncio.get_running_loop()
+
+    first = run_on_worker_loop(current_loop())
+    second = run_on_worker_loop(current_loop())
+    assert first is second and not first.is_closed()
+
+
+def test_run_on_worker_loop_cancels_leftover_tasks():
+    cancelled = []
+
+    async def forever():
+        try:
+            await asyncio.sleep(60)
+        except asyncio.CancelledError:
+            cancelled.append(True)
+            raise
+
+    async def chat():
+        asyncio.get_running_loop().create_task(forever())
+        await asyncio.sleep(0)
+        return "done"
+
+    assert run_on_worker_loop(chat()) == "done"
+    assert cancelled == [True]
+
+
+def test_pool_queues_then_refuses_chats():
+    pool = ChatPool(max_concurrent=1, max_waiting=1)
+    release, started = threading.Event(), threading.Semaphore(0)
+    run = blocking_chat(release, started)
+    try:
+        first, second = ChatSession("a"), ChatSession("b")
+        assert pool.submit(first, run) == 0
+        assert started.acquire(timeout=5)
+        assert pool.submit(second, run) == 1
+        assert second.chat_status == "queued"
+        assert pool.queue_position("b") == 1
+        assert pool.stats()["waiting"] == 1
+
+        with pytest.raises(ChatPoolFull):
+            pool.submit(ChatSession("c"), run)
+    finally:
+        release.set()
+
+    assert started.acquire(timeout=5)
+    assert second.chat_status == "Chat ongoing"
+    assert pool.queue_position("b") == 0
@@ -0,0 +1,197 @@
+import contextlib
+import json
+
+import psycopg2
+import pytest
+from psycopg2.sql import SQL, Composed, Identifier
+
+from agents.modules import db
+from agents.modules.db import PooledConnection, PostgresManager
+
+CHEAP = (10.0, 5)
+EXPENSIVE = (1e9, 1e7)
+
+
+def render(statement):
+    if isinstance(statement, Composed):
+        return "".join(render(part) for part in statement.seq)
+    if isinstance(statement, Identifier):
+        return ".".join(f'"{name}"' for name in statement.strings)
+    if isinstance(statement, SQL):
+        return statement.string
+    return statement
+
+
+class FakeConnection:
+    """
+    Records every statement of every cursor. EXPLAINs answer with the next
+    of `plans`, queries with `rows` (`rowcount` for writes).
+    """
+
+    def __init__(self, plans, rows=(), rowcount=0, error=None):
+        self.plans = list(plans)
+        self.rows = list(rows)
+        self.rowcount = rowcount
+        self.error = error
+        self.executed = []
+        self.fetched = 0
+
+    def cursor(self, name=None):
+        return FakeCursor(self, name)
+
+
+class FakeCursor:
+    def __init__(self, conn, name):
+        self.conn = conn
+        self.name = name
+        self.description = None
+        self.rowcount = -1
+        self._result = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, statement, params=None):
+        text = render(statement)
+        self.conn.executed.append((self.name, text))
+        if text.startswith("SET "):
+            return
+        if text.startswith("EXPLAIN"):
+            cost, rows = self.conn.plans.pop(0)
+            self._result = [([{"Plan": {"Total Cost": cost, "Plan Rows": rows}}],)]
+            return
+        if self.conn.error:
+            raise self.conn.error
+        if text.startswith("MOVE FORWARD ALL"):
+            self.rowcount = max(0, len(self.conn.rows) - self.conn.fetched)
+            return
+        if text.lower().startswith(("select", "with")):
+            self.description = [("productname",)]
+            self._result = list(self.conn.rows)
+            self.rowcount = len(self._result)
+        else:
+            self.rowcount = self.conn.rowcount
+
+    def fetchone(self):
+        return self._result[0]
+
+    def fetchall(self):
+        return self._result
+
+    def fetchmany(self, size):
+        self.conn.fetched = size
+        return self._result[:size]
+
+
+def manager_with(conn):
+    manager = PostgresManager()
+    pooled = PooledConnection(conn)
+
+    @contextlib.contextmanager
+    def connection():
+        yield pooled
+
+    manager.connection = connection
+    return manager
+
+
+def run(conn, sql, max_rows=2):
+    return json.loads(manager_with(conn).run_bounded(sql, max_rows=max_rows))
+
+
+ROWS = [["Blue Shirt"], ["Blue Jeans"], ["Blue Top"], ["Blue Dress"]]
+
+
+def test_more_than_one_statement_is_rejected_unrun():
+    conn = FakeConnection([])
+    result = run(conn, "SELECT 1; DROP TABLE products")
+    assert result == {"error": "Send a single SQL statement."}
+    assert conn.executed == []
+
+
+def test_guard_makes_the_transaction_read_only_with_a_timeout():
+    conn = FakeConnection([CHEAP], rows=ROWS)
+    run(conn, "SELECT productname FROM products;")
+
+    assert conn.executed[:3] == [
+        (None, "SET TRANSACTION READ ONLY"),
+        (None, "SET LOCAL statement_timeout = %s"),
+        (None, "EXPLAIN (FORMAT JSON) SELECT productname FROM products"),
+    ]
+
+
+def test_cheap_query_streams_from_a_server_side_cursor():
+    conn = FakeConnection([CHEAP], rows=ROWS)
+    result = run(conn, "SELECT productname FROM products")
+
+    assert ("agent_result", "SELECT productname FROM products") in conn.executed
+    assert (None, 'MOVE FORWARD ALL IN "agent_result"') in conn.executed
+    assert result["rows"] == [["Blue Shirt"], ["Blue Jeans"]]
+    assert result["row_count"] == 4 and result["truncated"] is True
+
+
+def test_expensive_query_runs_with_a_limit_when_that_is_cheap():
+    conn = FakeConnection([EXPENSIVE, CHEAP], rows=ROWS[:3])
+    result = run(conn, "SELECT productname FROM products")
+
+    limited = "SELECT * FROM (SELECT productname FROM products) AS limited LIMIT 3"
+    assert conn.executed[-2:] == [
+        (None, "EXPLAIN (FORMAT JSON) " + limited),
+        (None, limited),
+    ]
+    assert result["rows"] == [["Blue Shirt"], ["Blue Jeans"]]
+    assert result["row_count"] is None and result["truncated"] is True
+
+
+def test_query_too_expensive_even_with_a_limit_is_rejected():
+    conn = FakeConnection([EXPENSIVE, EXPENSIVE], rows=ROWS)
+    result = run(conn, "SELECT productname FROM products")
+
+    assert result["error"].startswith("The query is too expensive to run")
+    assert result["estimated_cost"] == EXPENSIVE[0]
+    assert all(text.startswith(("SET", "EXPLAIN")) for _, text in conn.executed)
+
+
+def test_expensive_write_is_rejected_without_a_limit():
+    conn = FakeConnection([EXPENSIVE])
+    result = run(conn, "UPDATE products SET price = 0")
+
+    assert result["error"].startswith("The query is too expensive to run")
+    assert len([text for _, text in conn.executed if "EXPLAIN" in text]) == 1
+
+
+def test_cheap_write_reports_the_affected_rows():
+    conn = FakeConnection([CHEAP], rowcount=3)
+    result = run(conn, "UPDATE products SET price = 0")
+
+    assert (None, "UPDATE products SET price = 0") in conn.executed
+    assert result == {"columns": [], "rows": [], "row_count": 3, "truncated": False}
+
+
+@pytest.mark.parametrize(
+    "error, message",
+    [
+        (psycopg2.errors.QueryCanceled(), "The query was cancelled after"),
+        (psycopg2.errors.ReadOnlySqlTransaction(), "Only read-only queries"),
+    ],
+)
+def test_guard_errors_come_back_as_errors(error, message):
+    conn = FakeConnection([CHEAP], error=error)
+    result = run(conn, "UPDATE products SET price = 0")
+    assert result["error"].startswith(message)
+
+
+def test_too_expensive_limits(monkeypatch):
+    manager = PostgresManager()
+    monkeypatch.setattr(db, "SQL_MAX_COST", 100)
+    monkeypatch.setattr(db, "SQL_MAX_PLAN_ROWS", 1000)
+    assert not manager.too_expensive(100, 1000)
+    assert manager.too_expensive(101, 1)
+    assert manager.too_expensive(1, 1001)
+
+    monkeypatch.setattr(db, "SQL_MAX_COST", 0)
+    monkeypatch.setattr(db, "SQL_MAX_PLAN_ROWS", 0)
+    assert not manager.too_expensive(1e12, 1e12)  # 0 turns the gate off
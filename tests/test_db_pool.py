@@ -0,0 +1,121 @@
+import threading
+
+import psycopg2
+import pytest
+
+from agents.modules import db
+from agents.modules.db import ConnectionPool, PoolTimeout
+
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, statement):
+        if self.conn.broken:
+            raise psycopg2.OperationalError("server closed the connection")
+
+
+class FakeConnection:
+    def __init__(self, url):
+        self.url = url
+        self.closed = 0
+        self.broken = False
+        self.status = psycopg2.extensions.TRANSACTION_STATUS_IDLE
+
+    def get_transaction_status(self):
+        return self.status
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        self.closed = 1
+
+
+@pytest.fixture
+def connections(monkeypatch):
+    opened = []
+
+    def connect(url):
+        opened.append(FakeConnection(url))
+        return opened[-1]
+
+    monkeypatch.setattr(db.psycopg2, "connect", connect)
+    return opened
+
+
+def test_connections_are_reused(connections):
+    pool = ConnectionPool("postgres://x", min_size=1, max_size=2)
+    pooled = pool.getconn()
+    pool.putconn(pooled)
+
+    assert pool.getconn() is pooled
+    assert len(connections) == 1
+    assert pool.stats()["in_use"] == 1
+
+
+def test_pool_opens_up_to_max_size_then_times_out(connections):
+    pool = ConnectionPool("postgres://x", min_size=0, max_size=2, timeout=0.05)
+    first, second = pool.getconn(), pool.getconn()
+    assert first is not second
+
+    with pytest.raises(PoolTimeout):
+        pool.getconn()
+    assert pool.stats()["timeouts"] == 1
+    assert len(connections) == 2
+
+
+def test_waiting_caller_gets_the_released_connection(connections):
+    pool = ConnectionPool("postgres://x", min_size=0, max_size=1, timeout=5)
+    pooled = pool.getconn()
+    threading.Timer(0.05, pool.putconn, args=(pooled,)).start()
+
+    assert pool.getconn() is pooled
+
+
+def test_connection_left_in_a_transaction_is_discarded(connections):
+    pool = ConnectionPool("postgres://x", min_size=0, max_size=1)
+    pooled = pool.getconn()
+    pooled.conn.status = psycopg2.extensions.TRANSACTION_STATUS_INERROR
+    pool.putconn(pooled)
+
+    assert pooled.conn.closed
+    assert pool.stats() == {
+        "size": 0,
+        "idle": 0,
+        "in_use": 0,
+        "waiting": 0,
+        "timeouts": 0,
+        "discarded": 1,
+    }
+    assert pool.getconn() is not pooled
+
+
+def test_broken_idle_connection_is_replaced(connections):
+    pool = ConnectionPool("postgres://x", min_size=1, max_size=1, check_after=0)
+    connections[0].broken = True
+
+    pooled = pool.getconn()
+    assert pooled.conn is connections[1]
+    assert pool.stats()["discarded"] == 1
+
+
+def test_failed_connect_frees_its_slot(monkeypatch):
+    def connect(url):
+        raise psycopg2.OperationalError("connection refused")
+
+    monkeypatch.setattr(db.psycopg2, "connect", connect)
+    pool = ConnectionPool("postgres://x", min_size=0, max_size=1)
+    with pytest.raises(psycopg2.OperationalError):
+        pool.getconn()
+    assert pool.stats()["size"] == 0
@@ -0,0 +1,147 @@
+import contextlib
+import json
+
+import psycopg2
+from psycopg2.sql import SQL, Composed, Identifier
+
+from agents.modules.db import PooledConnection, PostgresManager
+
+LEARNED_SQL = "SELECT productname FROM products WHERE color = $1"
+
+
+def render(statement):
+    """Text of a psycopg2.sql statement, without a connection to quote it."""
+    if isinstance(statement, Composed):
+        return "".join(render(part) for part in statement.seq)
+    if isinstance(statement, Identifier):
+        return ".".join(f'"{name}"' for name in statement.strings)
+    if isinstance(statement, SQL):
+        return statement.string
+    return statement
+
+
+class RecordingCursor:
+    def __init__(self, cost=10.0, plan_rows=5, rows=(), error=None):
+        self.executed = []
+        self.plan = [{"Plan": {"Total Cost": cost, "Plan Rows": plan_rows}}]
+        self.rows = list(rows)
+        self.error = error
+        self.description = [("productname",)]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, statement, params=None):
+        self.executed.append((render(statement), params))
+        if self.error and render(statement).startswith("EXECUTE"):
+            raise self.error
+
+    def fetchone(self):
+        return (self.plan,)
+
+    def fetchall(self):
+        return self.rows
+
+
+def manager_with(cur):
+    """A manager whose pooled connection hands out `cur`."""
+    manager = PostgresManager(use_prepared=True)
+    pooled = PooledConnection(type("Conn", (), {"cursor": lambda self: cur})())
+
+    @contextlib.contextmanager
+    def connection():
+        yield pooled
+
+    manager.connection = connection
+    return manager
+
+
+def test_plain_mode_sends_the_sql_text():
+    manager = PostgresManager(use_prepared=False)
+    pooled, cur = PooledConnection(None), RecordingCursor()
+
+    manager.execute_prepared(pooled, cur, "order_status", (12,))
+    assert cur.executed == [
+        (
+            "SELECT orderdate, orderstatus FROM orders WHERE orderid = %(p1)s",
+            {"p1": 12},
+        )
+    ]
+    assert not pooled.prepared
+
+
+def test_plain_mode_escapes_percent_signs():
+    statement, params = PostgresManager(use_prepared=False).statement_for(
+        PooledConnection(None),
+        RecordingCursor(),
+        "search",
+        ["%shirt%"],
+        "SELECT * FROM products WHERE productname ILIKE $1 AND note = '100%'",
+    )
+    assert statement == (
+        "SELECT * FROM products WHERE productname ILIKE %(p1)s AND note = '100%%'"
+    )
+    assert params == {"p1": "%shirt%"}
+
+
+def test_statements_are_prepared_once_per_connection():
+    manager = PostgresManager(use_prepared=True)
+    pooled, cur = PooledConnection(None), RecordingCursor()
+
+    manager.execute_prepared(pooled, cur, "order_status", (12,))
+    manager.execute_prepared(pooled, cur, "order_status", (13,))
+
+    assert cur.executed == [
+        (
+            'PREPARE "order_status" AS '
+            "SELECT orderdate, orderstatus FROM orders WHERE orderid = $1",
+            None,
+        ),
+        ('EXECUTE "order_status" (%s)', (12,)),
+        ('EXECUTE "order_status" (%s)', (13,)),
+    ]
+    assert pooled.prepared == {"order_status"}
+
+    # a new connection prepares it again
+    other = RecordingCursor()
+    manager.execute_prepared(PooledConnection(None), other, "order_status", (12,))
+    assert len(other.executed) == 2
+
+
+def test_templates_run_read_only_under_a_timeout_and_a_limit():
+    cur = RecordingCursor(rows=[["Blue Shirt"], ["Blue Jeans"], ["Blue Top"]])
+    result = json.loads(
+        manager_with(cur).run_prepared("tpl_1", LEARNED_SQL, ["Blue"], max_rows=2)
+    )
+
+    statements = [statement for statement, _ in cur.executed]
+    assert statements[:2] == [
+        "SET TRANSACTION READ ONLY",
+        "SET LOCAL statement_timeout = %s",
+    ]
+    assert statements[2] == (
+        'PREPARE "tpl_1_3" AS SELECT * FROM ' f"({LEARNED_SQL}) AS limited LIMIT 3"
+    )
+    assert statements[3:] == [
+        'EXPLAIN (FORMAT JSON) EXECUTE "tpl_1_3" (%s)',
+        'EXECUTE "tpl_1_3" (%s)',
+    ]
+    assert result["rows"] == [["Blue Shirt"], ["Blue Jeans"]]
+    assert result["row_count"] is None and result["truncated"] is True
+
+
+def test_expensive_template_runs_are_rejected():
+    cur = RecordingCursor(cost=1e9, plan_rows=1e7)
+    result = json.loads(manager_with(cur).run_prepared("tpl_1", LEARNED_SQL, ["Blue"]))
+
+    assert result["error"].startswith("The query is too expensive to run")
+    assert not cur.executed[-1][0].startswith("EXECUTE")
+
+
+def test_cancelled_template_run_is_an_error():
+    cur = RecordingCursor(error=psycopg2.errors.QueryCanceled())
+    result = json.loads(manager_with(cur).run_prepared("tpl_1", LEARNED_SQL, ["Blue"]))
+    assert result["error"].startswith("The query was cancelled")
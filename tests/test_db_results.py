@@ -0,0 +1,70 @@
+import json
+from datetime import datetime
+
+from agents.modules import db
+from agents.modules.db import PostgresManager
+
+
+class FakeCursor:
+    def __init__(self, columns, rows):
+        self.description = [(column,) for column in columns] if columns else None
+        self.rows = rows
+        self.rowcount = len(rows)
+
+    def fetchmany(self, size):
+        return self.rows[:size]
+
+
+def test_encode_result_shape():
+    result = json.loads(
+        PostgresManager().encode_result(
+            ["productname", "created"], [["Shirt", datetime(2024, 3, 5)]], 1
+        )
+    )
+    assert result == {
+        "columns": ["productname", "created"],
+        "rows": [["Shirt", "2024-03-05T00:00:00"]],
+        "row_count": 1,
+        "truncated": False,
+    }
+
+
+def test_encode_result_omits_columns_and_shortens_values(monkeypatch):
+    monkeypatch.setattr(db, "RESULT_MAX_VALUE_CHARS", 5)
+    result = json.loads(
+        PostgresManager().encode_result(
+            ["name", "CreditCardNumber"], [["long description", "4111"]], 1
+        )
+    )
+    assert result["columns"] == ["name"]
+    assert result["rows"] == [["long ..."]]
+
+
+def test_encode_result_notes_truncation():
+    manager = PostgresManager()
+    truncated = json.loads(manager.encode_result(["n"], [[1], [2]], 10))
+    assert truncated["truncated"] is True
+    assert truncated["note"].startswith("Only the first 2 of 10 rows are shown")
+
+    uncounted = json.loads(manager.encode_result(["n"], [[1], [2]], None))
+    assert uncounted["row_count"] is None and uncounted["truncated"] is True
+    assert uncounted["note"].startswith("Only the first 2 rows were fetched")
+
+
+def test_fetch_json_bounds_rows():
+    cursor = FakeCursor(["n"], [[i] for i in range(5)])
+    result = json.loads(PostgresManager().fetch_json(cursor, max_rows=2))
+    assert result["rows"] == [[0], [1]]
+    assert result["row_count"] == 5 and result["truncated"] is True
+
+
+def test_fetch_json_of_a_statement_without_rows():
+    cursor = FakeCursor(None, [])
+    cursor.rowcount = 3
+    result = json.loads(PostgresManager().fetch_json(cursor))
+    assert result == {"columns": [], "rows": [], "row_count": 3, "truncated": False}
+
+
+def test_reject_returns_an_error_with_details():
+    result = json.loads(PostgresManager().reject("too expensive", estimated_cost=5.0))
+    assert result == {"error": "too expensive", "estimated_cost": 5.0}
@@ -0,0 +1,97 @@
+import contextlib
+from types import SimpleNamespace
+
+import pytest
+
+from agents.modules import db
+from agents.modules.db import (
+    SCHEMA_FINGERPRINT_STMT,
+    TABLE_COLUMNS_STMT,
+    PostgresManager,
+)
+
+COLUMNS = [
+    ("orders", "orderid", "integer"),
+    ("orders", "orderstatus", "text"),
+    ("products", "productid", "integer"),
+]
+
+
+class CatalogCursor:
+    def __init__(self, catalog):
+        self.catalog = catalog
+
+    def execute(self, statement, params=None):
+        self.catalog.executed.append(statement)
+        self.statement = statement
+
+    def fetchone(self):
+        assert self.statement == SCHEMA_FINGERPRINT_STMT
+        return (self.catalog.fingerprint,)
+
+    def fetchall(self):
+        assert self.statement == TABLE_COLUMNS_STMT
+        return self.catalog.columns
+
+
+class Catalog:
+    def __init__(self):
+        self.fingerprint = "f1"
+        self.columns = list(COLUMNS)
+        self.executed = []
+
+
+@pytest.fixture
+def catalog(monkeypatch):
+    monkeypatch.setattr(db, "SCHEMA_CHECK_INTERVAL", 0)  # check on every call
+    catalog = Catalog()
+    manager = PostgresManager()
+    manager.pool = SimpleNamespace(url="postgres://schema-test")
+
+    @contextlib.contextmanager
+    def cursor():
+        yield CatalogCursor(catalog)
+
+    manager.cursor = cursor
+    catalog.manager = manager
+    yield catalog
+    manager.refresh_table_definitions()
+
+
+def test_one_catalog_query_builds_the_prompt(catalog):
+    definitions = catalog.manager.get_table_definitions_for_prompt()
+
+    assert catalog.executed == [SCHEMA_FINGERPRINT_STMT, TABLE_COLUMNS_STMT]
+    assert definitions == (
+        "CREATE TABLE orders (\norderid integer,\norderstatus text\n);\n\n"
+        "CREATE TABLE products (\nproductid integer\n);"
+    )
+
+
+def test_unchanged_fingerprint_returns_the_cached_text(catalog):
+    first = catalog.manager.get_table_definitions_for_prompt()
+    catalog.executed.clear()
+    catalog.columns = [("ignored", "because", "cached")]
+
+    assert catalog.manager.get_table_definitions_for_prompt() is first
+    assert catalog.executed == [SCHEMA_FINGERPRINT_STMT]
+
+
+def test_changed_fingerprint_rebuilds_the_text(catalog):
+    catalog.manager.get_table_definitions_for_prompt()
+    catalog.executed.clear()
+    catalog.fingerprint = "f2"
+    catalog.columns.append(("products", "price", "numeric"))
+
+    definitions = catalog.manager.get_table_definitions_for_prompt()
+    assert catalog.executed == [SCHEMA_FINGERPRINT_STMT, TABLE_COLUMNS_STMT]
+    assert definitions.endswith("productid integer,\nprice numeric\n);")
+
+
+def test_fingerprint_is_not_rechecked_within_the_interval(catalog, monkeypatch):
+    monkeypatch.setattr(db, "SCHEMA_CHECK_INTERVAL", 60)
+    catalog.manager.get_table_definitions_for_prompt()
+    catalog.executed.clear()
+
+    catalog.manager.get_table_definitions_for_prompt()
+    assert catalog.executed == []
@@ -0,0 +1,75 @@
+from datetime import datetime
+
+import pytest
+
+from agents.modules.fast_path import (
+    ORDER_STATUS,
+    TOTAL_PRICE,
+    match_fast_path,
+    try_answer,
+)
+
+
+class FakeDB:
+    def __init__(self, orders):
+        self.orders = orders
+
+    def get_order_status(self, order_id):
+        if order_id not in self.orders:
+            return "Order not found"
+        return self.orders[order_id]["orderdate"], self.orders[order_id]["status"]
+
+    def get_totalprice(self, order_id):
+        if order_id not in self.orders:
+            return "Order not found"
+        return self.orders[order_id]["totalprice"]
+
+
+DB = FakeDB(
+    {12: {"orderdate": datetime(2024, 3, 5), "status": "Shipped", "totalprice": 59.9}}
+)
+
+
+@pytest.mark.parametrize(
+    "text, expected",
+    [
+        ("Where is order 12?", (ORDER_STATUS, 12)),
+        ("what's the status of order #12", (ORDER_STATUS, 12)),
+        ("How much was order id: 7?", (TOTAL_PRICE, 7)),
+        ("total price of order number 7", (TOTAL_PRICE, 7)),
+    ],
+)
+def test_plain_lookups_match(text, expected):
+    assert match_fast_path(text) == expected
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        "",
+        "Where is my order?",  # no order id
+        "Status of order 12 and order 13",  # two orders
+        "Status and total price of order 12",  # two lookups
+        "I want to return order 12, where is it?",  # something to do
+        "Order 12 arrived damaged, what is its status?",
+    ],
+)
+def test_anything_else_falls_through(text):
+    assert match_fast_path(text) is None
+
+
+def test_status_answer():
+    assert try_answer(DB, "where is order 12") == (
+        "Order 12 was placed on March 05, 2024 and its current status is **Shipped**."
+    )
+
+
+def test_total_price_answer():
+    assert try_answer(DB, "total of order 12") == (
+        "The total price of order 12 is **$59.9**."
+    )
+
+
+def test_unknown_order():
+    assert try_answer(DB, "where is order 99").startswith("I could not find order 99.")
+    assert try_answer(DB, "recommend shirts") is None
@@ -0,0 +1,80 @@
+import json
+
+from agents.modules import tokens
+from agents.modules.history import HistoryCompaction, group_calls, summarise_output
+
+TASK = {"role": "user", "content": "Fulfill this request: TABLE_DEFINITIONS ..."}
+
+
+def call(i):
+    return {
+        "role": "assistant",
+        "content": None,
+        "function_call": {"name": "run_sql", "arguments": json.dumps({"sql": i})},
+    }
+
+
+def result(text="ok"):
+    return {"role": "function", "name": "run_sql", "content": text}
+
+
+def text(content, role="user"):
+    return {"role": role, "content": content}
+
+
+def test_summarise_query_result():
+    content = json.dumps(
+        {"columns": ["name", "price"], "rows": [["shirt", 10]], "row_count": 42}
+    )
+    assert summarise_output(content, "run_sql") == (
+        '[run_sql result compacted: 42 rows. First row: {"name": "shirt", "price": 10}]'
+    )
+
+
+def test_summarise_plain_text():
+    assert summarise_output("x" * 300).startswith("[Earlier result compacted: xxx")
+
+
+def test_group_calls_keeps_results_with_their_call():
+    messages = [text("a"), call(1), result(), result(), text("b"), result()]
+    assert [len(group) for group in group_calls(messages)] == [1, 3, 1, 1]
+
+
+def test_short_history_is_untouched():
+    compaction = HistoryCompaction(keep_last=2)
+    messages = [TASK, text("a"), text("b")]
+    assert compaction.compact(messages) is messages
+
+
+def test_old_bulky_outputs_are_summarised():
+    rows = [["product %d" % i, i] for i in range(200)]
+    bulky = json.dumps({"columns": ["name", "price"], "rows": rows, "row_count": 200})
+    compaction = HistoryCompaction(max_tokens=100000, keep_last=1)
+    messages = [TASK, call(1), result(bulky), text("thanks")]
+
+    compacted = compaction.compact(messages, "agent")
+    assert compacted[0] is TASK and compacted[-1] is messages[-1]
+    assert compacted[2]["content"].startswith("[run_sql result compacted: 200 rows.")
+    assert compaction.report()["agent"]["tokens_saved"] > 0
+
+
+def test_calls_are_dropped_with_their_results():
+    old = [call(1), result("a" * 400), call(2), result("b" * 400)]
+    tail = [call(3), result(), text("thanks")]
+    messages = [TASK, *old, *tail]
+    # room for the head, the tail and the newest call + result of `old` only
+    budget = tokens.count_messages_tokens([TASK, *tail, *old[2:]])
+    compaction = HistoryCompaction(max_tokens=budget, keep_last=3)
+
+    compacted = compaction.compact(messages)
+    assert compacted[1]["content"] == "[2 earlier messages omitted to save tokens]"
+    assert compacted[2:] == [*old[2:], *tail]
+
+
+def test_tail_never_starts_with_an_orphaned_result():
+    messages = [TASK, text("a" * 400), call(1), result(), text("thanks")]
+    compaction = HistoryCompaction(max_tokens=0, keep_last=2)
+
+    compacted = compaction.compact(messages)
+    assert compacted[-3:] == messages[-3:]
+    assert compacted[1]["content"] == "[1 earlier messages omitted to save tokens]"
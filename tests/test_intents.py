@@ -0,0 +1,68 @@
+import pytest
+
+from agents.modules import intents, llm
+from agents.modules.intents import (
+    DAMAGE_CLAIM,
+    FRAUD_BILL,
+    ORDER_STATUS,
+    RECOMMENDATION,
+    classify_intent,
+    classify_with_rules,
+)
+from agents.modules.metrics import MetricsRegistry
+
+API1_INTENTS = [RECOMMENDATION, ORDER_STATUS]
+API2_INTENTS = [DAMAGE_CLAIM, FRAUD_BILL]
+
+
+@pytest.mark.parametrize(
+    "text, candidates, expected",
+    [
+        ("Can you recommend black jeans for women?", API1_INTENTS, RECOMMENDATION),
+        ("What is the status of my order 12?", API1_INTENTS, ORDER_STATUS),
+        ("My package arrived wet and torn", API2_INTENTS, DAMAGE_CLAIM),
+        (
+            "I was overcharged on this invoice, looks like fraud",
+            API2_INTENTS,
+            FRAUD_BILL,
+        ),
+        ("hello there", API1_INTENTS, None),
+    ],
+)
+def test_classify_with_rules(text, candidates, expected):
+    assert classify_with_rules(text, candidates) == expected
+
+
+def test_tie_is_unclassified():
+    # one recommendation rule and one order status rule match
+    text = "show me order 5"
+    assert intents.rule_scores(text, API1_INTENTS) == {
+        RECOMMENDATION: 1,
+        ORDER_STATUS: 1,
+    }
+    assert classify_with_rules(text, API1_INTENTS) is None
+
+
+def test_llm_breaks_ties(monkeypatch):
+    monkeypatch.setattr(llm, "prompt", lambda *args, **kwargs: " Order_Status\n")
+    assert classify_intent("show me order 5", API1_INTENTS) == ORDER_STATUS
+
+
+def test_failed_llm_call_uses_the_full_group_chat(monkeypatch):
+    def fail(*args, **kwargs):
+        raise RuntimeError("no network")
+
+    monkeypatch.setattr(llm, "prompt", fail)
+    assert classify_intent("show me order 5", API1_INTENTS) is None
+    assert classify_intent("show me order 5", API1_INTENTS, use_llm=False) is None
+
+
+def test_intents_are_recorded_in_metrics():
+    registry = MetricsRegistry()
+    registry.record_intent("a", RECOMMENDATION)
+    registry.record_intent("b", None)
+
+    assert registry.get_session("a").summary()["intent"] == RECOMMENDATION
+    rendered = registry.render()
+    assert 'chat_intents_total{intent="recommendation"} 1' in rendered
+    assert 'chat_intents_total{intent="unclassified"} 1' in rendered
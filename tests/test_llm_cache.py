@@ -0,0 +1,110 @@
+import json
+from types import SimpleNamespace
+
+import autogen
+import diskcache.core
+import httpx
+import pytest
+
+from agents.modules.llm import SharedHTTPClient
+from agents.modules.llm_cache import ResponseCache, cache_key
+
+REQUEST = {"model": "gpt-4o-mini", "messages": [{"role": "user", "content": "hi"}]}
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = SimpleNamespace(now=1_000_000.0)
+    monkeypatch.setattr(diskcache.core, "time", SimpleNamespace(time=lambda: clock.now))
+    return clock
+
+
+def test_cache_key_ignores_dict_order():
+    reordered = {"messages": REQUEST["messages"], "model": "gpt-4o-mini"}
+    assert cache_key(REQUEST) == cache_key(reordered)
+    assert cache_key(REQUEST) != cache_key({**REQUEST, "model": "gpt-4o"})
+
+
+def test_entries_expire_after_the_ttl(tmp_path, clock):
+    cache = ResponseCache(str(tmp_path), ttl=60)
+    cache.set(REQUEST, "hello")
+
+    clock.now += 59
+    assert cache.get(REQUEST) == "hello"
+    clock.now += 2
+    assert cache.get(REQUEST) is None
+    assert cache.stats()["hits"] == {"autogen": 1}
+    assert cache.stats()["misses"] == {"autogen": 1}
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path, clock):
+    cache = ResponseCache(str(tmp_path), ttl=3600, size_limit_mb=1)
+    response = "x" * 60_000  # sixteen of them fit in 1 MB
+
+    for key in range(16):
+        clock.now += 1
+        cache.set(key, response)
+    clock.now += 1
+    assert cache.get(0) == response  # 1 is the least recently used now
+    clock.now += 1
+    cache.set(16, response)
+
+    # diskcache culls a batch of the least recently used entries
+    kept = [key for key in range(17) if cache.get(key) is not None]
+    assert kept[0] == 0 and 1 not in kept and kept[-1] == 16
+    assert cache.stats()["size_bytes"] <= 1024 * 1024
+
+
+def test_get_returns_the_callers_default_on_a_miss(tmp_path):
+    cache = ResponseCache(str(tmp_path))
+    missing = object()
+    assert cache.get("unknown", missing, source="intent") is missing
+    assert cache.stats()["misses"] == {"intent": 1}
+
+
+def test_autogen_completions_are_served_from_the_cache(tmp_path):
+    requests = []
+
+    def handler(request):
+        requests.append(json.loads(request.content))
+        return httpx.Response(
+            200,
+            json={
+                "id": "chatcmpl-1",
+                "object": "chat.completion",
+                "created": 0,
+                "model": "gpt-4o-mini",
+                "choices": [
+                    {
+                        "index": 0,
+                        "message": {"role": "assistant", "content": "Hello!"},
+                        "finish_reason": "stop",
+                    }
+                ],
+                "usage": {
+                    "prompt_tokens": 9,
+                    "completion_tokens": 2,
+                    "total_tokens": 11,
+                },
+            },
+        )
+
+    cache = ResponseCache(str(tmp_path))
+    client = autogen.OpenAIWrapper(
+        config_list=[
+            {
+                "model": "gpt-4o-mini",
+                "api_key": "test",
+                "http_client": SharedHTTPClient(transport=httpx.MockTransport(handler)),
+            }
+        ],
+        cache=cache,
+    )
+
+    for _ in range(2):
+        response = client.create(messages=REQUEST["messages"])
+        assert client.extract_text_or_completion_object(response) == ["Hello!"]
+
+    assert len(requests) == 1
+    assert cache.stats()["hits"] == {"autogen": 1}
+    assert cache.stats()["entries"] == 1
@@ -0,0 +1,169 @@
+import asyncio
+import threading
+
+import httpx
+import pytest
+
+from agents.modules import llm
+from agents.modules.llm import LimitedTransport, LLMLimiter, TokenBucket
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+        self.slept = []
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.slept.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(llm.time, "monotonic", clock.monotonic)
+    monkeypatch.setattr(llm.time, "sleep", clock.sleep)
+    return clock
+
+
+def free_slots(limiter):
+    taken = 0
+    while limiter._slots.acquire(blocking=False):
+        taken += 1
+    for _ in range(taken):
+        limiter.release()
+    return taken
+
+
+def test_token_bucket_bursts_then_refills(clock):
+    bucket = TokenBucket(rate_per_minute=60, capacity=2)  # one token a second
+    assert bucket.take() == 0 and bucket.take() == 0
+    assert bucket.take() == pytest.approx(1.0)
+
+    clock.now += 0.5
+    assert bucket.take() == pytest.approx(0.5)
+    clock.now += 0.5
+    assert bucket.take() == 0
+
+    clock.now += 60
+    assert bucket.tokens <= bucket.capacity
+    assert [bucket.take() for _ in range(2)] == [0, 0]
+
+
+def test_acquire_waits_for_the_bucket(clock):
+    limiter = LLMLimiter(max_concurrency=2, requests_per_minute=60)
+    limiter._buckets["m"] = TokenBucket(60, capacity=1)
+
+    limiter.acquire("m")
+    limiter.acquire("m")
+    assert clock.slept == [pytest.approx(1.0)]
+    assert free_slots(limiter) == 0
+
+
+def test_a_acquire_wakes_up_when_a_slot_is_released():
+    limiter = LLMLimiter(max_concurrency=1, requests_per_minute=6000)
+    limiter.acquire("m")
+
+    async def wait():
+        threading.Timer(0.05, limiter.release).start()
+        await asyncio.wait_for(limiter.a_acquire("m"), timeout=5)
+
+    asyncio.run(wait())
+    assert free_slots(limiter) == 0
+    limiter.release()
+    assert free_slots(limiter) == 1
+
+
+def test_cancelled_a_acquire_gives_its_slot_back():
+    limiter = LLMLimiter(max_concurrency=1, requests_per_minute=6000)
+    limiter.acquire("m")
+
+    async def cancel_waiter():
+        waiter = asyncio.ensure_future(limiter.a_acquire("m"))
+        await asyncio.sleep(0.05)
+        waiter.cancel()
+        limiter.release()  # the waiting thread takes this slot...
+        for _ in range(100):
+            await asyncio.sleep(0.01)
+            if free_slots(limiter):
+                break
+
+    asyncio.run(cancel_waiter())
+    assert free_slots(limiter) == 1  # ...and hands it back
+
+
+def transport_for(limiter, responses, requests=None):
+    responses = list(responses)
+
+    def handler(request):
+        if requests is not None:
+            requests.append(request)
+        return responses.pop(0)
+
+    return LimitedTransport(limiter, transport=httpx.MockTransport(handler))
+
+
+def test_429_and_5xx_are_retried_with_backoff(clock):
+    limiter = LLMLimiter(max_concurrency=1, requests_per_minute=6000, max_retries=3)
+    requests = []
+    transport = transport_for(
+        limiter,
+        [
+            httpx.Response(429, headers={"retry-after": "2"}),
+            httpx.Response(503),
+            httpx.Response(200, json={"ok": True}),
+        ],
+        requests,
+    )
+    with httpx.Client(transport=transport) as client:
+        response = client.post("https://llm.test/v1/chat", json={"model": "m"})
+
+    assert response.json() == {"ok": True}
+    assert len(requests) == 3
+    assert clock.slept[0] >= 2  # at least what retry-after asked for
+    assert llm.BACKOFF_BASE * 0.5 <= clock.slept[1] <= llm.BACKOFF_MAX
+    assert free_slots(limiter) == 1  # every attempt gave its slot back
+
+
+def test_last_attempt_returns_the_error_response(clock):
+    limiter = LLMLimiter(max_concurrency=1, requests_per_minute=6000, max_retries=1)
+    transport = transport_for(limiter, [httpx.Response(500), httpx.Response(502)])
+    with httpx.Client(transport=transport) as client:
+        response = client.post("https://llm.test/v1/chat", json={"model": "m"})
+
+    assert response.status_code == 502
+    assert len(clock.slept) == 1
+    assert free_slots(limiter) == 1
+
+
+def test_client_errors_are_not_retried(clock):
+    limiter = LLMLimiter(max_concurrency=1, requests_per_minute=6000)
+    transport = transport_for(limiter, [httpx.Response(400)])
+    with httpx.Client(transport=transport) as client:
+        assert client.get("https://llm.test/v1/models").status_code == 400
+    assert clock.slept == []
+
+
+def test_async_transport_retries(monkeypatch):
+    slept = []
+
+    async def fake_sleep(seconds):
+        slept.append(seconds)
+
+    monkeypatch.setattr(llm.asyncio, "sleep", fake_sleep)
+    limiter = LLMLimiter(max_concurrency=1, requests_per_minute=6000)
+    responses = [httpx.Response(429), httpx.Response(200, json={"ok": True})]
+    transport = llm.AsyncLimitedTransport(
+        limiter, transport=httpx.MockTransport(lambda request: responses.pop(0))
+    )
+
+    async def post():
+        async with httpx.AsyncClient(transport=transport) as client:
+            return await client.post("https://llm.test/v1/chat", json={"model": "m"})
+
+    assert asyncio.run(post()).json() == {"ok": True}
+    assert len(slept) == 1
+    assert free_slots(limiter) == 1
@@ -0,0 +1,145 @@
+from datetime import datetime
+from types import SimpleNamespace
+
+import autogen
+import pytest
+
+from agents.modules import metrics
+from agents.modules.metrics import MetricsLogger, MetricsRegistry
+from agents.modules.sessions import SessionRegistry
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 100.0
+
+    def perf_counter(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(metrics.time, "perf_counter", clock.perf_counter)
+    return clock
+
+
+def log_completion(logger, agent, prompt_tokens, completion_tokens, cached=False):
+    """What autogen's runtime logging reports for one chat completion."""
+    response = SimpleNamespace(
+        model="gpt-4o-mini-2024-07-18",
+        usage=SimpleNamespace(
+            prompt_tokens=prompt_tokens,
+            completion_tokens=completion_tokens,
+            prompt_tokens_details=SimpleNamespace(cached_tokens=prompt_tokens // 2),
+        ),
+    )
+    logger.log_chat_completion(
+        invocation_id=None,
+        client_id=1,
+        wrapper_id=2,
+        source=agent,
+        request={"model": "gpt-4o-mini"},
+        response=response,
+        is_cached=cached,
+        cost=0,
+        start_time=datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S.%f"),
+    )
+
+
+def test_turn_gets_the_latency_tokens_and_cost_of_its_llm_calls(clock):
+    registry = MetricsRegistry()
+    logger = MetricsLogger(registry)
+    agent = autogen.ConversableAgent("order_status_agent", llm_config=False)
+    registry.track("s1", agent)
+    registry.session("s1")
+
+    clock.now += 1.0
+    registry.record_speaker_selection("s1", 0.25)
+    log_completion(logger, agent, 1000, 200)
+    log_completion(logger, agent, 1000, 200, cached=True)
+    clock.now += 2.0
+    turn = registry.record_turn("s1", "order_status_agent")
+
+    assert turn["seconds"] == pytest.approx(2.75)  # speaker selection excluded
+    assert turn["llm_calls"] == 2
+    assert turn["prompt_tokens"] == 2000 and turn["completion_tokens"] == 400
+    # gpt-4o-mini prices, the cache hit is free
+    assert turn["cost"] == pytest.approx(1000 * 0.00015 / 1000 + 200 * 0.0006 / 1000)
+    assert turn["models"] == ["gpt-4o-mini-2024-07-18"]
+
+    summary = registry.get_session("s1").summary()
+    assert summary["agents"]["order_status_agent"]["cached_token_ratio"] == 0.5
+    assert summary["slowest_agent"] == "order_status_agent"
+
+
+def test_failed_calls_are_counted_as_errors():
+    registry = MetricsRegistry()
+    MetricsLogger(registry).log_chat_completion(
+        None,
+        1,
+        2,
+        "agent",
+        {"model": "gpt-4o"},
+        "boom",
+        False,
+        0,
+        "2024-01-01 00:00:00.0",
+    )
+    assert (
+        'chat_llm_errors_total{agent="agent",model="gpt-4o"} 1.0' in registry.render()
+    )
+
+
+def test_render_is_prometheus_text():
+    registry = MetricsRegistry()
+    registry.record_llm_call("a", "gpt-4o", 10, 5, seconds=0.3, cost=0.5)
+    registry.record_tool_call(None, "run_sql", 0.02, error=False)
+
+    text = registry.render(
+        extra=[("chat_sessions", "gauge", "Chat sessions held in memory", [({}, 3)])]
+    )
+    lines = text.splitlines()
+    assert text.endswith("\n")
+    assert "# TYPE chat_llm_requests_total counter" in lines
+    assert (
+        'chat_llm_requests_total{agent="a",model="gpt-4o",cached="false"} 1.0' in lines
+    )
+    assert 'chat_llm_cost_usd_total{agent="a",model="gpt-4o"} 0.5' in lines
+    assert "# TYPE chat_tool_call_seconds histogram" in lines
+    assert 'chat_tool_call_seconds_bucket{tool="run_sql",le="0.05"} 1' in lines
+    assert 'chat_tool_call_seconds_bucket{tool="run_sql",le="+Inf"} 1' in lines
+    assert 'chat_tool_call_seconds_count{tool="run_sql"} 1' in lines
+    assert lines[-3:] == [
+        "# HELP chat_sessions Chat sessions held in memory",
+        "# TYPE chat_sessions gauge",
+        "chat_sessions 3",
+    ]
+
+
+def test_label_values_are_escaped():
+    assert metrics.format_labels({"agent": 'say "hi"\n'}) == '{agent="say \\"hi\\"\\n"}'
+
+
+def test_pruned_sessions_drop_their_metrics(monkeypatch):
+    registry = MetricsRegistry()
+    monkeypatch.setattr(metrics, "registry", registry)
+    sessions = SessionRegistry(ttl=0)
+    session = sessions.create()
+    registry.record_turn(session.session_id, "agent")
+    registry.record_human_wait(session.session_id, 1.0)
+
+    session.set_status("ended")
+    session.finished_at -= 1
+    sessions.create()  # creating a session prunes the expired ones
+    assert registry.get_session(session.session_id) is None
+    # process-wide totals outlive the session
+    assert "chat_human_input_wait_seconds_total 1.0" in registry.render()
+
+
+def test_oldest_summaries_are_dropped_beyond_max_sessions():
+    registry = MetricsRegistry(max_sessions=2)
+    for session_id in ("s1", "s2", "s3"):
+        registry.session(session_id)
+    assert registry.get_session("s1") is None
+    assert registry.get_session("s3") is not None
@@ -0,0 +1,105 @@
+import json
+
+import pytest
+
+from agents import mock_llm_server
+
+
+def without_latency(value):
+    if isinstance(value, dict):
+        return {
+            key: without_latency(item)
+            for key, item in value.items()
+            if key not in ("latency", "token_ms")
+        }
+    if isinstance(value, list):
+        return [without_latency(item) for item in value]
+    return value
+
+
+@pytest.fixture
+def client(monkeypatch):
+    with open(mock_llm_server.DEFAULT_SCRIPT) as f:
+        monkeypatch.setattr(mock_llm_server, "script", without_latency(json.load(f)))
+    monkeypatch.setattr(mock_llm_server, "recordings", {})
+    monkeypatch.setattr(mock_llm_server, "stats", mock_llm_server.Counter())
+    monkeypatch.setattr(mock_llm_server, "seen_prefixes", set())
+    return mock_llm_server.app.test_client()
+
+
+def chat(client, messages, **body):
+    response = client.post(
+        "/v1/chat/completions",
+        json={"model": "gpt-4o-mini", "messages": messages, **body},
+    )
+    assert response.status_code == 200
+    return response.get_json()
+
+
+def select_speaker(agentlist, conversation):
+    return [
+        {"role": "system", "content": "You are in a role play game."},
+        {"role": "user", "content": conversation, "name": "User_Proxy"},
+        {
+            "role": "system",
+            "content": "Read the above conversation. Then select the next role "
+            f"from {agentlist} to play. Only return the role.",
+        },
+    ]
+
+
+def test_speaker_is_picked_from_the_quoted_agent_list(client):
+    result = chat(client, select_speaker("['a', 'b']", "Hello"))
+    assert result["choices"][0]["message"]["content"] in ("a", "b")  # not "'a'"
+
+    agentlist = "['User_Proxy', 'order_status_agent', 'product_recommendation_agent']"
+    result = chat(client, select_speaker(agentlist, "What is my order status?"))
+    assert result["choices"][0]["message"]["content"] == "order_status_agent"
+
+
+def test_scripted_function_call_fills_in_the_captured_order_id(client):
+    messages = [
+        {"role": "system", "content": "I retrieve order details from the database."},
+        {"role": "user", "content": "Where is my order 12?"},
+    ]
+    choice = chat(client, messages)["choices"][0]
+
+    assert choice["finish_reason"] == "function_call"
+    assert choice["message"]["function_call"] == {
+        "name": "get_order_status",
+        "arguments": '{"order_id": 12}',
+    }
+
+    tools = [{"type": "function", "function": {"name": "get_order_status"}}]
+    choice = chat(client, messages, tools=tools)["choices"][0]
+    assert choice["finish_reason"] == "tool_calls"
+    assert choice["message"]["tool_calls"][0]["function"]["name"] == "get_order_status"
+
+
+def test_unmatched_requests_get_the_fallback_and_usage(client):
+    result = chat(client, [{"role": "user", "content": "Hello"}])
+
+    assert result["choices"][0]["message"]["content"] == "OK."
+    assert result["usage"]["prompt_tokens"] > 0
+    assert result["usage"]["prompt_tokens_details"] == {"cached_tokens": 0}
+    assert client.get("/stats").get_json() == {
+        "requests": 1,
+        "by_rule": {"fallback": 1},
+    }
+
+
+def test_streamed_answers_end_with_done(client):
+    messages = [
+        {"role": "system", "content": "I retrieve order details from the database."},
+        {"role": "user", "content": "Can you check my order?"},
+    ]
+    response = client.post(
+        "/v1/chat/completions",
+        json={"model": "gpt-4o-mini", "messages": messages, "stream": True},
+    )
+    events = response.get_data(as_text=True).strip().split("\n\n")
+
+    assert events[-1] == "data: [DONE]"
+    deltas = [json.loads(event[6:])["choices"][0]["delta"] for event in events[:-1]]
+    text = "".join(delta.get("content", "") for delta in deltas)
+    assert text == "Could you please share your order ID?"
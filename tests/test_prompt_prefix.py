@@ -0,0 +1,37 @@
+import os
+
+from agents.modules import llm
+
+TABLE_DEFINITIONS = (
+    "CREATE TABLE orders (\norderid integer,\norderstatus text\n);\n\n"
+    "CREATE TABLE products (\nproductid integer\n);"
+)
+
+
+def first_message(user_input):
+    # how api1 builds the first message of a chat
+    return llm.add_cap_ref(
+        f"Fulfill this request: {user_input}.",
+        "Use these TABLE_DEFINITIONS to satisfy the database query related to cloth retail.",
+        "TABLE_DEFINITIONS",
+        TABLE_DEFINITIONS,
+    )
+
+
+def test_only_the_tail_changes_between_requests():
+    first = first_message("Where is order 12?").encode("utf-8")
+    second = first_message("Recommend a blue shirt").encode("utf-8")
+
+    prefix = os.path.commonprefix([first, second])
+    assert prefix.endswith(
+        TABLE_DEFINITIONS.encode("utf-8") + b"\n\nFulfill this request: "
+    )
+    assert first[len(prefix) :] == b"Where is order 12?."
+    assert second[len(prefix) :] == b"Recommend a blue shirt."
+
+
+def test_the_static_reference_comes_first():
+    assert first_message("a").startswith(
+        "Use these TABLE_DEFINITIONS to satisfy the database query related to cloth "
+        "retail.\n\nTABLE_DEFINITIONS\n\n" + TABLE_DEFINITIONS
+    )
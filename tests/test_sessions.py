@@ -0,0 +1,162 @@
+import asyncio
+import json
+import threading
+
+import autogen
+from PIL import Image
+
+from agents.modules.chat_pool import run_on_worker_loop
+from agents.modules.sessions import (
+    ChatSession,
+    SessionInputMixin,
+    SessionRegistry,
+    message_content,
+    parse_message,
+    sse_events,
+)
+
+
+def test_parse_message_decodes_json_message_part():
+    msg = parse_message(json.dumps({"user": "agent", "message": '{"rows": []}'}))
+    assert msg == {"user": "agent", "message": {"rows": []}}
+
+
+def test_parse_message_keeps_plain_text():
+    assert parse_message("hello") == "hello"
+    assert parse_message({"user": "agent", "message": "hi"}) == {
+        "user": "agent",
+        "message": "hi",
+    }
+
+
+def test_messages_since_resumes_after_cursor():
+    session = ChatSession("s")
+    for text in ("a", "b", "c"):
+        session.put_message(text)
+
+    assert session.messages_since(0) == (["a", "b", "c"], 3)
+    assert session.messages_since(2) == (["c"], 3)
+    assert session.messages_since(3, timeout=0) == ([], 3)
+
+
+def test_next_message_reads_each_message_once():
+    session = ChatSession("s")
+    session.put_message("a")
+    assert session.next_message() == "a"
+    assert session.next_message() is None
+
+
+def test_messages_since_wakes_up_on_new_message():
+    session = ChatSession("s")
+    timer = threading.Timer(0.05, session.put_message, args=("late",))
+    timer.start()
+    try:
+        assert session.messages_since(0, timeout=5) == (["late"], 1)
+    finally:
+        timer.cancel()
+
+
+def test_user_input_sent_before_the_chat_waits_is_kept():
+    session = ChatSession("s")
+    session.put_user_input("first")
+
+    async def wait():
+        return await session.wait_user_input(timeout=1)
+
+    assert asyncio.run(wait()) == "first"
+
+
+def test_wait_user_input_times_out():
+    session = ChatSession("s")
+
+    async def wait():
+        return await session.wait_user_input(timeout=0.01)
+
+    assert asyncio.run(wait()) is None
+
+
+def test_finished_sessions_expire_from_the_registry():
+    registry = SessionRegistry(ttl=0)
+    session = registry.create()
+    assert registry.get(session.session_id) is session
+    assert registry.get(None) is None
+
+    session.set_status("ended")
+    session.finished_at -= 1
+    registry.create()
+    assert registry.get(session.session_id) is None
+    assert len(registry) == 1
+
+
+def test_sse_events_end_with_the_final_status():
+    session = ChatSession("s")
+    session.put_message({"user": "agent", "message": "hi"})
+    session.set_status("ended")
+
+    events = list(sse_events(session, keepalive=0))
+    assert events[0].startswith("id: 1\ndata: ")
+    assert json.loads(events[0].split("data: ", 1)[1])["message"]["message"] == "hi"
+    assert events[-1].startswith("id: 1\nevent: end\n")
+
+
+def test_multimodal_content_is_stored_as_text():
+    # what MultimodalConversableAgent keeps for a message with a picture
+    content = [
+        {"type": "text", "text": "Is this package damaged? "},
+        {"type": "image_url", "image_url": {"url": Image.new("RGB", (2, 2))}},
+    ]
+    session = ChatSession("s")
+    session.put_message(
+        {"user": "image-explainer", "message": message_content(content)}
+    )
+
+    batch, _ = session.messages_since(0)
+    assert json.dumps(batch) == (
+        '[{"user": "image-explainer", "message": "Is this package damaged? <image>"}]'
+    )
+    assert message_content("plain") == "plain"
+    assert message_content(None) is None
+
+
+def test_input_from_another_thread_wakes_the_worker_loop():
+    session = ChatSession("s")
+    result = {}
+
+    def worker():
+        async def wait():
+            session.put_message("waiting")
+            return await session.wait_user_input(timeout=5)
+
+        result["input"] = run_on_worker_loop(wait())
+
+    thread = threading.Thread(target=worker)
+    thread.start()
+    session.messages_since(0, timeout=5)  # the worker is listening now
+    session.put_user_input("approved")
+    thread.join(timeout=5)
+    assert result == {"input": "approved"}
+
+
+class SessionAgent(SessionInputMixin, autogen.ConversableAgent):
+    pass
+
+
+def test_agent_asks_the_customer_through_the_session():
+    session = ChatSession("s")
+    agent = SessionAgent(session, name="user", llm_config=False)
+    session.put_user_input("approved")
+
+    assert asyncio.run(agent.a_get_human_input("ignored")) == "approved"
+    assert session.messages_since(0)[0][0]["user"] == "System"
+    assert session.chat_status == "Chat ongoing"
+
+
+def test_customer_who_left_ends_the_chat(monkeypatch):
+    monkeypatch.setattr(
+        ChatSession, "wait_user_input", lambda self: asyncio.sleep(0, None)
+    )
+    session = ChatSession("s")
+    agent = SessionAgent(session, name="user", llm_config=False)
+
+    assert asyncio.run(agent.a_get_human_input("ignored")) == "exit"
+    assert session.chat_status == "ended"
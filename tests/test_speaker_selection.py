@@ -0,0 +1,110 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import autogen
+
+from agents.modules.speaker_selection import (
+    TransitionGraph,
+    called_functions,
+    has_image,
+    last_speaker_among,
+)
+
+
+def make_agent(name, function_map=None):
+    return autogen.ConversableAgent(
+        name,
+        llm_config=False,
+        human_input_mode="NEVER",
+        function_map=function_map,
+    )
+
+
+def make_groupchat(*agents, messages=()):
+    return autogen.GroupChat(agents=list(agents), messages=list(messages))
+
+
+def test_called_functions_reads_function_and_tool_calls():
+    message = {
+        "function_call": {"name": "run_sql", "arguments": "{}"},
+        "tool_calls": [
+            {"type": "function", "function": {"name": "buy_product"}},
+        ],
+    }
+    assert called_functions(message) == ["run_sql", "buy_product"]
+
+
+def test_has_image():
+    assert has_image([{"content": "see <img https://x/y.png>"}])
+    assert has_image([{"content": "https://x/package.JPG"}])
+    assert not has_image([{"content": "no picture here"}])
+
+
+def test_last_speaker_among():
+    groupchat = make_groupchat(
+        make_agent("a"),
+        make_agent("b"),
+        messages=[{"name": "a", "content": ""}, {"name": "b", "content": ""}],
+    )
+    assert last_speaker_among(groupchat, {"a"}) == "a"
+    assert last_speaker_among(groupchat, {"c"}) is None
+
+
+def test_single_successor_is_picked_by_rule():
+    a, b = make_agent("a"), make_agent("b")
+    graph = TransitionGraph({"a": ["b"]})
+    groupchat = make_groupchat(a, b, messages=[{"name": "a", "content": "hi"}])
+
+    assert graph(a, groupchat) is b
+    assert graph.stats["rule"] == 1
+
+
+def test_successors_missing_from_the_pipeline_are_skipped():
+    a, c = make_agent("a"), make_agent("c")
+    graph = TransitionGraph({"a": ["b", "c"]})
+    groupchat = make_groupchat(a, c, messages=[{"name": "a", "content": "hi"}])
+
+    assert graph(a, groupchat) is c
+
+
+def test_route_decides_between_successors():
+    a, b, c = make_agent("a"), make_agent("b"), make_agent("c")
+    graph = TransitionGraph({"a": ["b", "c"]}, routes={"a": lambda groupchat: "c"})
+    groupchat = make_groupchat(a, b, c, messages=[{"name": "a", "content": "hi"}])
+
+    assert graph(a, groupchat) is c
+
+
+def test_ambiguous_turn_falls_back_to_the_llm():
+    a, b, c = make_agent("a"), make_agent("b"), make_agent("c")
+    graph = TransitionGraph({"a": ["b", "c"]}, routes={"a": lambda groupchat: None})
+    groupchat = make_groupchat(a, b, c, messages=[{"name": "a", "content": "hi"}])
+
+    assert graph(a, groupchat) == "auto"
+    assert graph.stats["llm"] == 1
+
+
+def test_function_call_goes_to_the_agent_that_can_execute_it():
+    a = make_agent("a", function_map={"run_sql": lambda sql: sql})
+    b = make_agent("b")
+    graph = TransitionGraph({"a": ["b"]})
+    call = {"name": "a", "content": None, "function_call": {"name": "run_sql"}}
+
+    assert graph(a, make_groupchat(a, b, messages=[call])) is a
+    assert graph(b, make_groupchat(a, b, messages=[call])) == "auto"
+    assert graph.stats["function_call"] == 2
+
+
+def test_allowed_transitions_uses_agent_objects():
+    a, b = make_agent("a"), make_agent("b")
+    graph = TransitionGraph({"a": ["b", "missing"], "missing": ["a"]})
+    assert graph.allowed_transitions([a, b]) == {a: [b]}
+
+
+def test_decisions_are_counted_across_threads():
+    a, b = make_agent("a"), make_agent("b")
+    graph = TransitionGraph({"a": ["b"]})
+    groupchat = make_groupchat(a, b, messages=[{"name": "a", "content": "hi"}])
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        list(pool.map(lambda _: graph(a, groupchat), range(2000)))
+    assert graph.decisions() == {"rule": 2000}
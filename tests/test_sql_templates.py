@@ -0,0 +1,155 @@
+import json
+import threading
+
+import pytest
+
+from agents.modules.sql_templates import (
+    TemplateCache,
+    extract_slots,
+    fill,
+    parameterize,
+)
+
+REQUEST = "Show me blue shirts for men under $40"
+SQL = (
+    "SELECT * FROM products WHERE productname ILIKE '%shirt%' AND color = 'Blue' "
+    "AND gender = 'Men' AND price < 40 LIMIT 10;"
+)
+ROWS = json.dumps({"columns": ["productname"], "rows": [["Blue Shirt"]]})
+NO_ROWS = json.dumps({"columns": ["productname"], "rows": []})
+
+
+class FakeDB:
+    def __init__(self, result=ROWS):
+        self.result = result
+        self.calls = []
+
+    def run_prepared(self, name, sql, params):
+        self.calls.append((name, sql, params))
+        if isinstance(self.result, Exception):
+            raise self.result
+        return self.result
+
+
+@pytest.mark.parametrize(
+    "text, slots",
+    [
+        (
+            REQUEST,
+            {"item": "shirt", "colour": "Blue", "gender": "Men", "max_price": 40},
+        ),
+        (
+            "extra large jeans between 50 and 20",
+            {"item": "jeans", "size": "XL", "min_price": 20, "max_price": 50},
+        ),
+        ("a small dress over $15", {"item": "dress", "size": "S", "min_price": 15}),
+        ("", {}),
+    ],
+)
+def test_extract_slots(text, slots):
+    assert extract_slots(text) == slots
+
+
+def test_parameterize_and_fill():
+    template = parameterize(SQL, extract_slots(REQUEST))
+    assert template["sql"] == (
+        "SELECT * FROM products WHERE productname ILIKE $1 AND color = $2 "
+        "AND gender = $3 AND price < $4 LIMIT 10"
+    )
+    slots = extract_slots("red shirts for women under 25")
+    assert fill(template, slots) == ["%shirt%", "Red", "Women", 25]
+
+
+@pytest.mark.parametrize(
+    "sql",
+    [
+        # a literal no slot explains
+        "SELECT * FROM products WHERE color = 'Blue' AND gender = 'Men' "
+        "AND price < 40 AND stock > 3 AND productname ILIKE '%shirt%'",
+        # a slot the query ignores
+        "SELECT * FROM products WHERE color = 'Blue' AND price < 40 "
+        "AND productname ILIKE '%shirt%'",
+        "DELETE FROM products WHERE color = 'Blue'",
+        "SELECT * FROM orders WHERE totalprice < 40",
+        "SELECT 1 FROM products; DROP TABLE products",
+    ],
+)
+def test_parameterize_rejects(sql):
+    assert parameterize(sql, extract_slots(REQUEST)) is None
+
+
+def test_learned_template_answers_the_same_shape(tmp_path):
+    path = tmp_path / "templates.json"
+    cache = TemplateCache(str(path))
+    db = FakeDB()
+
+    assert cache.run(db, REQUEST) is None
+    assert cache.learn(REQUEST, SQL, ROWS)
+    assert not cache.learn(REQUEST, SQL, ROWS)  # one template per shape
+
+    assert cache.run(db, "any red shirts for women under 25?") == ROWS
+    name, sql, params = db.calls[0]
+    assert name.startswith("tpl_") and "$4" in sql
+    assert params == ["%shirt%", "Red", "Women", 25]
+    assert cache.stats() == {"templates": 1, "hits": 1, "misses": 1, "learned": 1}
+
+    # and survives a restart
+    assert len(TemplateCache(str(path))) == 1
+
+
+def test_only_searches_that_found_products_are_learned(tmp_path):
+    cache = TemplateCache(str(tmp_path / "templates.json"))
+    assert not cache.learn(REQUEST, SQL, NO_ROWS)
+    assert not cache.learn(REQUEST, SQL, "not json")
+    assert not cache.learn(REQUEST, SQL, json.dumps({"error": "too expensive"}))
+    assert len(cache) == 0
+
+
+def test_rejected_run_keeps_the_template(tmp_path):
+    cache = TemplateCache(str(tmp_path / "templates.json"))
+    cache.learn(REQUEST, SQL, ROWS)
+
+    db = FakeDB(json.dumps({"error": "The query is too expensive to run"}))
+    assert cache.run(db, REQUEST) is None
+    assert len(cache) == 1
+
+
+def test_failing_template_is_dropped(tmp_path):
+    path = tmp_path / "templates.json"
+    cache = TemplateCache(str(path))
+    cache.learn(REQUEST, SQL, ROWS)
+
+    assert cache.run(FakeDB(RuntimeError("column does not exist")), REQUEST) is None
+    assert len(cache) == 0
+    assert json.loads(path.read_text()) == {}
+
+
+def test_learning_wraps_the_tool(tmp_path):
+    cache = TemplateCache(str(tmp_path / "templates.json"))
+    recommend_product = cache.learning(lambda sql: ROWS, REQUEST)
+    assert recommend_product(SQL) == ROWS
+    assert len(cache) == 1
+
+
+def test_concurrent_saves_leave_one_valid_file(tmp_path):
+    path = tmp_path / "templates.json"
+    cache = TemplateCache(str(path))
+    cache.learn(REQUEST, SQL, ROWS)
+
+    threads = [threading.Thread(target=cache._save) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(json.loads(path.read_text())) == 1
+    assert [p.name for p in tmp_path.iterdir()] == ["templates.json"]
+
+
+def test_failed_save_does_not_raise(tmp_path):
+    blocker = tmp_path / "not-a-directory"
+    blocker.write_text("")
+    cache = TemplateCache(str(blocker / "templates.json"))
+
+    assert cache.learn(REQUEST, SQL, ROWS)
+    assert len(cache) == 1
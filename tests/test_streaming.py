@@ -0,0 +1,114 @@
+import json
+
+import autogen
+import httpx
+from autogen.io import IOStream
+
+from agents.modules.agent_templates import AgentTemplate
+from agents.modules.llm import SharedHTTPClient
+from agents.modules.sessions import ChatSession
+from agents.modules.streaming import (
+    STREAM_END,
+    STREAM_START,
+    SessionStream,
+    set_speaker,
+)
+
+COMPLETION = {
+    "id": "chatcmpl-1",
+    "object": "chat.completion",
+    "created": 0,
+    "model": "gpt-4o-mini",
+    "choices": [
+        {
+            "index": 0,
+            "message": {"role": "assistant", "content": "Order 12 has shipped."},
+            "finish_reason": "stop",
+        }
+    ],
+    "usage": {"prompt_tokens": 30, "completion_tokens": 6, "total_tokens": 36},
+}
+
+
+def stream_reply(iostream, *deltas):
+    # what autogen's OpenAIClient prints for a streamed completion
+    iostream.print(STREAM_START, end="")
+    for delta in deltas:
+        iostream.print(delta, end="", flush=True)
+    iostream.print(STREAM_END + "\n")
+
+
+def test_deltas_are_tagged_with_the_speaker():
+    session = ChatSession("s")
+    iostream = SessionStream(session)
+    with IOStream.set_default(iostream):
+        set_speaker("order_status_agent")
+        stream_reply(IOStream.get_default(), "Order 12 ", "has shipped.")
+        set_speaker("product_recommendation_agent")
+        stream_reply(IOStream.get_default(), "Try the blue shirt.")
+
+    messages, _ = session.messages_since(0)
+    assert messages == [
+        {"user": "order_status_agent", "delta": "Order 12 ", "stream_id": 1},
+        {"user": "order_status_agent", "delta": "has shipped.", "stream_id": 1},
+        {"user": "order_status_agent", "stream_id": 1, "stream_end": True},
+        {
+            "user": "product_recommendation_agent",
+            "delta": "Try the blue shirt.",
+            "stream_id": 2,
+        },
+        {"user": "product_recommendation_agent", "stream_id": 2, "stream_end": True},
+    ]
+
+
+def test_function_call_streams_send_no_end_marker():
+    session = ChatSession("s")
+    stream_reply(SessionStream(session))
+    assert session.messages_since(0, timeout=0) == ([], 0)
+
+
+def test_set_speaker_outside_a_streaming_chat_is_a_no_op():
+    set_speaker("order_status_agent")
+    assert not isinstance(IOStream.get_default(), SessionStream)
+
+
+def streaming_template(requests):
+    def handler(request):
+        requests.append(json.loads(request.content))
+        return httpx.Response(200, json=COMPLETION)
+
+    http_client = SharedHTTPClient(transport=httpx.MockTransport(handler))
+    config = {"model": "gpt-4o-mini", "api_key": "test", "http_client": http_client}
+    return AgentTemplate(
+        autogen.AssistantAgent,
+        stream=True,
+        name="order_status_agent",
+        llm_config={"config_list": [config], "cache_seed": None},
+    )
+
+
+def test_only_streaming_sessions_get_the_streaming_prototype():
+    template = streaming_template([])
+
+    streaming = template.instantiate(stream=True)
+    plain = template.instantiate(stream=False)
+    assert streaming.llm_config["stream"] is True
+    assert "stream" not in plain.llm_config
+    assert plain.client is template.prototype.client
+
+    no_stream = AgentTemplate(autogen.ConversableAgent, name="a", llm_config=False)
+    assert no_stream.streaming_prototype is None
+    assert no_stream.instantiate(stream=True).llm_config is False
+
+
+def test_non_streaming_sessions_still_receive_usage():
+    requests = []
+    agent = streaming_template(requests).instantiate(stream=False)
+
+    reply = agent.generate_reply(
+        messages=[{"role": "user", "content": "Where is order 12?"}]
+    )
+    assert reply == "Order 12 has shipped."
+    assert requests[0]["stream"] is False
+    usage = agent.client.actual_usage_summary["gpt-4o-mini"]
+    assert usage["prompt_tokens"] == 30 and usage["completion_tokens"] == 6
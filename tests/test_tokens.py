@@ -0,0 +1,34 @@
+import pytest
+
+from agents.modules import tokens
+
+
+@pytest.fixture(autouse=True)
+def fresh_encodings():
+    tokens.get_encoding.cache_clear()
+    yield
+    tokens.get_encoding.cache_clear()
+
+
+def test_unknown_model_whose_fallback_fails_is_estimated(monkeypatch):
+    def unknown_model(model):
+        raise KeyError(model)
+
+    def offline(name):
+        raise ConnectionError("no network")
+
+    monkeypatch.setattr(tokens.tiktoken, "encoding_for_model", unknown_model)
+    monkeypatch.setattr(tokens.tiktoken, "get_encoding", offline)
+
+    assert tokens.get_encoding("brand-new-model") is None
+    assert tokens.count_tokens("x" * 40, "brand-new-model") == 10
+
+
+def test_failing_model_lookup_is_estimated(monkeypatch):
+    def offline(model):
+        raise ConnectionError("no network")
+
+    monkeypatch.setattr(tokens.tiktoken, "encoding_for_model", offline)
+    assert tokens.get_encoding() is None
+    assert tokens.count_tokens("") == 0
+    assert tokens.count_tokens("abc") == 1
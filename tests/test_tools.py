@@ -0,0 +1,99 @@
+import autogen
+import pytest
+
+from agents.modules.agent_templates import AgentTemplate
+from agents.modules.tools import ToolRegistry, prompt_token_report
+
+
+def schema(name):
+    return {
+        "name": name,
+        "description": f"Run {name}",
+        "parameters": {"type": "object", "properties": {}},
+    }
+
+
+REGISTRY = ToolRegistry(
+    [schema("recommend_product"), schema("buy_product"), schema("get_order_status")]
+)
+
+FUNCTION_MAP = {
+    "recommend_product": lambda: "recommended",
+    "buy_product": lambda: "bought",
+    "get_order_status": lambda: "shipped",
+}
+
+AGENTS_INFO = [
+    {"name": "user", "type": "UserProxyAgent", "system_message": "A human."},
+    {
+        "name": "product_recommendation_agent",
+        "type": "AssistantAgent",
+        "system_message": "Recommend products.",
+        "tools": ["recommend_product", "buy_product"],
+    },
+    {
+        "name": "order_status_agent",
+        "type": "AssistantAgent",
+        "system_message": "Look up orders.",
+        "tools": ["get_order_status"],
+    },
+    {
+        "name": "image_explainer",
+        "type": "AssistantAgent",
+        "system_message": "Describe images.",
+    },
+]
+
+
+def template_for(agent_info):
+    llm_config = {
+        "config_list": [{"model": "gpt-4o-mini", "api_key": "test"}],
+        **REGISTRY.llm_config(agent_info),
+    }
+    return AgentTemplate(
+        autogen.AssistantAgent,
+        tools=agent_info.get("tools", ()),
+        name=agent_info["name"],
+        llm_config=llm_config,
+    )
+
+
+def test_select_keeps_the_requested_order():
+    names = [s["name"] for s in REGISTRY.select(["get_order_status", "buy_product"])]
+    assert names == ["get_order_status", "buy_product"]
+
+
+def test_unknown_tools_are_rejected():
+    with pytest.raises(ValueError, match="unknown tools: refund_order"):
+        REGISTRY.select(["buy_product", "refund_order"])
+
+
+def test_agents_without_tools_get_no_functions_entry():
+    assert REGISTRY.llm_config(AGENTS_INFO[3]) == {}
+
+
+def test_each_agent_sees_only_its_own_tools():
+    for agent_info in AGENTS_INFO[1:]:
+        agent = template_for(agent_info).instantiate(FUNCTION_MAP)
+        own = agent_info.get("tools", [])
+
+        offered = [s["name"] for s in agent.llm_config.get("functions", [])]
+        assert offered == own
+        assert sorted(agent.function_map) == sorted(own)
+
+
+def test_tools_none_lets_an_agent_run_every_function():
+    template = AgentTemplate(autogen.ConversableAgent, name="a", llm_config=False)
+    agent = template.instantiate(FUNCTION_MAP)
+    assert sorted(agent.function_map) == sorted(FUNCTION_MAP)
+
+
+def test_report_compares_all_tools_with_each_agents_own():
+    report = prompt_token_report(AGENTS_INFO, REGISTRY)
+
+    assert "user" not in report
+    image = report["image_explainer"]
+    assert image["tool_tokens_after"] == 0
+    assert image["before"] - image["after"] == image["tool_tokens_before"]
+    orders = report["order_status_agent"]
+    assert 0 < orders["tool_tokens_after"] < orders["tool_tokens_before"]